@@ -0,0 +1,208 @@
+"""
+Нагрузочный тест бота на синтетическом трафике.
+Запускается из папки с ботом: python -m bench --users 500
+Telegram и платежные системы заменяются локальными заглушками,
+база создаётся заново во временной папке, настоящая не используется.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m bench',
+        description='Load test with fake Telegram Bot API and payments'
+    )
+    parser.add_argument('--users', type=int, default=200,
+                        help='synthetic users per scenario')
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help='users acting at the same time, above '
+                             'UPDATE_CONCURRENCY and the connection pool')
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help='fake Bot API response delay, seconds')
+    parser.add_argument('--provider-latency', type=float, default=0.0,
+                        help='fake payment provider delay, seconds')
+    parser.add_argument('--provider', default='benchpay',
+                        choices=('benchpay', 'cryptomus'),
+                        help='payment system for purchases, cryptomus '
+                             'runs the real client against a fake API')
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help='keep production Bot API rate limits')
+    parser.add_argument('--fsm-storage', default='db',
+                        choices=('db', 'memory'))
+    parser.add_argument('--db', default=None,
+                        help='SQLite file, a new temporary one by default')
+    parser.add_argument('--api-port', type=int, default=18081)
+    parser.add_argument('--metrics-port', type=int, default=19090)
+    parser.add_argument('--timeout', type=float, default=300,
+                        help='background processing limit per scenario')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='machine-readable results file')
+    return parser.parse_args()
+
+
+def configure_env(args: argparse.Namespace):
+    """
+    Настройки задаются до импорта бота и перекрывают .env,
+    чтобы тест не ушел в настоящий Telegram или в рабочую базу
+    """
+    db = args.db or os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    os.environ.update(
+        TG_TOKEN='123456:BENCH',
+        ADMINS_ID='1,2',
+        PERIOD='mon.1,mon.3',
+        AMOUNT='100,250',
+        ID_CHANNEL='-1001',
+        LINK_CHANNEL='https://t.me/+bench',
+        NAME_CHANNEL='Bench',
+        UTC_TIME='0',
+        POSTGRES_DB='bench',
+        POSTGRES_USER='bench',
+        POSTGRES_PASSWORD='bench',
+        PGADMIN_DEFAULT_EMAIL='bench@example.com',
+        PGADMIN_DEFAULT_PASSWORD='bench',
+        DB_ENGINE='sqlite',
+        SQLITE_PATH=db,
+        BOT_MODE='polling',
+        WEBHOOK_WORKERS='1',
+        FSM_STORAGE=args.fsm_storage,
+        TELEGRAM_API_SERVER=f'http://127.0.0.1:{args.api_port}',
+        PAYMENT_WEBHOOK_PORT='0',
+        MODERATION_DIGEST='0',
+        METRICS_HOST='127.0.0.1',
+        METRICS_PORT=str(args.metrics_port),
+        CRYPTOMUS_KEY='bench',
+        CRYPTOMUS_UUID='bench',
+    )
+    os.makedirs('logs', exist_ok=True)
+    return db
+
+
+def git_commit() -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return dict(commit=None, dirty=None)
+    return dict(commit=commit, dirty=dirty)
+
+
+def lift_limits(*senders):
+    """Заглушка Bot API не ограничивает частоту, тест упирается в бота"""
+    from bot.service.sender import TokenBucket
+    rate = 100000
+    for sender in senders:
+        sender.bucket = TokenBucket(rate, rate)
+        sender.background_bucket = TokenBucket(rate, rate)
+        sender.max_rate = rate
+        sender.chat_interval = 0
+
+
+async def main(args: argparse.Namespace, db: str) -> dict:
+    from bench.fake_api import FakeBotApi
+    from bench.fake_payment import BenchPay, FakeCryptomus
+    from bench.scenarios import Bench, peak_rss_mb, rss_mb
+    from bot.database.main import engine
+    from bot.database.migrations import run_migrations
+    from bot.database.sqlite_engine import write_queue
+    from bot.main import create_bot, setup_dispatcher
+    from bot.service.broadcast import broadcast_engine
+    from bot.service.loop import expiry_scheduler
+    from bot.service.moderation_notify import moderation_notifier
+    from bot.service.outbox import outbox
+    from bot.service.payment_watcher import payment_watcher
+    from bot.service.Payments import Cryptomus
+    from bot.service.Payments.clients import CryptomusClient, \
+        provider_clients
+    from bot.service.sender import sender
+
+    # Лог каждого обновления заметно замедляет бота
+    logging.getLogger().setLevel(logging.WARNING)
+    BenchPay.LATENCY = args.provider_latency
+    api = FakeBotApi(args.api_latency)
+    await api.start('127.0.0.1', args.api_port)
+    cryptomus = FakeCryptomus(args.provider_latency)
+    await cryptomus.start('127.0.0.1', args.api_port + 1)
+    CryptomusClient.API_URL = f'http://127.0.0.1:{args.api_port + 1}/v1/'
+    payment = (
+        Cryptomus if args.provider == 'cryptomus' else BenchPay
+    ).__name__
+    await run_migrations(engine())
+    bot = create_bot()
+    dp, translator_hub = await setup_dispatcher(bot)
+    if not args.telegram_limits:
+        lift_limits(sender)
+    rss_before = rss_mb()
+    bench = Bench(
+        api,
+        bot,
+        dp,
+        translator_hub,
+        payment_watcher.session_pool,
+        args.users,
+        args.concurrency,
+        args.timeout,
+        payment
+    )
+    try:
+        scenarios = await bench.run()
+    finally:
+        await payment_watcher.stop()
+        await expiry_scheduler.stop()
+        await outbox.stop()
+        await moderation_notifier.stop()
+        await broadcast_engine.stop()
+        await dp.storage.close()
+        await write_queue.stop()
+        await bot.session.close()
+        await api.stop()
+        await cryptomus.stop()
+        await provider_clients.close()
+        await engine().dispose()
+    return dict(
+        **git_commit(),
+        date=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        params=dict(
+            users=args.users,
+            concurrency=args.concurrency,
+            api_latency=args.api_latency,
+            provider_latency=args.provider_latency,
+            provider=args.provider,
+            telegram_limits=args.telegram_limits,
+            fsm_storage=args.fsm_storage,
+            db=db
+        ),
+        scenarios=scenarios,
+        telegram_calls=dict(api.calls.most_common()),
+        rss_mb=dict(
+            start=rss_before,
+            end=rss_mb(),
+            peak=peak_rss_mb()
+        )
+    )
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    database = configure_env(arguments)
+    result = asyncio.run(main(arguments, database))
+    with open(arguments.output, 'w', encoding='UTF-8') as output:
+        json.dump(result, output, indent=2, ensure_ascii=False)
+    print(json.dumps(result['scenarios'], indent=2), file=sys.stderr)
+    print(f'Results written to {arguments.output}', file=sys.stderr)
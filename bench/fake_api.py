@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_ID = 1
+
+
+class FakeBotApi:
+    """
+    Локальный сервер Bot API для нагрузочных тестов.
+    Отвечает успехом на любой метод с задержкой latency, считает вызовы
+    и запоминает последнее сообщение с клавиатурой в каждом чате, чтобы
+    сценарии могли нажимать кнопки как пользователь.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        :param latency: Задержка ответа в секундах
+        """
+        self.latency = latency
+        self.calls = Counter()
+        self.last_markup: dict[int, tuple[int, dict]] = {}
+        self._message_id = 0
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str, port: int):
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def message(self, data: dict, markup: dict | None = None) -> dict:
+        chat_id = int(data.get('chat_id', BOT_ID))
+        message_id = data.get('message_id')
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        message_id = int(message_id)
+        if markup is not None:
+            self.last_markup[chat_id] = (message_id, markup)
+        return dict(
+            message_id=message_id,
+            date=int(time.time()),
+            chat=dict(id=chat_id, type='private'),
+            text=data.get('text'),
+            caption=data.get('caption'),
+            photo=[dict(
+                file_id=f'photo-{message_id}',
+                file_unique_id=f'photo-{message_id}',
+                width=1,
+                height=1
+            )],
+            reply_markup=markup
+        )
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        data = {
+            key: value for key, value in (await request.post()).items()
+            if isinstance(value, str)
+        }
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        markup = data.get('reply_markup')
+        if markup is not None:
+            markup = json.loads(markup)
+        lower = method.lower()
+        if lower == 'getme':
+            result = dict(
+                id=BOT_ID, is_bot=True, first_name='Bench', username='bench_bot'
+            )
+        elif lower.startswith('send') or lower == 'copymessage':
+            result = self.message(data, markup)
+            if lower == 'copymessage':
+                result = dict(message_id=result['message_id'])
+        elif lower.startswith('edit') and 'message_id' in data:
+            result = self.message(data, markup)
+        else:
+            result = True
+        return web.json_response(dict(ok=True, result=result))
+
+    def find_button(self, chat_id: int, suffix: str) -> tuple[int, str] | None:
+        """
+        Кнопка последнего сообщения в чате
+        :param suffix: Окончание или часть callback_data
+        :return: (message_id, callback_data)
+        """
+        message_id, markup = self.last_markup.get(chat_id, (None, None))
+        if markup is None:
+            return None
+        for row in markup.get('inline_keyboard', []):
+            for button in row:
+                data = button.get('callback_data') or ''
+                if suffix in data:
+                    return message_id, data
+        return None
@@ -0,0 +1,71 @@
+import asyncio
+import uuid
+
+from aiohttp import web
+
+from bot.service.Payments import all_payments
+from bot.service.Payments.payment_systems import PaymentSystem
+
+
+class BenchPay(PaymentSystem):
+    """
+    Платежная система для нагрузочных тестов: счёт создаётся и
+    оплачивается без внешнего API, с задержкой LATENCY на каждый вызов
+    """
+    NAME = 'BenchPay'
+    LATENCY = 0.0
+
+    async def to_pay(self):
+        await asyncio.sleep(self.LATENCY)
+        invoice_id = uuid.uuid4().hex
+        await self.pay_button(f'https://pay.example/{invoice_id}')
+        await self.watch(invoice_id)
+
+    async def check_invoice(self) -> bool:
+        await asyncio.sleep(self.LATENCY)
+        return True
+
+
+all_payments[BenchPay.__name__] = BenchPay
+
+
+class FakeCryptomus:
+    """
+    Заглушка API Cryptomus для проверки настоящего клиента:
+    счёт создаётся сразу и оплачен при первой проверке
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_post('/v1/payment', self.create)
+        app.router.add_post('/v1/payment/info', self.info)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def reply(self, result: dict) -> web.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response(dict(state=0, result=result))
+
+    async def create(self, request: web.Request) -> web.Response:
+        invoice_id = uuid.uuid4().hex
+        return await self.reply(dict(
+            uuid=invoice_id,
+            url=f'https://pay.example/{invoice_id}',
+            status='check'
+        ))
+
+    async def info(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        return await self.reply(dict(uuid=data['uuid'], status='paid'))
@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import math
+import resource
+import time
+from datetime import timedelta
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+from aiogram_dialog.utils import CB_SEP
+from fluentogram import TranslatorHub
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bench.fake_api import FakeBotApi
+from bot.database.models.main import Broadcast, OutboxMessage, \
+    PendingPayment, User
+from bot.misc import Config
+from bot.service.broadcast import broadcast_engine
+from bot.service.loop import expiry_scheduler
+from bot.service.metrics import metrics
+from bot.service.moderation_notify import vote_keyboard
+from bot.service.payment_watcher import payment_watcher
+
+log = logging.getLogger(__name__)
+
+# ID синтетических пользователей начинаются отсюда
+FIRST_USER_ID = 7_000_000_000
+
+
+def percentile(values: list[float], percent: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def rss_mb() -> float:
+    """Текущий размер резидентной памяти процесса"""
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+        return round(pages * resource.getpagesize() / 2 ** 20, 1)
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в килобайтах на Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class LoopLag:
+    """
+    Задержка цикла событий: насколько позже срабатывает sleep(INTERVAL).
+    Растёт, если что-то выполняет блокирующий вызов в цикле событий
+    """
+    INTERVAL = 0.01
+
+    def __init__(self):
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.INTERVAL)
+            self.samples.append(
+                max(time.perf_counter() - start - self.INTERVAL, 0)
+            )
+
+    def collect(self) -> list[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+
+def milliseconds(values: list[float]) -> dict:
+    return {
+        name: (round(value * 1000, 2) if value is not None else None)
+        for name, value in (
+            ('p50', percentile(values, 50)),
+            ('p99', percentile(values, 99)),
+            ('max', percentile(values, 100)),
+        )
+    }
+
+
+class Bench:
+    """
+    Синтетическая нагрузка на диспетчер. Сценарии идут по порядку
+    и используют результат предыдущих: пользователи из start проходят
+    модерацию, покупают подписку, она истекает, затем всем уходит рассылка.
+    """
+    SCENARIOS = ('start', 'moderation', 'purchase', 'expiry', 'broadcast')
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+            self,
+            api: FakeBotApi,
+            bot: Bot,
+            dp: Dispatcher,
+            translator_hub: TranslatorHub,
+            session_pool: async_sessionmaker,
+            users: int,
+            concurrency: int,
+            timeout: float,
+            payment: str = 'BenchPay'
+    ):
+        """
+        :param users: Число синтетических пользователей
+        :param concurrency: Сколько пользователей действуют одновременно
+        :param timeout: Предел ожидания фоновой обработки в секундах
+        :param payment: Платежная система, через которую покупают подписку
+        """
+        self.api = api
+        self.bot = bot
+        self.dp = dp
+        self.translator_hub = translator_hub
+        self.session_pool = session_pool
+        self.user_ids = [FIRST_USER_ID + number for number in range(users)]
+        self.admin_id = Config.ADMINS_ID[0]
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.payment = payment
+        self.loop_lag = LoopLag()
+        self._update_id = 0
+        self._latencies: list[float] = []
+        self._errors = 0
+        self._broadcast: Broadcast | None = None
+
+    def build_update(self, **event) -> Update:
+        self._update_id += 1
+        return Update.model_validate(
+            dict(update_id=self._update_id, **event),
+            context={'bot': self.bot}
+        )
+
+    @staticmethod
+    def user(telegram_id: int) -> dict:
+        return dict(
+            id=telegram_id,
+            is_bot=False,
+            first_name=f'User {telegram_id}',
+            username=f'user{telegram_id}',
+            language_code='ru'
+        )
+
+    def message(self, telegram_id: int, text: str) -> Update:
+        return self.build_update(message={
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': dict(id=telegram_id, type='private'),
+            'from': self.user(telegram_id),
+            'text': text
+        })
+
+    def callback(
+            self,
+            telegram_id: int,
+            data: str,
+            message_id: int = 1,
+            reply_markup: dict | None = None
+    ) -> Update:
+        return self.build_update(callback_query={
+            'id': str(self._update_id),
+            'from': self.user(telegram_id),
+            'chat_instance': str(telegram_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': dict(id=telegram_id, type='private'),
+                'caption': 'bench',
+                'reply_markup': reply_markup
+            }
+        })
+
+    async def send(self, update: Update):
+        start = time.perf_counter()
+        try:
+            await self.dp.feed_update(
+                self.bot, update, _translator_hub=self.translator_hub
+            )
+        except Exception as e:
+            self._errors += 1
+            log.warning(f'Update {update.update_id} failed: {e}')
+        self._latencies.append(time.perf_counter() - start)
+
+    async def click(self, telegram_id: int, suffix: str) -> bool:
+        """Нажать кнопку последнего сообщения, полученного пользователем"""
+        button = self.api.find_button(telegram_id, suffix)
+        if button is None:
+            self._errors += 1
+            log.warning(f'User {telegram_id} has no button {suffix!r}')
+            return False
+        message_id, data = button
+        await self.send(self.callback(telegram_id, data, message_id))
+        return True
+
+    async def flows(self, flow, items):
+        """Выполнить flow для каждого элемента, concurrency одновременно"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(item):
+            async with semaphore:
+                await flow(item)
+
+        await asyncio.gather(*(run(item) for item in items))
+
+    async def wait_until(self, condition) -> float:
+        """
+        Дождаться окончания фоновой обработки
+        :param condition: Корутина от сессии, True - обработка закончена
+        :return: Сколько секунд ждали
+        """
+        start = time.perf_counter()
+        while True:
+            async with self.session_pool() as session:
+                if await condition(session):
+                    break
+            if time.perf_counter() - start > self.timeout:
+                raise TimeoutError('Background processing timed out')
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return time.perf_counter() - start
+
+    async def outbox_empty(self, session) -> bool:
+        return not await session.scalar(
+            select(func.count(OutboxMessage.id))
+            .filter(OutboxMessage.status == 'pending')
+        )
+
+    async def measure(self, scenario, background=None) -> dict:
+        """
+        Прогнать сценарий и собрать показатели
+        :param scenario: Корутина, отправляющая обновления
+        :param background: Условие окончания фоновой обработки
+        """
+        queries = metrics.update_queries.values.get((), [0, 0])
+        queries_sum, queries_count = queries[-2], queries[-1]
+        calls = sum(self.api.calls.values())
+        self._latencies = []
+        self._errors = 0
+        self.loop_lag.collect()
+        start = time.perf_counter()
+        await scenario()
+        seconds = time.perf_counter() - start
+        background_seconds = None
+        if background is not None:
+            background_seconds = await self.wait_until(background)
+        queries = metrics.update_queries.values.get((), [0, 0])
+        updates = len(self._latencies)
+        result = dict(
+            updates=updates,
+            errors=self._errors,
+            seconds=round(seconds, 3),
+            updates_per_sec=(
+                round(updates / seconds, 1) if updates and seconds else None
+            ),
+            latency_ms=milliseconds(self._latencies),
+            db_queries_per_update=(
+                round((queries[-2] - queries_sum)
+                      / (queries[-1] - queries_count), 2)
+                if queries[-1] > queries_count else None
+            ),
+            telegram_calls=sum(self.api.calls.values()) - calls,
+            background_seconds=(
+                round(background_seconds, 3)
+                if background_seconds is not None else None
+            ),
+            # Пользователей в секунду с учетом фоновой обработки
+            users_per_sec=round(
+                len(self.user_ids) / (seconds + (background_seconds or 0)), 1
+            ),
+            # Задержка цикла событий за сценарий и фоновую обработку
+            loop_lag_ms=milliseconds(self.loop_lag.collect()),
+            rss_mb=rss_mb()
+        )
+        log.warning(f'{scenario.__name__}: {result}')
+        return result
+
+    async def start(self):
+        """Шторм /start от новых пользователей, заявки уходят админам"""
+        async def flow(telegram_id):
+            await self.send(self.message(telegram_id, '/start'))
+
+        await self.flows(flow, self.user_ids)
+
+    async def moderation(self):
+        """Администратор одобряет каждую заявку"""
+        async def flow(telegram_id):
+            await self.send(self.callback(
+                self.admin_id,
+                f'moderationvote_{telegram_id}_true',
+                reply_markup=vote_keyboard(telegram_id).model_dump(
+                    exclude_none=True
+                )
+            ))
+
+        await self.flows(flow, self.user_ids)
+
+    async def purchase(self):
+        """Покупка подписки через диалог и выбранную платежную систему"""
+        async def flow(telegram_id):
+            await self.send(self.callback(telegram_id, 'subscribe_btn'))
+            if not await self.click(telegram_id, f'{CB_SEP}user_pay'):
+                return
+            if not await self.click(telegram_id, f'{CB_SEP}mont:'):
+                return
+            button = self.api.find_button(telegram_id, f'{CB_SEP}payment:')
+            if button is None:
+                self._errors += 1
+                return
+            message_id, data = button
+            intent_id = data.split(CB_SEP)[0]
+            await self.send(self.callback(
+                telegram_id,
+                f'{intent_id}{CB_SEP}payment:{self.payment}',
+                message_id
+            ))
+
+        await self.flows(flow, self.user_ids)
+
+    async def purchase_done(self, session) -> bool:
+        payment_watcher.wake()
+        return not await session.scalar(select(func.count(PendingPayment.id)))
+
+    async def expiry(self):
+        """Массовое окончание подписок в ExpiryScheduler"""
+        async with self.session_pool() as session:
+            await session.execute(
+                update(User)
+                .filter(User.telegram_id.in_(self.user_ids))
+                .values(
+                    status_subscription=True,
+                    notion_oneday=False,
+                    subscription=(
+                        expiry_scheduler.now() - timedelta(minutes=1)
+                    )
+                )
+            )
+            await session.commit()
+        expiry_scheduler.reschedule()
+
+    async def expiry_done(self, session) -> bool:
+        return not await session.scalar(
+            select(func.count(User.id)).filter(
+                User.telegram_id.in_(self.user_ids),
+                User.status_subscription == True
+            )
+        )
+
+    async def broadcast(self):
+        """Рассылка администратора всем пользователям"""
+        def admin_message(message_id: int) -> Message:
+            return Message.model_validate({
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': dict(id=self.admin_id, type='private'),
+                'from': self.user(self.admin_id),
+                'text': 'bench'
+            }, context={'bot': self.bot})
+
+        async with self.session_pool() as session:
+            self._broadcast = await broadcast_engine.create(
+                session, admin_message(1), 'all_users', admin_message(2)
+            )
+
+    async def broadcast_done(self, session) -> bool:
+        return await session.scalar(
+            select(Broadcast.status)
+            .filter(Broadcast.id == self._broadcast.id)
+        ) == 'done'
+
+    async def run(self) -> dict:
+        backgrounds = {
+            'start': self.outbox_empty,
+            'moderation': self.outbox_empty,
+            'purchase': self.purchase_done,
+            'expiry': self.expiry_done,
+            'broadcast': self.broadcast_done,
+        }
+        results = {}
+        self.loop_lag.start()
+        try:
+            for name in self.SCENARIOS:
+                results[name] = await self.measure(
+                    getattr(self, name), backgrounds[name]
+                )
+        finally:
+            await self.loop_lag.stop()
+        return results
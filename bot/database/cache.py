@@ -0,0 +1,88 @@
+from typing import NamedTuple
+
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.models.main import User
+from bot.misc import Config
+
+
+class UserState(NamedTuple):
+    blocked: bool
+    moderation_status: bool | None
+    status_subscription: bool
+    lang_tg: str | None
+
+
+# Секунды
+USER_STATE_TTL = 60
+SHARED_USER_STATE_TTL = 5
+
+# Кэш одного процесса, invalidate_user сбрасывает его только в процессе,
+# где изменён пользователь. Остальные воркеры webhook видят старое
+# состояние до истечения TTL, поэтому при нескольких воркерах он короче
+user_state_cache: TTLCache = TTLCache(
+    maxsize=10000,
+    ttl=(
+        SHARED_USER_STATE_TTL
+        if Config.BOT_MODE == 'webhook' and Config.WEBHOOK_WORKERS > 1
+        else USER_STATE_TTL
+    )
+)
+
+# Ключ в session.info: пользователи, загруженные за время обработки апдейта
+SESSION_USERS = 'users'
+
+
+def session_users(session: AsyncSession) -> dict[int, User]:
+    return session.info.setdefault(SESSION_USERS, {})
+
+
+def remember_user(session: AsyncSession, user: User) -> UserState:
+    session_users(session)[user.telegram_id] = user
+    state = UserState(
+        bool(user.blocked),
+        user.moderation_status,
+        bool(user.status_subscription),
+        user.lang_tg
+    )
+    user_state_cache[user.telegram_id] = state
+    return state
+
+
+def invalidate_user(session: AsyncSession | None, telegram_id: int = None):
+    """
+    Сбросить кэш после изменения пользователя. Кэш других процессов
+    не сбрасывается, см. user_state_cache
+    :param telegram_id: None - сбросить всех пользователей
+    """
+    if telegram_id is None:
+        user_state_cache.clear()
+        if session is not None:
+            session_users(session).clear()
+        return
+    user_state_cache.pop(telegram_id, None)
+    if session is not None:
+        session_users(session).pop(telegram_id, None)
+
+
+async def get_user_state(
+        session: AsyncSession,
+        telegram_id: int
+) -> UserState | None:
+    """
+    Состояние пользователя для проверок доступа
+    :return: None если пользователя нет в базе
+    """
+    state = user_state_cache.get(telegram_id)
+    if state is not None:
+        return state
+    user = session_users(session).get(telegram_id)
+    if user is None:
+        statement = select(User).filter(User.telegram_id == telegram_id)
+        result = await session.execute(statement)
+        user = result.scalar_one_or_none()
+        if user is None:
+            return None
+    return remember_user(session, user)
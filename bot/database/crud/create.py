@@ -1,33 +1,67 @@
 import logging
 
+from sqlalchemy import BigInteger, Boolean, DateTime, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.database.crud.get import get_user_tg_id, get_user_moderation_vote
-from bot.database.models.main import Payment, ModerationVote
+from bot.database.main import insert
+from bot.database.models.main import User, ModerationVote, \
+    PendingPayment, Broadcast, OutboxMessage, AutoRenewal, current_time
 
 
-async def add_payment(
+async def add_pending_payment(
         session: AsyncSession,
         telegram_id,
-        deposit,
         payment_system,
-        id_payment,
-        period
+        invoice_id,
+        price,
+        period,
+        type_payment=None,
+        message_id=None
 ):
-    person = await get_user_tg_id(session, telegram_id)
-    if person is not None:
-        payment = Payment(
-            amount=deposit,
-            payment_system=payment_system,
-            id_payment=id_payment,
-            period=period
-        )
-        payment.user = person.telegram_id
-        session.add(payment)
-        await session.commit()
-        logging.info(
-            f'DB write new payment user:{telegram_id} amount:{deposit}'
-        )
+    pending = PendingPayment(
+        user=telegram_id,
+        payment_system=payment_system,
+        invoice_id=str(invoice_id),
+        price=price,
+        period=period,
+        type_payment=type_payment,
+        message_id=message_id
+    )
+    session.add(pending)
+    await session.commit()
+    logging.info(
+        f'DB write pending payment user:{telegram_id} '
+        f'system:{payment_system} invoice:{invoice_id}'
+    )
+    return pending
+
+
+async def add_auto_renewal(
+        session: AsyncSession,
+        telegram_id: int,
+        payment_method_id: str,
+        price: int,
+        period: str
+):
+    """
+    Сохранить способ оплаты для автопродления, повторный заменяет прежний
+    """
+    values = dict(
+        payment_method_id=payment_method_id,
+        price=price,
+        period=period,
+        charge_id=None,
+        charged_at=None,
+        attempts=0,
+        next_attempt=None
+    )
+    await session.execute(
+        insert(session, AutoRenewal)
+        .values(user=telegram_id, date_registered=current_time(), **values)
+        .on_conflict_do_update(index_elements=['user'], set_=values)
+    )
+    await session.commit()
+    logging.info(f'DB write auto renewal user:{telegram_id} period:{period}')
 
 
 async def add_moderation_vote(
@@ -35,58 +69,93 @@ async def add_moderation_vote(
         user_id: int,
         admin_id: int,
         approved: bool
-):
+) -> bool:
     """
-    Добавить или обновить голос модерации от администратора
-    :return: Объект голоса или None в случае ошибки
+    Добавить или обновить голос модерации от администратора одним запросом
+    :param user_id: telegram_id пользователя
+    :return: False, если пользователя нет в базе или произошла ошибка
     """
-    logging.info(f'CRITICAL: Starting add_moderation_vote for user:{user_id} admin:{admin_id} approved:{approved}')
-    
-    # Проверяем, существует ли пользователь в базе данных
-    try:
-        # Используем уже импортированные модели вместо повторного импорта
-        from .get import get_user_tg_id
-        
-        # Получаем пользователя из базы данных
-        user = await get_user_tg_id(session, user_id)
-        
-        if not user:
-            logging.error(f'CRITICAL: User {user_id} not found in database when adding moderation vote')
-            return None
-        
-        logging.info(f'CRITICAL: Found user {user_id} in database, user.id={user.id}, moderation_status={user.moderation_status}')
-    except Exception as e:
-        logging.error(f'CRITICAL: Error checking user existence: user:{user_id} - {str(e)}')
-    
+    now = current_time()
+    # INSERT ... SELECT: голос записывается, только если пользователь есть
+    statement = insert(session, ModerationVote).from_select(
+        ['user_id', 'admin_id', 'approved', 'vote_time', 'date_registered'],
+        select(
+            User.telegram_id,
+            literal(admin_id, BigInteger),
+            literal(approved, Boolean),
+            literal(now, DateTime),
+            literal(now, DateTime)
+        ).where(User.telegram_id == user_id)
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'admin_id'],
+        set_={
+            'approved': statement.excluded.approved,
+            'vote_time': statement.excluded.vote_time
+        }
+    )
     try:
-        # Проверяем, голосовал ли уже этот админ за этого пользователя
-        existing_vote = await get_user_moderation_vote(session, user_id, admin_id)
-        logging.info(f'CRITICAL: Checked for existing vote: user:{user_id} admin:{admin_id} exists:{existing_vote is not None}')
-        
-        if existing_vote:
-            # Если голос уже существует, обновляем его
-            logging.info(f'CRITICAL: Updating existing vote: user:{user_id} admin:{admin_id} old_approved:{existing_vote.approved} new_approved:{approved}')
-            existing_vote.approved = approved
-            await session.commit()
-            logging.info(f'CRITICAL: DB updated moderation vote: user:{user_id} admin:{admin_id} approved:{approved}')
-            return existing_vote
-        else:
-            # Если голоса нет, создаем новый
-            logging.info(f'CRITICAL: Creating new vote: user:{user_id} (user.id={user.id}) admin:{admin_id} approved:{approved}')
-            vote = ModerationVote(
-                user_id=user.id,  # Используем user.id из базы данных вместо telegram_id
-                admin_id=admin_id,
-                approved=approved
-            )
-            session.add(vote)
-            await session.commit()
-            await session.refresh(vote)  # Обновляем объект из базы данных
-            logging.info(f'CRITICAL: DB created new moderation vote: user:{user_id} admin:{admin_id} approved:{approved} vote_id:{vote.id}')
-            return vote
+        result = await session.execute(statement)
+        await session.commit()
     except Exception as e:
-        # В случае ошибки откатываем транзакцию и логируем ошибку
         await session.rollback()
-        import traceback
-        logging.error(f'CRITICAL: Ошибка при добавлении голоса модерации: user:{user_id} admin:{admin_id} - {str(e)}')
-        logging.error(f'CRITICAL: Traceback: {traceback.format_exc()}')
-        return None
+        logging.error(
+            'Error adding moderation vote user:%s admin:%s: %s',
+            user_id, admin_id, e
+        )
+        return False
+    if not result.rowcount:
+        logging.error('User %s not found when adding moderation vote', user_id)
+        return False
+    return True
+
+
+async def add_broadcast(
+        session: AsyncSession,
+        admin_id: int,
+        from_chat_id: int,
+        message_id: int,
+        target: str,
+        total: int,
+        progress_message_id: int = None
+) -> Broadcast:
+    broadcast = Broadcast(
+        admin_id=admin_id,
+        from_chat_id=from_chat_id,
+        message_id=message_id,
+        target=target,
+        total=total,
+        progress_message_id=progress_message_id
+    )
+    session.add(broadcast)
+    await session.commit()
+    logging.info(f'DB write new broadcast admin:{admin_id} target:{target}')
+    return broadcast
+
+
+async def add_outbox_message(
+        session: AsyncSession,
+        chat_id: int,
+        text: str,
+        kind: str = 'message',
+        parse_mode: str = None,
+        reply_markup=None
+) -> OutboxMessage:
+    """
+    Поставить сообщение в очередь отправки без коммита, коммит делает
+    вызывающий код вместе со своими изменениями. После коммита нужно
+    вызвать outbox.wake()
+    :param reply_markup: InlineKeyboardMarkup
+    """
+    message = OutboxMessage(
+        chat_id=chat_id,
+        kind=kind,
+        text=text,
+        parse_mode=parse_mode,
+        reply_markup=(
+            reply_markup.model_dump_json(exclude_none=True)
+            if reply_markup is not None else None
+        )
+    )
+    session.add(message)
+    return message
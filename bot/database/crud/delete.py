@@ -2,7 +2,8 @@ import logging
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.database.models.main import ModerationVote
+from bot.database.models.main import ModerationVote, PendingPayment, FsmData, \
+    OutboxMessage
 
 
 async def delete_moderation_votes(session: AsyncSession, user_id: int) -> bool:
@@ -30,4 +31,43 @@ async def delete_moderation_votes(session: AsyncSession, user_id: int) -> bool:
         # В случае ошибки откатываем транзакцию и логируем ошибку
         await session.rollback()
         logging.error(f"Ошибка при удалении голосов модерации для пользователя {user_id}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+async def delete_pending_payment(session: AsyncSession, pending_id: int) -> bool:
+    """
+    Удаляет счёт из ожидающих без коммита, коммит делает вызывающий код
+    :return: True если запись была удалена этим вызовом
+    """
+    result = await session.execute(
+        delete(PendingPayment).where(PendingPayment.id == pending_id)
+    )
+    return result.rowcount == 1
+
+
+async def delete_fsm_expired(session: AsyncSession, updated_before) -> int:
+    """
+    Удаляет состояния FSM, не менявшиеся с updated_before
+    :return: Число удаленных записей
+    """
+    result = await session.execute(
+        delete(FsmData).where(FsmData.date_updated < updated_before)
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def delete_outbox_sent(session: AsyncSession, sent_before) -> int:
+    """
+    Удаляет отправленные сообщения очереди. Недоставленные (dead)
+    остаются для разбора
+    :return: Число удаленных записей
+    """
+    result = await session.execute(
+        delete(OutboxMessage).where(
+            OutboxMessage.status == 'sent',
+            OutboxMessage.date_sent < sent_before
+        )
+    )
+    await session.commit()
+    return result.rowcount
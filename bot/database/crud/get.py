@@ -1,15 +1,26 @@
 import logging
-from sqlalchemy import select, desc
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, desc, func, exists, and_, case, or_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, aliased
 
-from bot.database.models.main import User, Payment, ModerationVote
+from bot.database.cache import session_users, remember_user
+from bot.database.models.main import User, Payment, ModerationVote, \
+    PendingPayment, Broadcast, Media, StatDaily, StatPaymentDaily, StatTotal, \
+    FsmData, OutboxMessage, AutoRenewal
 
 
 async def get_user_tg_id(session: AsyncSession, telegram_id):
+    # Повторные запросы за время обработки апдейта не идут в базу
+    user = session_users(session).get(telegram_id)
+    if user is not None:
+        return user
     statement = select(User).filter(User.telegram_id == telegram_id)
     result = await session.execute(statement)
     user = result.scalar_one_or_none()
+    if user is not None:
+        remember_user(session, user)
     return user
 
 
@@ -23,15 +34,120 @@ async def get_payments_user(session: AsyncSession, telegram_id):
     payments = result.scalars().all()
     return payments
 
-async def get_payments(session: AsyncSession):
-    statement = select(Payment).options(
-            joinedload(Payment.payment_id)
-    ).order_by(
-        desc(Payment.date_registered)
+async def stream_payments(
+        session: AsyncSession,
+        start=None,
+        end=None,
+        payment_system: str = None,
+        telegram_id: int = None,
+        chunk: int = 1000
+):
+    """
+    Платежи для выгрузки, строки читаются с сервера пачками по chunk
+    :param start: Платежи не раньше этой даты
+    :param end: Платежи раньше этой даты
+    """
+    statement = select(
+        Payment.user,
+        User.username,
+        Payment.payment_system,
+        Payment.amount,
+        Payment.period,
+        Payment.id_payment,
+        Payment.date_registered
+    ).outerjoin(
+        User, User.telegram_id == Payment.user
+    ).order_by(desc(Payment.date_registered))
+    if start is not None:
+        statement = statement.filter(Payment.date_registered >= start)
+    if end is not None:
+        statement = statement.filter(Payment.date_registered < end)
+    if payment_system is not None:
+        statement = statement.filter(Payment.payment_system == payment_system)
+    if telegram_id is not None:
+        statement = statement.filter(Payment.user == telegram_id)
+    return await session.stream(
+        statement.execution_options(yield_per=chunk)
+    )
+
+
+async def stream_users(
+        session: AsyncSession,
+        start=None,
+        end=None,
+        status_subscription: bool = None,
+        chunk: int = 1000
+):
+    """
+    Пользователи для выгрузки, строки читаются с сервера пачками по chunk
+    :param start: Зарегистрированные не раньше этой даты
+    :param end: Зарегистрированные раньше этой даты
+    """
+    statement = select(
+        User.telegram_id,
+        User.fullname,
+        User.username,
+        User.lang_tg,
+        User.date_registered,
+        User.status_subscription,
+        User.subscription
+    ).order_by(User.date_registered)
+    if start is not None:
+        statement = statement.filter(User.date_registered >= start)
+    if end is not None:
+        statement = statement.filter(User.date_registered < end)
+    if status_subscription is not None:
+        statement = statement.filter(
+            User.status_subscription == status_subscription
+        )
+    return await session.stream(
+        statement.execution_options(yield_per=chunk)
+    )
+
+
+async def get_pending_payments_due(
+        session: AsyncSession,
+        now,
+        limit: int = None
+):
+    """
+    Счета, у которых подошло время проверки, вместе с языком пользователя
+    """
+    statement = (
+        select(PendingPayment, User.lang_tg)
+        .outerjoin(User, User.telegram_id == PendingPayment.user)
+        .filter(PendingPayment.next_check <= now)
+        .order_by(PendingPayment.next_check)
+        .limit(limit)
     )
     result = await session.execute(statement)
-    payments = result.scalars().all()
-    return payments
+    return result.all()
+
+
+async def get_pending_payment(
+        session: AsyncSession,
+        payment_system: str,
+        invoice_id: str
+):
+    """
+    Счёт по ID в платежной системе вместе с языком пользователя
+    """
+    statement = (
+        select(PendingPayment, User.lang_tg)
+        .outerjoin(User, User.telegram_id == PendingPayment.user)
+        .filter(
+            PendingPayment.payment_system == payment_system,
+            PendingPayment.invoice_id == str(invoice_id)
+        )
+    )
+    result = await session.execute(statement)
+    return result.first()
+
+
+async def get_next_pending_check(session: AsyncSession):
+    statement = select(func.min(PendingPayment.next_check))
+    result = await session.execute(statement)
+    return result.scalar()
 
 
 async def get_users_status(
@@ -47,6 +163,61 @@ async def get_users_status(
     users = result.scalars().all()
     return users
 
+
+async def get_users_expiring(
+        session: AsyncSession,
+        until: datetime,
+        alert: timedelta
+):
+    """
+    Подписчики, у которых до until заканчивается подписка
+    или наступает время предупреждения
+    :return: Строки (telegram_id, subscription, notion_oneday)
+    """
+    statement = select(
+        User.telegram_id, User.subscription, User.notion_oneday
+    ).filter(
+        User.status_subscription == True,
+        User.subscription <= until + alert
+    )
+    result = await session.execute(statement)
+    return result.all()
+
+
+async def get_next_expiry(
+        session: AsyncSession,
+        after: datetime,
+        alert: timedelta
+) -> datetime | None:
+    """
+    Ближайшее после after окончание подписки или предупреждение
+    """
+    end = await session.scalar(
+        select(func.min(User.subscription)).filter(
+            User.status_subscription == True,
+            User.subscription > after
+        )
+    )
+    notion = await session.scalar(
+        select(func.min(User.subscription)).filter(
+            User.status_subscription == True,
+            User.notion_oneday == True,
+            User.subscription > after + alert
+        )
+    )
+    if notion is not None:
+        notion -= alert
+    return min((d for d in (end, notion) if d is not None), default=None)
+
+
+async def get_subscribers_by_ids(session: AsyncSession, telegram_ids):
+    statement = select(User).filter(
+        User.status_subscription == True,
+        User.telegram_id.in_(telegram_ids)
+    )
+    result = await session.execute(statement)
+    return result.scalars().all()
+
 async def get_all_user(
         session: AsyncSession,
         limit: int = None,
@@ -72,95 +243,227 @@ async def get_users_pending_moderation(session: AsyncSession):
     return users
 
 
-async def get_moderation_votes(session: AsyncSession, user_id: int):
-    """
-    Получить все голоса модерации для конкретного пользователя
-    """
-    logging.info(f"CRITICAL: Getting moderation votes for user {user_id}")
-    
-    try:
-        # Сначала проверим, существует ли пользователь в базе данных
-        user_stmt = select(User).filter(User.telegram_id == user_id)
-        user_result = await session.execute(user_stmt)
-        user = user_result.scalar_one_or_none()
-        
-        if not user:
-            logging.error(f"CRITICAL: User {user_id} not found in database when getting votes")
-            return []
-        
-        logging.info(f"CRITICAL: Found user {user_id} in database, user.id={user.id}, moderation_status={user.moderation_status}")
-        
-        # Получаем голоса по telegram_id пользователя
-        # Сначала попробуем найти по user_id в таблице ModerationVote
-        statement = select(ModerationVote).filter(ModerationVote.user_id == user_id)
-        result = await session.execute(statement)
-        votes = result.scalars().all()
-        
-        # Если не нашли голоса по telegram_id, попробуем по user.id в базе данных
-        if not votes:
-            logging.info(f"CRITICAL: No votes found by telegram_id, trying by user.id={user.id}")
-            statement = select(ModerationVote).filter(ModerationVote.user_id == user.id)
-            result = await session.execute(statement)
-            votes = result.scalars().all()
-        
-        # Логируем каждый голос
-        logging.info(f"CRITICAL: Found {len(votes)} votes for user {user_id}")
-        
-        # Логируем голоса в отдельном try-except блоке, чтобы не потерять голоса при ошибке логирования
-        try:
-            for i, vote in enumerate(votes):
-                logging.info(f"CRITICAL: Vote {i+1}: admin_id={vote.admin_id}, approved={vote.approved}")
-        except Exception as e:
-            logging.error(f"CRITICAL: Error logging votes details: {e}")
-        
-        # Возвращаем голоса в любом случае
-        return votes
-    except Exception as e:
-        import traceback
-        logging.error(f"CRITICAL: Error getting moderation votes for user {user_id}: {e}")
-        logging.error(f"CRITICAL: Traceback: {traceback.format_exc()}")
-        # Возвращаем пустой список в случае ошибки
-        return []
-
-
-async def get_user_moderation_vote(session: AsyncSession, user_id: int, admin_id: int):
-    """
-    Получить голос конкретного администратора для конкретного пользователя
-    """
-    logging.info(f"CRITICAL: Getting moderation vote for user {user_id} from admin {admin_id}")
-    
-    # Сначала ищем голос по telegram_id
-    statement = select(ModerationVote).filter(
-        ModerationVote.user_id == user_id,
-        ModerationVote.admin_id == admin_id
-    )
-    result = await session.execute(statement)
-    vote = result.scalar_one_or_none()
-    
-    # Если голос найден, возвращаем его
-    if vote:
-        logging.info(f"CRITICAL: Found vote by telegram_id for user {user_id} from admin {admin_id}")
-        return vote
-    
-    # Если голос не найден, пробуем получить пользователя из базы данных
-    try:
-        user = await get_user_tg_id(session, user_id)
-        if user:
-            # Ищем голос по user.id
-            statement = select(ModerationVote).filter(
-                ModerationVote.user_id == user.id,
-                ModerationVote.admin_id == admin_id
-            )
-            result = await session.execute(statement)
-            vote = result.scalar_one_or_none()
-            
-            if vote:
-                logging.info(f"CRITICAL: Found vote by user.id={user.id} for user {user_id} from admin {admin_id}")
-            else:
-                logging.info(f"CRITICAL: No vote found for user {user_id} from admin {admin_id}")
-            
-            return vote
-    except Exception as e:
-        logging.error(f"CRITICAL: Error getting user for vote: {e}")
-    
-    return None
+async def get_users_moderation_requested(session: AsyncSession, limit: int):
+    """
+    Заявки на модерацию, ожидающие сводки, в порядке поступления
+    """
+    statement = select(
+        User.telegram_id,
+        User.username,
+        User.fullname,
+        User.lang_tg,
+        User.moderation_status,
+        User.moderation_requested
+    ).filter(
+        User.moderation_requested.is_not(None)
+    ).order_by(User.moderation_requested).limit(limit)
+    result = await session.execute(statement)
+    return result.all()
+
+
+async def get_moderation_tally(session: AsyncSession, telegram_id: int):
+    """
+    Итог голосования по пользователю одним запросом
+    :return: Строка (id, moderation_status, approved, rejected)
+    или None, если пользователя нет
+    """
+    statement = select(
+        User.id,
+        User.moderation_status,
+        func.count(case((ModerationVote.approved == True, 1))).label('approved'),
+        func.count(case((ModerationVote.approved == False, 1))).label('rejected')
+    ).outerjoin(
+        ModerationVote, ModerationVote.user_id == User.telegram_id
+    ).filter(
+        User.telegram_id == telegram_id
+    ).group_by(User.id, User.moderation_status)
+    result = await session.execute(statement)
+    return result.one_or_none()
+
+
+def broadcast_filter(statement, target: str):
+    if target == 'subscribe_users':
+        return statement.filter(User.status_subscription == True)
+    if target == 'not_subscribe_users':
+        return statement.filter(User.status_subscription == False)
+    return statement
+
+
+async def count_broadcast_recipients(session: AsyncSession, target: str):
+    statement = broadcast_filter(select(func.count(User.id)), target)
+    return await session.scalar(statement)
+
+
+async def get_broadcast_recipients(
+        session: AsyncSession,
+        target: str,
+        after_id: int,
+        limit: int
+):
+    """
+    Следующая пачка получателей по возрастанию User.id
+    :return: Строки (id, telegram_id)
+    """
+    statement = broadcast_filter(
+        select(User.id, User.telegram_id).filter(User.id > after_id),
+        target
+    ).order_by(User.id).limit(limit)
+    result = await session.execute(statement)
+    return result.all()
+
+
+async def get_active_broadcasts(session: AsyncSession):
+    statement = select(Broadcast).filter(Broadcast.status == 'active')
+    result = await session.execute(statement)
+    return result.scalars().all()
+
+
+async def get_all_media(session: AsyncSession):
+    result = await session.execute(select(Media))
+    return result.scalars().all()
+
+
+async def get_stat_total(session: AsyncSession):
+    statement = select(StatTotal).filter(StatTotal.id == 1)
+    result = await session.execute(statement)
+    return result.scalar_one_or_none()
+
+
+async def get_stat_daily(session: AsyncSession, start, end=None):
+    """
+    Сумма дневной статистики за дни [start, end]
+    :return: (new_users, revenue, payments)
+    """
+    statement = select(
+        func.coalesce(func.sum(StatDaily.new_users), 0),
+        func.coalesce(func.sum(StatDaily.revenue), 0),
+        func.coalesce(func.sum(StatDaily.payments), 0)
+    ).filter(StatDaily.day >= start)
+    if end is not None:
+        statement = statement.filter(StatDaily.day <= end)
+    result = await session.execute(statement)
+    return result.one()
+
+
+async def get_stat_payment_systems(session: AsyncSession, start):
+    """
+    Поступления по платежным системам начиная с дня start
+    :return: [(payment_system, revenue, payments)]
+    """
+    statement = select(
+        StatPaymentDaily.payment_system,
+        func.sum(StatPaymentDaily.revenue),
+        func.sum(StatPaymentDaily.payments)
+    ).filter(
+        StatPaymentDaily.day >= start
+    ).group_by(
+        StatPaymentDaily.payment_system
+    ).order_by(
+        desc(func.sum(StatPaymentDaily.revenue))
+    )
+    result = await session.execute(statement)
+    return result.all()
+
+
+async def get_stat_payment_system_names(session: AsyncSession):
+    statement = select(StatPaymentDaily.payment_system).distinct().order_by(
+        StatPaymentDaily.payment_system
+    )
+    result = await session.execute(statement)
+    return result.scalars().all()
+
+
+async def get_fsm_data(session: AsyncSession, key: str, updated_after):
+    """
+    :param updated_after: Более старые записи считаются удаленными
+    """
+    statement = select(FsmData.state, FsmData.data).filter(
+        FsmData.key == key,
+        FsmData.date_updated >= updated_after
+    )
+    result = await session.execute(statement)
+    return result.one_or_none()
+
+
+def outbox_head():
+    """
+    Условие: первое неотправленное сообщение своего чата.
+    Следующие сообщения чата ждут, пока оно не будет отправлено
+    """
+    earlier = aliased(OutboxMessage)
+    return and_(
+        OutboxMessage.status == 'pending',
+        ~exists().where(
+            earlier.chat_id == OutboxMessage.chat_id,
+            earlier.status == 'pending',
+            earlier.id < OutboxMessage.id
+        )
+    )
+
+
+async def get_outbox_due(session: AsyncSession, now, limit: int):
+    """
+    Сообщения, которые пора отправить, по одному из каждого чата
+    """
+    statement = select(OutboxMessage).filter(
+        outbox_head(),
+        OutboxMessage.next_attempt <= now
+    ).order_by(OutboxMessage.id).limit(limit)
+    result = await session.execute(statement)
+    return result.scalars().all()
+
+
+async def get_next_outbox_attempt(session: AsyncSession):
+    statement = select(func.min(OutboxMessage.next_attempt)).filter(
+        outbox_head()
+    )
+    result = await session.execute(statement)
+    return result.scalar()
+
+
+async def get_renewals_due(
+        session: AsyncSession,
+        until: datetime,
+        now: datetime,
+        max_attempts: int,
+        limit: int = None
+):
+    """
+    Автопродления активных подписок, заканчивающихся до until,
+    без списания в процессе
+    :return: Строки (AutoRenewal, User)
+    """
+    statement = (
+        select(AutoRenewal, User)
+        .join(User, User.telegram_id == AutoRenewal.user)
+        .filter(
+            User.status_subscription == True,
+            User.subscription <= until,
+            AutoRenewal.charge_id.is_(None),
+            or_(
+                AutoRenewal.next_attempt.is_(None),
+                AutoRenewal.next_attempt <= now
+            ),
+            AutoRenewal.attempts < max_attempts
+        )
+        .order_by(User.subscription)
+        .limit(limit)
+    )
+    result = await session.execute(statement)
+    return result.all()
+
+
+async def get_renewal_charges(session: AsyncSession, limit: int = None):
+    """
+    Автопродления со списанием, ожидающим ответа платежной системы
+    :return: Строки (AutoRenewal, User)
+    """
+    statement = (
+        select(AutoRenewal, User)
+        .join(User, User.telegram_id == AutoRenewal.user)
+        .filter(AutoRenewal.charge_id.is_not(None))
+        .order_by(AutoRenewal.charged_at)
+        .limit(limit)
+    )
+    result = await session.execute(statement)
+    return result.all()
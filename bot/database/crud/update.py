@@ -2,10 +2,18 @@ import datetime as dt
 import logging
 
 from datetime import date
-from sqlalchemy import select
+from typing import NamedTuple
+
+from sqlalchemy import DateTime, Float, String, case, delete, func, \
+    literal, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.database.models.main import User
+from bot.database.cache import invalidate_user
+from bot.database.crud.create import add_outbox_message
+from bot.database.main import insert, shift_datetime
+from bot.database.models.main import User, Broadcast, Media, FsmData, \
+    Payment, current_time
+from bot.database.stats import stat_active_subs, stat_payment
 from bot.misc.config import timezone_offset
 
 
@@ -28,38 +36,232 @@ async def user_swith_sub(
     statement = select(User).filter(User.telegram_id == telegram_id)
     result = await session.execute(statement)
     user = result.scalar_one_or_none()
+    if bool(user.status_subscription) != new_value:
+        await stat_active_subs(session, 1 if new_value else -1)
     user.status_subscription = new_value
     user.notion_oneday = new_value
     await session.commit()
+    invalidate_user(session, telegram_id)
 
 
-async def user_subscribe(
+async def users_swith_one_day(
         session: AsyncSession,
-        telegram_id: int,
-        period: str
+        telegram_ids: list[int],
+        new_value: bool
 ):
-    statement = select(User).filter(User.telegram_id == telegram_id)
-    result = await session.execute(statement)
-    user = result.scalar_one_or_none()
-    time_delta = dt.timedelta()
+    """
+    Одним UPDATE для пачки пользователей
+    """
+    await session.execute(
+        update(User)
+        .where(User.telegram_id.in_(telegram_ids))
+        .values(notion_oneday=new_value)
+    )
+    await session.commit()
+
+
+async def users_swith_sub(
+        session: AsyncSession,
+        telegram_ids: list[int],
+        new_value: bool
+):
+    """
+    Одним UPDATE для пачки пользователей
+    """
+    changed = await session.scalar(
+        select(func.count())
+        .select_from(User)
+        .where(
+            User.telegram_id.in_(telegram_ids),
+            User.status_subscription.is_not(new_value)
+        )
+    )
+    await stat_active_subs(session, changed if new_value else -changed)
+    await session.execute(
+        update(User)
+        .where(User.telegram_id.in_(telegram_ids))
+        .values(status_subscription=new_value, notion_oneday=new_value)
+    )
+    await session.commit()
+    for telegram_id in telegram_ids:
+        invalidate_user(session, telegram_id)
+
+
+def period_delta(period: str) -> dt.timedelta:
+    """
+    Длительность периода подписки
+    :param period: Период вида mon.1
+    """
     type_period = period.split('.')
     match type_period[0]:
         case 'min':
-            time_delta = dt.timedelta(minutes=int(type_period[1]))
+            return dt.timedelta(minutes=int(type_period[1]))
         case 'day':
-            time_delta = dt.timedelta(days=int(type_period[1]))
+            return dt.timedelta(days=int(type_period[1]))
         case 'mon':
-            time_delta = dt.timedelta(days=31*int(type_period[1]))
+            return dt.timedelta(days=31*int(type_period[1]))
         case 'year':
-            time_delta = dt.timedelta(days=365*int(type_period[1]))
-    if user.status_subscription:
-        user.subscription += time_delta
-    else:
-        user.subscription = dt.datetime.now() + time_delta
-    user.status_subscription = True
-    user.notion_oneday = True
+            return dt.timedelta(days=365*int(type_period[1]))
+    return dt.timedelta()
+
+
+async def extend_subscriptions(
+        session: AsyncSession,
+        telegram_ids: list[int],
+        period: str
+) -> dict[int, dt.datetime]:
+    """
+    Продлить подписки одним UPDATE ... RETURNING без коммита.
+    Неактивная подписка начинается с текущего момента
+    :return: Новая дата окончания подписки по telegram_id
+    """
+    start = current_time() + period_delta(period)
+    result = await session.execute(
+        update(User)
+        .where(User.telegram_id.in_(telegram_ids))
+        .values(
+            subscription=case(
+                (
+                    User.status_subscription == True,
+                    shift_datetime(
+                        session, User.subscription, period_delta(period)
+                    )
+                ),
+                else_=literal(start, DateTime)
+            ),
+            status_subscription=True,
+            notion_oneday=True
+        )
+        .returning(User.telegram_id, User.subscription)
+    )
+    subscriptions = dict(result.all())
+    # Продлённая подписка не может закончиться ровно в start
+    await stat_active_subs(
+        session,
+        sum(subscription == start for subscription in subscriptions.values())
+    )
+    return subscriptions
+
+
+class FinalizedPayment(NamedTuple):
+    """Итог finalize_payment"""
+    # Новая дата окончания подписки, None - платёж не записан
+    subscription: dt.datetime | None
+    # Платёж с этим id_payment уже засчитан раньше
+    duplicate: bool = False
+
+
+async def finalize_payment(
+        session: AsyncSession,
+        telegram_id: int,
+        deposit,
+        payment_system: str,
+        id_payment: str | None,
+        period: str
+) -> FinalizedPayment:
+    """
+    Записать платёж и продлить подписку. Запись идёт в точке сохранения:
+    ошибка откатывает только её, изменения вызывающего кода в сессии
+    остаются. Записанный платёж фиксируется коммитом вместе с ними.
+    Повторное подтверждение того же id_payment ничего не меняет
+    """
+    now = current_time()
+    # INSERT ... SELECT: платёж записывается, только если пользователь есть
+    statement = insert(session, Payment).from_select(
+        [
+            'user', 'amount', 'payment_system', 'id_payment', 'period',
+            'date_registered'
+        ],
+        select(
+            User.telegram_id,
+            literal(deposit, Float),
+            literal(payment_system, String),
+            literal(id_payment, String),
+            literal(period, String),
+            literal(now, DateTime)
+        ).where(User.telegram_id == telegram_id)
+    ).on_conflict_do_nothing(
+        index_elements=['payment_system', 'id_payment']
+    ).returning(Payment.id)
+    async with session.begin_nested():
+        if await session.scalar(statement) is None:
+            duplicate = id_payment is not None and await session.scalar(
+                select(Payment.id).where(
+                    Payment.payment_system == payment_system,
+                    Payment.id_payment == id_payment
+                ).limit(1)
+            ) is not None
+            subscriptions = None
+        else:
+            await stat_payment(session, payment_system, deposit)
+            subscriptions = await extend_subscriptions(
+                session, [telegram_id], period
+            )
+    if subscriptions is None:
+        logging.warning(
+            'Payment %s:%s user:%s skipped, %s',
+            payment_system, id_payment, telegram_id,
+            'already credited' if duplicate else 'no user'
+        )
+        return FinalizedPayment(None, duplicate)
+    await session.commit()
+    invalidate_user(session, telegram_id)
+    logging.info(
+        'DB write payment %s:%s user:%s amount:%s, subscribed',
+        payment_system, id_payment, telegram_id, deposit
+    )
+    return FinalizedPayment(subscriptions.get(telegram_id))
+
+
+async def finalize_payments(
+        session: AsyncSession,
+        payments: list[dict]
+) -> dict[int, dt.datetime]:
+    """
+    Записать пачку платежей и продлить подписки одним коммитом.
+    Изменения, сделанные в сессии до вызова, фиксируются тем же коммитом,
+    ошибка откатывает только точку сохранения с платежами
+    :param payments: Словари с полями Payment: user, amount,
+    payment_system, id_payment, period
+    :return: Новая дата окончания подписки по telegram_id,
+    уже засчитанные платежи пропускаются
+    """
+    now = current_time()
+    async with session.begin_nested():
+        inserted = (await session.execute(
+            insert(session, Payment)
+            .values([dict(payment, date_registered=now) for payment in payments])
+            .on_conflict_do_nothing(
+                index_elements=['payment_system', 'id_payment']
+            )
+            .returning(
+                Payment.user,
+                Payment.amount,
+                Payment.payment_system,
+                Payment.period
+            )
+        )).all()
+        revenue: dict[str, list] = {}
+        periods: dict[str, list[int]] = {}
+        for telegram_id, amount, payment_system, period in inserted:
+            total = revenue.setdefault(payment_system, [0, 0])
+            total[0] += amount
+            total[1] += 1
+            periods.setdefault(period, []).append(telegram_id)
+        for payment_system, (amount, count) in revenue.items():
+            await stat_payment(session, payment_system, amount, count)
+        subscriptions = {}
+        for period, telegram_ids in periods.items():
+            subscriptions.update(
+                await extend_subscriptions(session, telegram_ids, period)
+            )
     await session.commit()
-    logging.info(f'user {telegram_id} subscribed, DB write')
+    for telegram_id in subscriptions:
+        invalidate_user(session, telegram_id)
+    logging.info(
+        'DB write %s of %s payments, subscribed', len(inserted), len(payments)
+    )
+    return subscriptions
 
 
 async def user_new_subscribe(
@@ -76,6 +278,7 @@ async def user_new_subscribe(
     )
     user.subscription = selected_datetime
     selected_datetime = selected_datetime.replace(tzinfo=timezone_offset)
+    was_active = bool(user.status_subscription)
     if selected_datetime > dt.datetime.now(timezone_offset):
         user.status_subscription = True
         user.notion_oneday = True
@@ -84,7 +287,12 @@ async def user_new_subscribe(
         user.status_subscription = False
         user.notion_oneday = False
         logging.info(f'user {telegram_id} un subscribed, DB write')
+    await stat_active_subs(
+        session,
+        int(user.status_subscription) - int(was_active)
+    )
     await session.commit()
+    invalidate_user(session, telegram_id)
     await session.refresh(user)
     return user
 
@@ -99,14 +307,61 @@ async def user_swith_ban(session: AsyncSession, telegram_id: int) -> bool | None
     user.blocked = not user.blocked
     new_value = not user.blocked
     await session.commit()
+    invalidate_user(session, telegram_id)
     return new_value
 
 
+async def user_reset_moderation_status(
+        session: AsyncSession,
+        telegram_id: int
+):
+    """
+    Вернуть пользователя на модерацию без уведомлений
+    """
+    await session.execute(
+        update(User)
+        .where(User.telegram_id == telegram_id)
+        .values(moderation_status=None)
+    )
+    await session.commit()
+    invalidate_user(session, telegram_id)
+
+
+async def user_request_moderation(session: AsyncSession, telegram_id: int):
+    """
+    Отметить заявку для следующей сводки администраторам.
+    Повторная заявка до отправки сводки время не меняет
+    """
+    await session.execute(
+        update(User)
+        .where(
+            User.telegram_id == telegram_id,
+            User.moderation_requested.is_(None)
+        )
+        .values(moderation_requested=current_time())
+    )
+    await session.commit()
+
+
+async def users_clear_moderation_requested(
+        session: AsyncSession,
+        telegram_ids: list[int]
+):
+    """
+    Снять отметку с заявок, попавших в сводку, без коммита
+    """
+    await session.execute(
+        update(User)
+        .where(User.telegram_id.in_(telegram_ids))
+        .values(moderation_requested=None)
+    )
+
+
 async def update_user_moderation_status(
         session: AsyncSession,
         telegram_id: int,
         status: bool,
-        bot = None,
+        notifications: list[str] = None,
         user_record_ids = None
 ) -> User:
     """
@@ -114,77 +369,146 @@ async def update_user_moderation_status(
     :param session: Сессия базы данных
     :param telegram_id: ID пользователя
     :param status: True - одобрен, False - отклонен
-    :param bot: Экземпляр бота для отправки уведомления пользователю
+    :param notifications: Тексты уведомлений пользователю, ставятся в
+    outbox в той же транзакции, что и новый статус
     :param user_record_ids: Список ID записей пользователя для обновления
     :return: Объект пользователя или None, если пользователь не найден
     """
-    import datetime
-    logging.info(f'CRITICAL: Starting update_user_moderation_status for user {telegram_id} with status {status}')
-    logging.info(f'CRITICAL: Current time: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
-    logging.info(f'CRITICAL: Bot provided: {bot is not None}')
-    logging.info(f'CRITICAL: User record IDs provided: {user_record_ids}')
-    
+    logging.debug('Update moderation status user:%s to %s', telegram_id, status)
+
     # Сначала получаем основного пользователя для возврата
     statement = select(User).filter(User.telegram_id == telegram_id)
     result = await session.execute(statement)
     user = result.scalar_one_or_none()
-    
-    logging.info(f'CRITICAL: Found user in database: {user is not None}')
-    if user:
-        logging.info(f'CRITICAL: User details - ID: {user.id}, telegram_id: {user.telegram_id}, current moderation_status: {user.moderation_status}')
-    
+
     if user is not None:
         # Обновляем статус модерации для основного пользователя
         user.moderation_status = status
-        
+
         # Если переданы ID записей пользователя, обновляем статус для всех записей
         if user_record_ids and len(user_record_ids) > 0:
             try:
-                logging.info(f'CRITICAL: Updating moderation status for all user records: {user_record_ids}')
                 # Обновляем статус модерации для всех записей пользователя
                 for record_id in user_record_ids:
                     # Получаем запись пользователя по ID
                     record_stmt = select(User).filter(User.id == record_id)
                     record_result = await session.execute(record_stmt)
                     user_record = record_result.scalar_one_or_none()
-                    
+
                     if user_record:
                         user_record.moderation_status = status
-                        logging.info(f'CRITICAL: Updated moderation status for user record ID {record_id} to {status}')
-            except Exception as e:
-                logging.error(f'CRITICAL: Error updating moderation status for user records: {e}')
-                import traceback
-                logging.error(f'CRITICAL: Traceback: {traceback.format_exc()}')
-        
+            except Exception:
+                logging.exception(
+                    'Error updating moderation status for user records %s',
+                    user_record_ids
+                )
+
+        # Уведомления сохраняются вместе со статусом и не теряются
+        # при перезапуске, отправляет их сервис outbox
+        for text in notifications or ():
+            await add_outbox_message(
+                session, telegram_id, text, kind='moderation'
+            )
+
         # Сохраняем изменения в базе данных
         await session.commit()
+        invalidate_user(session, telegram_id)
+        if notifications:
+            from bot.service.outbox import outbox
+            outbox.wake()
         # Обновляем пользователя в сессии
         await session.refresh(user)
-        logging.info(f'CRITICAL: User {telegram_id} moderation status updated to {status}, user: {user.moderation_status}')
-        
-        # Отправляем уведомление пользователю, если бот предоставлен
-        if bot is not None:
-            from bot.handlers.admin.moderation import send_notification_in_background
-            import asyncio
-            # Запускаем отправку уведомления в фоновом режиме
-            task = asyncio.create_task(send_notification_in_background(bot, telegram_id, status))
-            logging.info(f'CRITICAL: Notification task created for user {telegram_id}, status: {status}')
-            
-            # Добавляем обработчик завершения задачи для логирования результата
-            def log_task_result(task):
-                try:
-                    # Проверяем, была ли задача отменена или завершена с ошибкой
-                    if task.cancelled():
-                        logging.error(f'CRITICAL: Notification task for user {telegram_id} was cancelled')
-                    elif task.exception():
-                        logging.error(f'CRITICAL: Notification task for user {telegram_id} failed with error: {task.exception()}')
-                    else:
-                        logging.info(f'CRITICAL: Notification task for user {telegram_id} completed successfully')
-                except Exception as e:
-                    logging.error(f'CRITICAL: Error in log_task_result for user {telegram_id}: {e}')
-            
-            # Добавляем callback для отслеживания результата
-            task.add_done_callback(log_task_result)
+        logging.info('User %s moderation status updated to %s', telegram_id, status)
     else:
-        logging.error(f'CRITICAL: User {telegram_id} not found in database')
-    return user
\ No newline at end of file
+        logging.error('User %s not found when updating moderation status', telegram_id)
+    return user
+
+
+async def update_broadcast_progress(
+        session: AsyncSession,
+        broadcast_id: int,
+        last_user_id: int,
+        sent: int,
+        failed: int,
+        status: str = None
+):
+    values = dict(last_user_id=last_user_id, sent=sent, failed=failed)
+    if status is not None:
+        values.update(status=status, date_finished=dt.datetime.now())
+    await session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(**values)
+    )
+    await session.commit()
+
+
+async def update_media(
+        session: AsyncSession,
+        path: str,
+        media_type: str,
+        file_hash: str,
+        file_id: str,
+        file_unique_id: str = None
+):
+    """
+    Записать file_id файла без коммита, для write_queue.
+    Одновременные загрузки одного файла обновляют одну запись
+    """
+    values = dict(
+        file_hash=file_hash,
+        file_id=file_id,
+        file_unique_id=file_unique_id
+    )
+    statement = insert(session, Media).values(
+        path=path, media_type=media_type, **values
+    )
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=['path', 'media_type'],
+            set_={name: statement.excluded[name] for name in values}
+        )
+    )
+    logging.info('DB write media %s file_id', path)
+
+
+async def update_fsm_data(
+        session: AsyncSession,
+        key: str,
+        updated_after: dt.datetime,
+        **values
+):
+    """
+    Записать state или data без коммита. Пустая запись удаляется
+    :param updated_after: В более старой записи незаписываемые поля
+    считаются удаленными и очищаются
+    """
+    now = current_time()
+    expired = FsmData.date_updated < updated_after
+    kept = {
+        name: case((expired, None), else_=getattr(FsmData, name))
+        for name in ('state', 'data') if name not in values
+    }
+    if all(value is None for value in values.values()):
+        # Запись без state и data не нужна
+        await session.execute(
+            update(FsmData)
+            .where(FsmData.key == key)
+            .values(date_updated=now, **values, **kept)
+        )
+        await session.execute(
+            delete(FsmData).where(
+                FsmData.key == key,
+                FsmData.state.is_(None),
+                FsmData.data.is_(None)
+            )
+        )
+        return
+    await session.execute(
+        insert(session, FsmData).values(
+            key=key, date_updated=now, **values
+        ).on_conflict_do_update(
+            index_elements=['key'],
+            set_=dict(date_updated=now, **values, **kept)
+        )
+    )
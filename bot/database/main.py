@@ -1,5 +1,12 @@
-from sqlalchemy.ext.asyncio import create_async_engine
+from datetime import timedelta
 
+from sqlalchemy import URL, DateTime, String, func, literal, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, \
+    AsyncSession, async_sessionmaker
+
+from bot.database.sqlite_engine import setup_pragmas, routing_sessionmaker
 from bot.misc import Config
 
 import os
@@ -9,11 +16,154 @@ db_dir = os.path.join(os.path.dirname(__file__), 'sqlite')
 os.makedirs(db_dir, exist_ok=True)
 
 # Путь к файлу базы данных SQLite
-db_path = os.path.join(db_dir, 'PrivateClubDB.db')
+db_path = Config.SQLITE_PATH or os.path.join(db_dir, 'PrivateClubDB.db')
 
-# Используем SQLite вне зависимости от значения DEBUG
+# База данных SQLite, используется при DB_ENGINE=sqlite
 ENGINE = f"sqlite+aiosqlite:///{db_path}"
 
+_engine: AsyncEngine | None = None
+_read_engine: AsyncEngine | None = None
+_storage_engine: AsyncEngine | None = None
+
+# Соединений для чтения состояний FSM
+STORAGE_POOL_SIZE = 4
+
+
+def database_url() -> str | URL:
+    if Config.DB_ENGINE == 'postgres':
+        return URL.create(
+            'postgresql+asyncpg',
+            username=Config.POSTGRES_USER,
+            password=Config.POSTGRES_PASSWORD,
+            host=Config.POSTGRES_HOST,
+            port=Config.POSTGRES_PORT,
+            database=Config.POSTGRES_DB,
+            query={
+                'prepared_statement_cache_size':
+                    str(Config.DB_STATEMENT_CACHE_SIZE)
+            }
+        )
+    return ENGINE
+
+
+def pool_size() -> int:
+    """
+    Обновление держит не больше одного соединения из пула, а обрабатывается
+    одновременно не больше UPDATE_CONCURRENCY обновлений. Фоновым сервисам
+    остаются соединения сверх пула (DB_MAX_OVERFLOW)
+    """
+    return max(Config.DB_POOL_SIZE, Config.UPDATE_CONCURRENCY)
+
+
+def engine() -> AsyncEngine:
+    """
+    Движок базы данных, один на процесс.
+    Для SQLite это единственное соединение писателя, записи
+    ждут его дольше, чем чтения ждут соединение из пула
+    """
+    global _engine
+    if _engine is not None:
+        return _engine
+    if Config.DB_ENGINE == 'postgres':
+        _engine = create_async_engine(
+            database_url(),
+            pool_size=pool_size(),
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+            pool_recycle=30 * 60,
+            connect_args={
+                'statement_cache_size': Config.DB_STATEMENT_CACHE_SIZE
+            }
+        )
+    else:
+        _engine = create_async_engine(
+            database_url(),
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=60
+        )
+        setup_pragmas(_engine)
+    return _engine
+
+
+def read_engine() -> AsyncEngine:
+    """
+    Пул соединений SQLite только для чтения
+    """
+    global _read_engine
+    if _read_engine is None:
+        _read_engine = create_async_engine(
+            database_url(),
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size(),
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT
+        )
+        setup_pragmas(_read_engine)
+    return _read_engine
+
+
+def storage_engine() -> AsyncEngine:
+    """
+    Отдельный небольшой пул для чтения состояний FSM. Хранилище читает
+    состояние внутри обработчика, который уже держит соединение из
+    основного пула, и не должно ждать соединение из того же пула
+    """
+    global _storage_engine
+    if _storage_engine is not None:
+        return _storage_engine
+    connect_args = {}
+    if Config.DB_ENGINE == 'postgres':
+        connect_args['statement_cache_size'] = Config.DB_STATEMENT_CACHE_SIZE
+    _storage_engine = create_async_engine(
+        database_url(),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=STORAGE_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_pre_ping=Config.DB_ENGINE == 'postgres',
+        connect_args=connect_args
+    )
+    if Config.DB_ENGINE != 'postgres':
+        setup_pragmas(_storage_engine)
+    return _storage_engine
+
+
+def session_maker() -> async_sessionmaker:
+    if Config.DB_ENGINE == 'postgres':
+        return async_sessionmaker(engine(), expire_on_commit=False)
+    return routing_sessionmaker(engine(), read_engine())
+
+
+def insert(session: AsyncSession, table):
+    """
+    INSERT с поддержкой ON CONFLICT для текущей базы данных
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
 
-def engine():
-    return create_async_engine(ENGINE)
+def shift_datetime(session: AsyncSession, column, delta: timedelta):
+    """
+    Выражение column + delta, вычисляемое в базе данных.
+    SQLite хранит даты строками и не умеет складывать их с интервалом
+    :param delta: Целое число секунд
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        return column + delta
+    if delta.microseconds:
+        raise ValueError(f'delta {delta} is not whole seconds')
+    # strftime теряет микросекунды, поэтому сдвигаются только целые
+    # секунды, а дробная часть строки дописывается без изменений
+    return type_coerce(
+        func.strftime(
+            '%Y-%m-%d %H:%M:%S',
+            column,
+            literal(f'{int(delta.total_seconds()):+d} seconds'),
+            type_=String
+        ) + func.substr(column, 20),
+        DateTime
+    )
@@ -0,0 +1,71 @@
+import logging
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, \
+    func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from bot.database.migrations.versions import MIGRATIONS
+from bot.database.models.main import current_time
+
+log = logging.getLogger(__name__)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+schema_version = Table(
+    'schema_version',
+    MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String),
+    Column('date_applied', DateTime, default=current_time),
+)
+
+
+class SchemaError(Exception):
+    """Схема базы данных отстаёт от кода"""
+
+
+async def get_schema_version(async_engine: AsyncEngine) -> int:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(schema_version.create, checkfirst=True)
+        version = await conn.scalar(select(func.max(schema_version.c.version)))
+    return version or 0
+
+
+async def run_migrations(async_engine: AsyncEngine) -> list[int]:
+    """
+    Применить недостающие миграции
+    :return: Версии примененных миграций
+    """
+    current = await get_schema_version(async_engine)
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        async with async_engine.begin() as conn:
+            await conn.run_sync(migration)
+            await conn.execute(
+                schema_version.insert().values(
+                    version=version,
+                    description=description
+                )
+            )
+        log.info('Applied migration %s: %s', version, description)
+        applied.append(version)
+    return applied
+
+
+async def check_schema(async_engine: AsyncEngine):
+    """
+    :raise SchemaError: Есть непримененные миграции
+    """
+    version = await get_schema_version(async_engine)
+    if version < LATEST_VERSION:
+        raise SchemaError(
+            f'Database schema version {version} is behind {LATEST_VERSION}, '
+            f'run: python run_migration.py'
+        )
+    if version > LATEST_VERSION:
+        raise SchemaError(
+            f'Database schema version {version} is newer than the code '
+            f'({LATEST_VERSION})'
+        )
@@ -0,0 +1,158 @@
+"""
+Миграции схемы. Каждая миграция - функция от синхронного соединения,
+выполняется в своей транзакции. Миграции не должны падать, если изменение
+уже есть в базе: новая база создаётся первой миграцией по текущим моделям.
+Новые миграции добавляются в конец MIGRATIONS.
+"""
+from sqlalchemy import Connection, delete, func, inspect, select, text, \
+    update
+
+from bot.database.models.main import Base, Media, ModerationVote, \
+    Payment, User
+from bot.database.stats import rebuild_stats
+
+
+def create_table(conn: Connection, name: str):
+    Base.metadata.tables[name].create(conn, checkfirst=True)
+
+
+def create_index(conn: Connection, table: str, name: str):
+    for index in Base.metadata.tables[table].indexes:
+        if index.name == name:
+            index.create(conn, checkfirst=True)
+            return
+    raise ValueError(f'Index {name} not found in model {table}')
+
+
+def drop_index(conn: Connection, table: str, name: str):
+    if any(index['name'] == name for index in inspect(conn).get_indexes(table)):
+        conn.execute(text(f'DROP INDEX {name}'))
+
+
+def add_column(conn: Connection, table: str, name: str):
+    if any(column['name'] == name for column in inspect(conn).get_columns(table)):
+        return
+    column = Base.metadata.tables[table].columns[name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {column_type}'))
+
+
+def initial(conn: Connection):
+    for table in ('user', 'payment', 'moderationvote'):
+        create_table(conn, table)
+    # Базы до появления модерации
+    add_column(conn, 'user', 'moderation_status')
+
+
+def service_tables(conn: Connection):
+    for table in ('pendingpayment', 'broadcast', 'media'):
+        create_table(conn, table)
+
+
+def query_indexes(conn: Connection):
+    for table, name in (
+            ('user', 'ix_user_status_subscription'),
+            ('user', 'ix_user_date_registered'),
+            ('user', 'ix_user_moderation_status'),
+            ('payment', 'ix_payment_user_date_registered'),
+            ('payment', 'ix_payment_date_registered'),
+    ):
+        create_index(conn, table, name)
+
+
+def stats_tables(conn: Connection):
+    for table in ('statdaily', 'statpaymentdaily', 'stattotal'):
+        create_table(conn, table)
+    rebuild_stats(conn)
+
+
+def fsm_table(conn: Connection):
+    create_table(conn, 'fsmdata')
+
+
+def outbox_table(conn: Connection):
+    create_table(conn, 'outboxmessage')
+
+
+def moderation_votes_unique(conn: Connection):
+    # Часть голосов записана с User.id вместо telegram_id
+    conn.execute(
+        update(ModerationVote)
+        .where(
+            ModerationVote.user_id.not_in(
+                select(User.telegram_id).where(User.telegram_id.is_not(None))
+            ),
+            ModerationVote.user_id.in_(select(User.id))
+        )
+        .values(
+            user_id=select(User.telegram_id)
+            .where(User.id == ModerationVote.user_id)
+            .scalar_subquery()
+        )
+    )
+    # Из повторных голосов администратора оставляем последний
+    conn.execute(
+        delete(ModerationVote).where(
+            ModerationVote.id.not_in(
+                select(func.max(ModerationVote.id))
+                .group_by(ModerationVote.user_id, ModerationVote.admin_id)
+            )
+        )
+    )
+    drop_index(conn, 'moderationvote', 'ix_moderationvote_user_id_admin_id')
+    create_index(conn, 'moderationvote', 'uq_moderationvote_user_id_admin_id')
+
+
+def moderation_digest(conn: Connection):
+    add_column(conn, 'user', 'moderation_requested')
+    create_index(conn, 'user', 'ix_user_moderation_requested')
+
+
+def payments_unique(conn: Connection):
+    # Из платежей, засчитанных несколько раз, оставляем первый
+    duplicates = conn.execute(
+        delete(Payment).where(
+            Payment.id_payment.is_not(None),
+            Payment.id.not_in(
+                select(func.min(Payment.id))
+                .where(Payment.id_payment.is_not(None))
+                .group_by(Payment.payment_system, Payment.id_payment)
+            )
+        )
+    ).rowcount
+    if duplicates:
+        rebuild_stats(conn)
+    create_index(conn, 'payment', 'uq_payment_payment_system_id_payment')
+
+
+def auto_renewal_table(conn: Connection):
+    create_table(conn, 'autorenewal')
+
+
+def media_unique(conn: Connection):
+    # Из записей одного файла оставляем последнюю загрузку
+    conn.execute(
+        delete(Media).where(
+            Media.id.not_in(
+                select(func.max(Media.id))
+                .group_by(Media.path, Media.media_type)
+            )
+        )
+    )
+    create_index(conn, 'media', 'uq_media_path_media_type')
+
+
+# (версия, описание, функция)
+MIGRATIONS = [
+    (1, 'initial schema', initial),
+    (2, 'payment watcher, broadcast and media tables', service_tables),
+    (3, 'indexes for hot queries', query_indexes),
+    (4, 'statistics rollups', stats_tables),
+    (5, 'fsm storage', fsm_table),
+    (6, 'notification outbox', outbox_table),
+    (7, 'unique moderation votes', moderation_votes_unique),
+    (8, 'moderation request digest', moderation_digest),
+    (9, 'unique payments', payments_unique),
+    (10, 'subscription auto-renewal', auto_renewal_table),
+    (11, 'unique media', media_unique),
+]
@@ -4,9 +4,8 @@ from datetime import datetime
 from sqlalchemy.orm import declared_attr, declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy import Column, Integer, String, ForeignKey, BigInteger
-from sqlalchemy import Float, DateTime, Boolean
-
-from bot.database.main import engine
+from sqlalchemy import Float, DateTime, Boolean, Index, Date, UniqueConstraint, \
+    Text
 
 
 def current_time():
@@ -35,9 +34,23 @@ class User(Base):
     blocked = Column(Boolean, default=False)
     # Статус модерации: None - ожидает модерации, True - одобрен, False - отклонен
     moderation_status = Column(Boolean, nullable=True, default=None)
+    # Время заявки на модерацию, ещё не отправленной администраторам в сводке
+    moderation_requested = Column(DateTime, nullable=True)
     payment = relationship('Payment', back_populates='payment_id')
     moderation_votes = relationship('ModerationVote', back_populates='user')
 
+    __table_args__ = (
+        # Выборка истекающих подписок в ExpiryScheduler
+        Index(
+            'ix_user_status_subscription',
+            'status_subscription',
+            'subscription'
+        ),
+        Index('ix_user_date_registered', 'date_registered'),
+        Index('ix_user_moderation_status', 'moderation_status'),
+        Index('ix_user_moderation_requested', 'moderation_requested'),
+    )
+
 
 class Payment(Base):
     user = Column(BigInteger, ForeignKey("user.telegram_id"))
@@ -47,6 +60,18 @@ class Payment(Base):
     id_payment = Column(String, nullable=True)
     period = Column(String, nullable=True)
 
+    __table_args__ = (
+        Index('ix_payment_user_date_registered', 'user', 'date_registered'),
+        Index('ix_payment_date_registered', 'date_registered'),
+        # Платёж засчитывается один раз, повторное подтверждение - пропуск
+        Index(
+            'uq_payment_payment_system_id_payment',
+            'payment_system',
+            'id_payment',
+            unique=True
+        ),
+    )
+
 
 class ModerationVote(Base):
     user_id = Column(BigInteger, ForeignKey("user.telegram_id"))
@@ -55,9 +80,151 @@ class ModerationVote(Base):
     approved = Column(Boolean)  # True - одобрено, False - отклонено
     vote_time = Column(DateTime, default=current_time)
 
-
-async def create_all_table():
-    async_engine = engine()
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    return async_engine
+    __table_args__ = (
+        # Один голос администратора за пользователя, повторный - обновляет
+        Index(
+            'uq_moderationvote_user_id_admin_id',
+            'user_id',
+            'admin_id',
+            unique=True
+        ),
+    )
+
+
+class PendingPayment(Base):
+    """
+    Счёт, ожидающий оплаты. Статус проверяет PaymentWatcher,
+    после оплаты или истечения срока запись удаляется.
+    """
+    user = Column(BigInteger, index=True)
+    payment_system = Column(String)
+    invoice_id = Column(String)
+    price = Column(Integer)
+    period = Column(String)
+    type_payment = Column(String, nullable=True)
+    message_id = Column(BigInteger, nullable=True)
+    next_check = Column(DateTime, default=current_time, index=True)
+    attempts = Column(Integer, default=0)
+
+
+class AutoRenewal(Base):
+    """
+    Сохранённый способ оплаты ЮKassa для автопродления подписки.
+    charge_id - списание, ожидающее ответа ЮKassa.
+    """
+    user = Column(BigInteger, unique=True)
+    payment_method_id = Column(String)
+    price = Column(Integer)
+    period = Column(String)
+    charge_id = Column(String, nullable=True)
+    charged_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    # None - списать при первой возможности
+    next_attempt = Column(DateTime, nullable=True)
+
+
+class Broadcast(Base):
+    """
+    Рассылка администратора. Получатели выбираются по возрастанию User.id,
+    last_user_id позволяет продолжить рассылку после перезапуска.
+    """
+    admin_id = Column(BigInteger)
+    from_chat_id = Column(BigInteger)
+    message_id = Column(BigInteger)
+    progress_message_id = Column(BigInteger, nullable=True)
+    # all_users, subscribe_users, not_subscribe_users
+    target = Column(String)
+    status = Column(String, default='active', index=True)
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    last_user_id = Column(Integer, default=0)
+    date_finished = Column(DateTime, nullable=True)
+
+
+class Media(Base):
+    """
+    file_id загруженных в Telegram файлов из bot/img
+    """
+    path = Column(String, index=True)
+    media_type = Column(String)
+    file_hash = Column(String)
+    file_id = Column(String)
+    file_unique_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Одна запись на файл, повторная загрузка обновляет file_id
+        Index('uq_media_path_media_type', 'path', 'media_type', unique=True),
+    )
+
+
+class StatDaily(Base):
+    """
+    Статистика за день, обновляется вместе с пользователями и платежами.
+    active_subs - число активных подписок на момент последнего изменения
+    """
+    day = Column(Date, unique=True)
+    new_users = Column(Integer, default=0)
+    active_subs = Column(Integer, default=0)
+    revenue = Column(Float, default=0)
+    payments = Column(Integer, default=0)
+
+
+class StatPaymentDaily(Base):
+    """
+    Поступления за день по платежной системе
+    """
+    day = Column(Date)
+    payment_system = Column(String)
+    revenue = Column(Float, default=0)
+    payments = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('day', 'payment_system'),
+    )
+
+
+class StatTotal(Base):
+    """
+    Итоги за всё время, одна строка с id = 1
+    """
+    users = Column(Integer, default=0)
+    active_subs = Column(Integer, default=0)
+    revenue = Column(Float, default=0)
+    payments = Column(Integer, default=0)
+
+
+class FsmData(Base):
+    """
+    Состояние FSM и данные диалогов aiogram_dialog, см. DbStorage
+    """
+    key = Column(String, unique=True)
+    state = Column(String, nullable=True)
+    # Компактный JSON, None - данных нет
+    data = Column(Text, nullable=True)
+    date_updated = Column(DateTime, default=current_time, index=True)
+
+
+class OutboxMessage(Base):
+    """
+    Сообщение пользователю, которое отправит Outbox. Записывается в той же
+    транзакции, что и изменение, о котором сообщает, поэтому не теряется
+    при перезапуске. Сообщения одного чата отправляются по порядку id.
+    """
+    chat_id = Column(BigInteger)
+    kind = Column(String)
+    text = Column(Text)
+    parse_mode = Column(String, nullable=True)
+    # InlineKeyboardMarkup в JSON
+    reply_markup = Column(Text, nullable=True)
+    # pending, sent, dead
+    status = Column(String, default='pending')
+    attempts = Column(Integer, default=0)
+    next_attempt = Column(DateTime, default=current_time)
+    last_error = Column(String, nullable=True)
+    date_sent = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_outboxmessage_status_next_attempt', 'status', 'next_attempt'),
+        Index('ix_outboxmessage_chat_id_status', 'chat_id', 'status'),
+    )
@@ -1,7 +1,10 @@
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.dialects.postgresql import insert
 
+from bot.database.cache import invalidate_user
+from bot.database.main import insert
 from bot.database.models.main import User
+from bot.database.stats import stat_new_user
 
 
 async def upsert_user(
@@ -11,6 +14,7 @@ async def upsert_user(
     fullname: str,
     lang_tg: str | None = None,
     moderation_status: bool | None = None,
+    commit: bool = True
 ):
     try:
         new_username = '@'+username
@@ -20,22 +24,31 @@ async def upsert_user(
     if new_username is None:
         new_username = '@None'
 
-    stmt = insert(User).values(
+    stmt = insert(session, User).values(
         telegram_id=telegram_id,
         username=new_username,
         fullname=fullname,
         lang_tg=lang_tg,
         moderation_status=moderation_status,  # Используем переданный статус модерации
-    ).on_conflict_do_update(
-        index_elements=['telegram_id'],
-        set_={
-            "username": new_username,
-            "fullname": fullname,
-            "lang_tg": lang_tg,
-            # Обновляем статус модерации только если он не None
-            "moderation_status": moderation_status if moderation_status is not None else User.moderation_status,
-        },
-    )
+    ).on_conflict_do_nothing(index_elements=['telegram_id'])
 
-    await session.execute(stmt)
-    await session.commit()
+    result = await session.execute(stmt)
+    if result.rowcount == 1:
+        await stat_new_user(session)
+    else:
+        values = dict(
+            username=new_username,
+            fullname=fullname,
+            lang_tg=lang_tg,
+        )
+        # Обновляем статус модерации только если он не None
+        if moderation_status is not None:
+            values['moderation_status'] = moderation_status
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(**values)
+        )
+    if commit:
+        await session.commit()
+    invalidate_user(session, telegram_id)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-32000',
+)
+
+# Ключ в session.info: транзакция уже пишет в базу
+SESSION_WRITING = 'sqlite_writing'
+
+
+def setup_pragmas(async_engine: AsyncEngine):
+    @event.listens_for(async_engine.sync_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+class RoutingSession(Session):
+    """
+    Чтение идёт через пул соединений для чтения, запись - через
+    единственное соединение писателя. После первой записи вся транзакция
+    остаётся на соединении писателя, чтобы видеть свои изменения.
+    """
+    writer: Engine
+    reader: Engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (self._flushing or self.info.get(SESSION_WRITING)
+                or getattr(clause, 'is_dml', False)):
+            self.info[SESSION_WRITING] = True
+            return self.writer
+        return self.reader
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self.info.pop(SESSION_WRITING, None)
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self.info.pop(SESSION_WRITING, None)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.info.pop(SESSION_WRITING, None)
+
+
+def routing_sessionmaker(
+        writer: AsyncEngine,
+        reader: AsyncEngine
+) -> async_sessionmaker:
+    session_class = type(
+        'SqliteRoutingSession',
+        (RoutingSession,),
+        {'writer': writer.sync_engine, 'reader': reader.sync_engine}
+    )
+    return async_sessionmaker(
+        expire_on_commit=False,
+        sync_session_class=session_class
+    )
+
+
+class WriteQueue:
+    """
+    Очередь мелких записей: задачи, пришедшие почти одновременно,
+    выполняются одной транзакцией с одним коммитом.
+    Задача - корутина func(session, *args) без собственного коммита.
+    """
+    MAX_BATCH = 100
+
+    def __init__(self):
+        self.session_pool: async_sessionmaker | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def setup(self, session_pool: async_sessionmaker):
+        self.session_pool = session_pool
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(
+            self,
+            func: Callable[..., Awaitable[Any]],
+            *args,
+            **kwargs
+    ) -> Any:
+        """
+        Выполнить запись и дождаться коммита
+        """
+        if self._task is None or self._task.done():
+            # Очередь не запущена - выполняем сразу в отдельной сессии
+            async with self.session_pool() as session:
+                result = await func(session, *args, **kwargs)
+                await session.commit()
+                return result
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, kwargs, future))
+        return await future
+
+    async def run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < self.MAX_BATCH:
+                batch.append(self._queue.get_nowait())
+            await self.execute(batch)
+
+    async def execute(self, batch: list):
+        try:
+            async with self.session_pool() as session:
+                results = [
+                    await func(session, *args, **kwargs)
+                    for func, args, kwargs, _ in batch
+                ]
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                self.resolve(batch[0][3], exception=e)
+                return
+            # Ошибка одной задачи не должна отменять остальные
+            log.info('Write queue batch failed, retry one by one: %s', e)
+            for item in batch:
+                await self.execute([item])
+            return
+        for (*_, future), result in zip(batch, results):
+            self.resolve(future, result)
+
+    @staticmethod
+    def resolve(future: asyncio.Future, result=None, exception=None):
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
+write_queue = WriteQueue()
@@ -0,0 +1,183 @@
+"""
+Предрасчитанная статистика для панели администратора.
+Счётчики обновляются в той же транзакции, что и пользователи с платежами,
+поэтому функции записи не делают коммит.
+"""
+from datetime import date
+
+from sqlalchemy import Connection, delete, func, insert as sa_insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.main import insert
+from bot.database.models.main import User, Payment, StatDaily, \
+    StatPaymentDaily, StatTotal, current_time
+
+# id единственной строки StatTotal
+TOTAL_ID = 1
+
+
+def today() -> date:
+    return current_time().date()
+
+
+async def add_total(session: AsyncSession, **deltas):
+    values = {'id': TOTAL_ID, 'users': 0, 'active_subs': 0, 'revenue': 0,
+              'payments': 0}
+    values.update(deltas)
+    await session.execute(
+        insert(session, StatTotal).values(**values).on_conflict_do_update(
+            index_elements=['id'],
+            set_={
+                name: getattr(StatTotal, name) + delta
+                for name, delta in deltas.items()
+            }
+        )
+    )
+
+
+async def add_daily(session: AsyncSession, **deltas):
+    await session.execute(
+        insert(session, StatDaily).values(
+            day=today(), **deltas
+        ).on_conflict_do_update(
+            index_elements=['day'],
+            set_={
+                name: getattr(StatDaily, name) + delta
+                for name, delta in deltas.items()
+            }
+        )
+    )
+
+
+async def stat_new_user(session: AsyncSession):
+    await add_total(session, users=1)
+    await add_daily(session, new_users=1)
+
+
+async def stat_payment(
+        session: AsyncSession,
+        payment_system: str,
+        amount,
+        payments: int = 1
+):
+    """
+    :param amount: Сумма платежей
+    :param payments: Число платежей
+    """
+    await add_total(session, revenue=amount, payments=payments)
+    await add_daily(session, revenue=amount, payments=payments)
+    await session.execute(
+        insert(session, StatPaymentDaily).values(
+            day=today(),
+            payment_system=payment_system,
+            revenue=amount,
+            payments=payments
+        ).on_conflict_do_update(
+            index_elements=['day', 'payment_system'],
+            set_={
+                'revenue': StatPaymentDaily.revenue + amount,
+                'payments': StatPaymentDaily.payments + payments
+            }
+        )
+    )
+
+
+async def stat_active_subs(session: AsyncSession, delta: int):
+    """
+    :param delta: На сколько изменилось число активных подписок
+    """
+    if not delta:
+        return
+    await add_total(session, active_subs=delta)
+    active_subs = (
+        select(StatTotal.active_subs)
+        .where(StatTotal.id == TOTAL_ID)
+        .scalar_subquery()
+    )
+    await session.execute(
+        insert(session, StatDaily).values(
+            day=today(),
+            active_subs=active_subs
+        ).on_conflict_do_update(
+            index_elements=['day'],
+            set_={'active_subs': active_subs}
+        )
+    )
+
+
+def as_date(value) -> date:
+    # SQLite возвращает date() строкой
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def rebuild_stats(conn: Connection):
+    """
+    Пересчитать статистику по таблицам User и Payment.
+    Число активных подписок за прошлые дни не восстановить,
+    оно записывается только за сегодня
+    """
+    conn.execute(delete(StatPaymentDaily))
+    conn.execute(delete(StatDaily))
+    conn.execute(delete(StatTotal))
+
+    daily: dict[date, dict] = {}
+
+    def day_row(day: date) -> dict:
+        return daily.setdefault(day, dict(
+            day=day, new_users=0, active_subs=0, revenue=0, payments=0
+        ))
+
+    users_day = func.date(User.date_registered)
+    for day, count in conn.execute(
+            select(users_day, func.count()).group_by(users_day)
+    ):
+        if day is not None:
+            day_row(as_date(day))['new_users'] = count
+
+    payments_day = func.date(Payment.date_registered)
+    by_system = []
+    for day, payment_system, revenue, count in conn.execute(
+            select(
+                payments_day,
+                Payment.payment_system,
+                func.sum(Payment.amount),
+                func.count()
+            ).group_by(payments_day, Payment.payment_system)
+    ):
+        if day is None:
+            continue
+        day = as_date(day)
+        row = day_row(day)
+        row['revenue'] += revenue or 0
+        row['payments'] += count
+        by_system.append(dict(
+            day=day,
+            payment_system=payment_system or '',
+            revenue=revenue or 0,
+            payments=count
+        ))
+
+    users = conn.scalar(select(func.count()).select_from(User))
+    active_subs = conn.scalar(
+        select(func.count())
+        .select_from(User)
+        .where(User.status_subscription == True)
+    )
+    revenue, payments = conn.execute(
+        select(func.sum(Payment.amount), func.count()).select_from(Payment)
+    ).one()
+    day_row(today())['active_subs'] = active_subs
+
+    if daily:
+        conn.execute(sa_insert(StatDaily), list(daily.values()))
+    if by_system:
+        conn.execute(sa_insert(StatPaymentDaily), by_system)
+    conn.execute(sa_insert(StatTotal).values(
+        id=TOTAL_ID,
+        users=users,
+        active_subs=active_subs,
+        revenue=revenue or 0,
+        payments=payments
+    ))
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from functools import partial
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, \
+    StorageKey
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.database.crud.delete import delete_fsm_expired
+from bot.database.crud.get import get_fsm_data
+from bot.database.crud.update import update_fsm_data
+from bot.database.models.main import current_time
+from bot.database.sqlite_engine import write_queue
+
+log = logging.getLogger(__name__)
+
+# Компактный JSON для хранилищ состояний
+json_dumps = partial(json.dumps, separators=(',', ':'), ensure_ascii=False)
+
+
+class DbStorage(BaseStorage):
+    """
+    Хранилище FSM и стеков aiogram_dialog в таблице FsmData.
+    Переживает перезапуск и общее для всех процессов бота.
+    Чтение идёт через отдельный пул read_pool, запись - через write_queue,
+    поэтому хранилище не занимает соединения основного пула внутри
+    обработчика. Состояния без изменений дольше ttl считаются удаленными
+    и периодически вычищаются.
+    """
+    CLEANUP_INTERVAL = 60 * 60
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker,
+            read_pool: async_sessionmaker,
+            ttl: int,
+            key_builder: DefaultKeyBuilder = None
+    ):
+        """
+        :param session_pool: Сессии для фоновой очистки
+        :param read_pool: Сессии для чтения состояний в обработчиках
+        :param ttl: Время жизни состояния в секундах
+        """
+        self.session_pool = session_pool
+        self.read_pool = read_pool
+        self.ttl = timedelta(seconds=ttl)
+        if key_builder is None:
+            key_builder = DefaultKeyBuilder(with_destiny=True)
+        self.key_builder = key_builder
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                async with self.session_pool() as session:
+                    count = await delete_fsm_expired(
+                        session, current_time() - self.ttl
+                    )
+                if count:
+                    log.info('Evicted %s idle FSM states', count)
+            except Exception:
+                log.exception('FSM storage cleanup error')
+            await asyncio.sleep(self.CLEANUP_INTERVAL)
+
+    async def load(self, key: StorageKey):
+        async with self.read_pool() as session:
+            return await get_fsm_data(
+                session,
+                self.key_builder.build(key),
+                current_time() - self.ttl
+            )
+
+    async def set_state(
+            self,
+            key: StorageKey,
+            state: str | State | None = None
+    ) -> None:
+        if isinstance(state, State):
+            state = state.state
+        await write_queue.submit(
+            update_fsm_data,
+            self.key_builder.build(key),
+            current_time() - self.ttl,
+            state=state
+        )
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        row = await self.load(key)
+        return row.state if row is not None else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await write_queue.submit(
+            update_fsm_data,
+            self.key_builder.build(key),
+            current_time() - self.ttl,
+            data=json_dumps(data) if data else None
+        )
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        row = await self.load(key)
+        if row is None or row.data is None:
+            return {}
+        return json.loads(row.data)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -2,7 +2,7 @@ from aiogram.enums import ContentType
 from aiogram_dialog import Dialog, Window
 from aiogram_dialog.widgets.media import StaticMedia
 from aiogram_dialog.widgets.text import Format
-from aiogram_dialog.widgets.kbd import Group, Calendar
+from aiogram_dialog.widgets.kbd import Group, Calendar, Select
 
 from bot.dialogs.admin.main.getters import *
 from bot.dialogs.admin.main.handlers import *
@@ -119,6 +119,51 @@ admin_menu_dialog = Dialog(
         getter=get_statistic_admin,
         state=StateAdmin.statistics_menu
     ),
+    Window(
+        Format('{export_text}'),
+        StaticMedia(
+            path='bot/img/logo.png',
+            type=ContentType.PHOTO
+        ),
+        Group(
+            Select(
+                Format('{item[0]}'),
+                id='export_period',
+                item_id_getter=lambda x: x[1],
+                items='periods',
+                on_click=export_period_selection
+            ),
+            width=2
+        ),
+        Group(
+            Select(
+                Format('{item[0]}'),
+                id='export_system',
+                item_id_getter=lambda x: x[1],
+                items='systems',
+                on_click=export_system_selection
+            ),
+            width=1,
+            when='show_systems'
+        ),
+        Button(
+            text=Format('{compress}'),
+            id='export_compress',
+            on_click=export_compress
+        ),
+        Button(
+            text=Format('{download}'),
+            id='export_download',
+            on_click=export_download
+        ),
+        Button(
+            text=Format('{back}'),
+            id='back',
+            on_click=button_statistic
+        ),
+        getter=get_export_admin,
+        state=StateAdmin.export_menu
+    ),
     Window(
         Format('{user_control_text}'),
         StaticMedia(
@@ -4,14 +4,14 @@ from aiogram import html
 from aiogram.types import User
 from aiogram_dialog import DialogManager
 from fluentogram import TranslatorRunner
-from sqlalchemy import func, select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timedelta
-from typing import TYPE_CHECKING
 
-from bot.database.crud.get import get_all_user, get_user_tg_id
-from bot.database.models.main import User as UserModel, Payment
+from bot.database.crud.get import get_all_user, get_user_tg_id, \
+    get_stat_total, get_stat_daily, get_stat_payment_systems, \
+    get_stat_payment_system_names
+from bot.database.models.main import current_time
 from bot.misc import Config
+from bot.service.export import PERIODS
 
 if TYPE_CHECKING:
     from bot.locales.stub import TranslatorRunner
@@ -60,22 +60,30 @@ async def get_statistic_admin(
     session: AsyncSession,
     **kwargs,
 ):
-    # Получаем статистику по пользователям
-    total_users = await get_total_users_count(session)
-    active_subs = await get_active_subscriptions_count(session)
-    
-    # Получаем статистику по заработку
-    earned_today = await get_earnings_today(session)
-    earned_month = await get_earnings_month(session)
-    earned_total = await get_earnings_total(session)
-    
+    # Статистика берётся из предрасчитанных строк, см. bot/database/stats.py
+    today = current_time().date()
+    total = await get_stat_total(session)
+    new_today, earned_today, _ = await get_stat_daily(session, today, today)
+    _, earned_month, _ = await get_stat_daily(session, today.replace(day=1))
+    systems = await get_stat_payment_systems(session, today.replace(day=1))
+    systems_text = '\n'.join(
+        i18n.admin.text.admin_menu.statistic.system(
+            payment_system=payment_system,
+            amount=f"{revenue}₽",
+            count=str(payments)
+        )
+        for payment_system, revenue, payments in systems
+    )
+
     return dict(
         statistic_text=i18n.admin.text.admin_menu.statistic(
-            total_users=str(total_users),
-            active_subs=str(active_subs),
+            total_users=str(total.users if total else 0),
+            new_today=str(new_today),
+            active_subs=str(total.active_subs if total else 0),
             earned_today=f"{earned_today}₽",
             earned_month=f"{earned_month}₽",
-            earned_total=f"{earned_total}₽"
+            earned_total=f"{total.revenue if total else 0}₽",
+            systems=systems_text or '-'
         ),
         payments=i18n.admin.button.payments(),
         all_users=i18n.admin.button.all_users(),
@@ -84,6 +92,64 @@ async def get_statistic_admin(
     )
 
 
+async def get_export_admin(
+    i18n: TranslatorRunner,
+    event_from_user: User,
+    session: AsyncSession,
+    dialog_manager: DialogManager,
+    **kwargs,
+):
+    data = dialog_manager.dialog_data
+    export = data.get('export')
+    period = data.get('export_period', 'all')
+    payment_system = data.get('export_system')
+    compress = data.get('export_compress', False)
+    if export == 'payments':
+        name = i18n.admin.text.admin_menu.statistic.payment.caption()
+    elif export == 'all_users':
+        name = i18n.admin.text.admin_menu.statistic.all_users.caption()
+    else:
+        name = i18n.admin.text.admin_menu.statistic.active.caption()
+    period_names = {
+        'all': i18n.admin.button.export.period.all(),
+        'day': i18n.admin.button.export.period.day(),
+        'week': i18n.admin.button.export.period.week(),
+        'month': i18n.admin.button.export.period.month(),
+    }
+    periods = [
+        (('✅ ' if item == period else '') + period_names[item], item)
+        for item in PERIODS
+    ]
+    all_systems = i18n.admin.button.export.system.all()
+    systems = [(('✅ ' if payment_system is None else '') + all_systems, 'all')]
+    if export == 'payments':
+        names = await get_stat_payment_system_names(session)
+        systems += [
+            (('✅ ' if item == payment_system else '') + item, str(number))
+            for number, item in enumerate(names)
+        ]
+    if compress:
+        file_format = 'CSV (.gz)'
+        compress_text = i18n.admin.button.export.uncompress()
+    else:
+        file_format = 'CSV'
+        compress_text = i18n.admin.button.export.compress()
+    return dict(
+        export_text=i18n.admin.text.admin_menu.export(
+            name=name,
+            period=period_names[period],
+            payment_system=payment_system or all_systems,
+            file_format=file_format
+        ),
+        periods=periods,
+        systems=systems,
+        show_systems=export == 'payments',
+        compress=compress_text,
+        download=i18n.admin.button.export.download(),
+        back=i18n.user.button.back(),
+    )
+
+
 async def get_user_control_input(
     i18n: TranslatorRunner,
     event_from_user: User,
@@ -181,65 +247,3 @@ async def get_user_control_add_time(
         .user_control.account.add_time(),
         back=i18n.user.button.back(),
     )
-
-
-# Функции для получения статистических данных
-async def get_total_users_count(session: AsyncSession) -> int:
-    """
-    Получает общее количество пользователей
-    """
-    result = await session.execute(select(func.count()).select_from(UserModel))
-    return result.scalar() or 0
-
-
-async def get_active_subscriptions_count(session: AsyncSession) -> int:
-    """
-    Получает количество активных подписок
-    """
-    result = await session.execute(
-        select(func.count())
-        .select_from(UserModel)
-        .where(UserModel.status_subscription == True)
-    )
-    return result.scalar() or 0
-
-
-async def get_earnings_today(session: AsyncSession) -> int:
-    """
-    Получает сумму заработка за сегодня
-    """
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow = today + timedelta(days=1)
-    
-    result = await session.execute(
-        select(func.sum(Payment.amount))
-        .select_from(Payment)
-        .where(and_(Payment.date_registered >= today, Payment.date_registered < tomorrow))
-    )
-    return result.scalar() or 0
-
-
-async def get_earnings_month(session: AsyncSession) -> int:
-    """
-    Получает сумму заработка за текущий месяц
-    """
-    now = datetime.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    result = await session.execute(
-        select(func.sum(Payment.amount))
-        .select_from(Payment)
-        .where(Payment.date_registered >= start_of_month)
-    )
-    return result.scalar() or 0
-
-
-async def get_earnings_total(session: AsyncSession) -> int:
-    """
-    Получает общую сумму заработка за всё время
-    """
-    result = await session.execute(
-        select(func.sum(Payment.amount))
-        .select_from(Payment)
-    )
-    return result.scalar() or 0
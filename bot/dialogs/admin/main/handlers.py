@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import date, datetime
 from typing import TYPE_CHECKING
@@ -7,21 +6,20 @@ from aiogram import html
 from aiogram.types import CallbackQuery, Message
 from aiogram_dialog import DialogManager, ShowMode
 from aiogram_dialog.widgets.input import MessageInput
-from aiogram_dialog.widgets.kbd import Button, Calendar
+from aiogram_dialog.widgets.kbd import Button, Calendar, Select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database.crud.get import (
-    get_all_user,
-    get_users_status,
-    get_payments,
     get_user_tg_id,
-    get_payments_user
+    get_stat_payment_system_names
 )
 from bot.database.crud.update import user_swith_ban, user_new_subscribe
 from bot.keyboards.user_inline import link_chanel
 from bot.misc import Config
-from bot.service.loop import end_subscription
-from bot.service.service import send_document, check_number_int
+from bot.service.broadcast import broadcast_engine
+from bot.service.loop import end_subscription, expiry_scheduler
+from bot.service.export import export_payments, export_users, send_export
+from bot.service.service import check_number_int
 from bot.states.state_user import  StateAdmin
 
 if TYPE_CHECKING:
@@ -81,37 +79,8 @@ async def milling_input_handler(
     message_wait = await message.answer(
         i18n.admin.text.admin_menu.milling.wait(percent=0)
     )
-    if type_milling == 'subscribe_users':
-        users_milling = await get_users_status(session)
-    elif type_milling == 'not_subscribe_users':
-        users_milling = await get_users_status(session, False)
-    else:
-        users_milling = await get_all_user(session)
-
-    total_users = len(users_milling)
-    suc_count = 0
-    not_suc_count = 0
-
-    for idx, user in enumerate(users_milling):
-        try:
-            await message.send_copy(user.telegram_id)
-            suc_count += 1
-        except Exception as e:
-            logging.info(f'user {user.telegram_id} blocked bot')
-            not_suc_count += 1
-        progress = ((idx + 1) / total_users) * 100
-        if progress % 20 == 0:
-            await message_wait.edit_text(
-                i18n.admin.text.admin_menu.milling.wait(percent=int(progress))
-            )
-        await asyncio.sleep(0.03)
-    await message_wait.edit_text(
-        i18n.admin.text.admin_menu.milling.result(
-            all_count=total_users,
-            suc_count=suc_count,
-            not_suc_count=not_suc_count
-        )
-    )
+    # Рассылка идёт в фоне, прогресс обновляется в message_wait
+    await broadcast_engine.create(session, message, type_milling, message_wait)
 
 
 async def show_payments(
@@ -119,79 +88,123 @@ async def show_payments(
     button: Button,
     dialog_manager: DialogManager
 ) -> None:
+    id_user = dialog_manager.dialog_data.get('id_user')
+    if button.widget_id != 'payments_user' or id_user is None:
+        await open_export(dialog_manager, 'payments')
+        return
     i18n: TranslatorRunner = dialog_manager.middleware_data.get('i18n')
     session: AsyncSession = dialog_manager.middleware_data.get('session')
-    id_user = dialog_manager.dialog_data.get('id_user')
-    if button.widget_id == 'payments_user' and id_user is not None:
-        payments = await get_payments_user(session, id_user)
-        name_document = 'Payments user'
-        caption = i18n.admin.text.admin_menu.statistic.payment.caption.user()
-    else:
-        payments = await get_payments(session)
-        name_document = 'Payments'
-        caption = i18n.admin.text.admin_menu.statistic.payment.caption()
-    text = ''
-    number = 1
-    for payment in payments:
-        text += i18n.admin.text.admin_menu.statistic.payment(
-            number=number,
-            user_name=payment.payment_id.username,
-            user_id=str(payment.user),
-            payment_system=payment.payment_system,
-            amount=payment.amount,
-            date=payment.date_registered.strftime("%d.%m.%Y %H:%M")
-        ) + '\n'
-        number += 1
-    if text == '':
+    export = await export_payments(session, telegram_id=id_user)
+    if not export.rows:
+        export.close()
         await callback.answer(
             i18n.admin.text.admin_menu.statistic.payment.not_caption()
         )
         return
-    await send_document(callback.message, text, name_document=name_document,
-                        caption=caption)
+    await send_export(
+        callback.message,
+        export,
+        name_document='Payments user',
+        caption=i18n.admin.text.admin_menu.statistic.payment.caption.user()
+    )
 
 
 async def show_users(
     callback: CallbackQuery,
     button: Button,
     dialog_manager: DialogManager
+) -> None:
+    # all_users, active_users
+    await open_export(dialog_manager, button.widget_id)
+
+
+async def open_export(dialog_manager: DialogManager, export: str) -> None:
+    dialog_manager.dialog_data.update(
+        export=export,
+        export_period='all',
+        export_system=None,
+        export_compress=False
+    )
+    await dialog_manager.switch_to(StateAdmin.export_menu)
+
+
+async def export_period_selection(
+    callback: CallbackQuery,
+    widget: Select,
+    dialog_manager: DialogManager,
+    item_id: str
+) -> None:
+    dialog_manager.dialog_data.update(export_period=item_id)
+
+
+async def export_system_selection(
+    callback: CallbackQuery,
+    widget: Select,
+    dialog_manager: DialogManager,
+    item_id: str
+) -> None:
+    # В callback_data только номер системы, названия бывают длинными
+    session: AsyncSession = dialog_manager.middleware_data.get('session')
+    payment_system = None
+    if item_id != 'all':
+        names = await get_stat_payment_system_names(session)
+        if int(item_id) < len(names):
+            payment_system = names[int(item_id)]
+    dialog_manager.dialog_data.update(export_system=payment_system)
+
+
+async def export_compress(
+    callback: CallbackQuery,
+    button: Button,
+    dialog_manager: DialogManager
+) -> None:
+    compress = dialog_manager.dialog_data.get('export_compress', False)
+    dialog_manager.dialog_data.update(export_compress=not compress)
+
+
+async def export_download(
+    callback: CallbackQuery,
+    button: Button,
+    dialog_manager: DialogManager
 ) -> None:
     i18n: TranslatorRunner = dialog_manager.middleware_data.get('i18n')
     session: AsyncSession = dialog_manager.middleware_data.get('session')
-    if button.widget_id == 'all_users':
-        users = await get_all_user(session)
+    data = dialog_manager.dialog_data
+    period = data.get('export_period', 'all')
+    compress = data.get('export_compress', False)
+    if data.get('export') == 'payments':
+        export = await export_payments(
+            session,
+            period=period,
+            payment_system=data.get('export_system'),
+            compress=compress
+        )
+        name_document = 'Payments'
+        caption = i18n.admin.text.admin_menu.statistic.payment.caption()
+        not_caption = i18n.admin.text.admin_menu.statistic.payment.not_caption()
+    elif data.get('export') == 'all_users':
+        export = await export_users(session, period=period, compress=compress)
         name_document = 'All Users'
         caption = i18n.admin.text.admin_menu.statistic.all_users.caption()
+        not_caption = i18n.admin.text.admin_menu.statistic.all_users.not_caption()
     else:
-        users = await get_users_status(session)
+        export = await export_users(
+            session,
+            period=period,
+            status_subscription=True,
+            compress=compress
+        )
         name_document = 'Active Users'
         caption = i18n.admin.text.admin_menu.statistic.active.caption()
-    text = ''
-    number = 1
-    for user in users:
-        if user.status_subscription:
-            sub = user.subscription.strftime('%d.%m.%Y %H:%M') + '✅'
-        else:
-            sub = '❌'
-        # Проверяем, что lang_tg не None, если None, используем пустую строку
-        lang_tg = user.lang_tg if user.lang_tg is not None else ''
-        text += i18n.admin.text.admin_menu.statistic.all_users(
-            number=number,
-            fullname=user.fullname,
-            username=user.username,
-            telegram_id=str(user.telegram_id),
-            lang=lang_tg,  # Используем проверенное значение
-            date=user.date_registered.strftime("%d.%m.%Y %H:%M"),
-            subscription=sub
-        ) + '\n'
-        number += 1
-    if text == '':
-        await callback.message.answer(
-            i18n.admin.text.admin_menu.statistic.all_users.not_caption()
-        )
+        not_caption = i18n.admin.text.admin_menu.statistic.all_users.not_caption()
+    if not export.rows:
+        export.close()
+        await callback.answer(not_caption)
         return
-    await send_document(callback.message, text, name_document=name_document,
-                        caption=caption)
+    await callback.answer()
+    await send_export(callback.message, export, name_document, caption)
+    # Документ ушел ниже окна диалога, отправляем окно заново
+    dialog_manager.show_mode = ShowMode.DELETE_AND_SEND
 
 
 async def input_id_user_handler(
@@ -363,6 +376,7 @@ async def on_date_selected(
         user = await user_new_subscribe(
             session, user.telegram_id, selected_date
         )
+        expiry_scheduler.reschedule()
         await callback.bot.send_message(
             user.telegram_id,
             i18n.user.text.subscription.add.time(
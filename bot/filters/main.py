@@ -1,9 +1,11 @@
+import logging
+
 from aiogram import Bot
 from aiogram.filters import Filter
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.database.crud.get import get_user_tg_id
+from bot.database.cache import get_user_state
 from bot.misc import Config
 from bot.service.service import check_admin
 
@@ -36,25 +38,24 @@ class IsBannedCallback(Filter):
 
 
 async def check_blocked(session, telegram_id):
-    import logging
-    user = await get_user_tg_id(session, telegram_id)
+    # Проверяем, является ли пользователь администратором
+    if telegram_id in Config.ADMINS_ID:
+        return True
+
+    user = await get_user_state(session, telegram_id)
     # Проверяем, что пользователь существует в базе данных
     if user is None:
         # Если пользователя нет в базе, разрешаем доступ (он будет создан при первом взаимодействии)
         return True
     
-    # Проверяем, является ли пользователь администратором
-    if user.telegram_id in Config.ADMINS_ID:
-        return True
-    
     # Проверяем статус модерации пользователя
     if user.moderation_status is False:
-        logging.info(f"User {telegram_id} access denied: moderation_status is False")
+        logging.debug('User %s access denied: moderation_status is False', telegram_id)
         return False
     
     # Проверяем, не заблокирован ли пользователь
     if user.blocked:
-        logging.info(f"User {telegram_id} access denied: user is blocked")
+        logging.debug('User %s access denied: user is blocked', telegram_id)
         return False
     
     # Если все проверки пройдены, разрешаем доступ
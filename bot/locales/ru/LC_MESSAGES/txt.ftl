@@ -109,17 +109,32 @@ admin-text-admin_menu-milling = Отправьте сообщение котор
 admin-text-admin_menu-statistic = 📊 Статистика бота:
 
     📈 Всего пользователей: {$total_users}
+    🆕 Новых за сегодня: {$new_today}
     🟢 Активных подписок: {$active_subs}
 
     💰 Заработано за сегодня: {$earned_today}
     💰 Заработано за месяц: {$earned_month}
     💰 Заработано за всё время: {$earned_total}
+
+    🏦 По платежным системам за месяц:
+    {$systems}
+admin-text-admin_menu-statistic-system = {$payment_system}: {$amount} ({$count})
+admin-text-admin_menu-export =
+    📤 Выгрузка: {$name}
+    📆 Период: {$period}
+    🏦 Платежная система: {$payment_system}
+    📄 Формат: {$file_format}
 admin-text-admin_menu-milling-wait = Статуст выполния рассылики {$percent}%
 admin-text-admin_menu-milling-result =
     Рассылка выполнена ✅
     Всего отправлено: {$all_count}
     Получено: {$suc_count}
     Недошло: {$not_suc_count}
+admin-text-admin_menu-milling-progress =
+    Рассылка выполняется ⏳
+    Отправлено: {$done} из {$total} ({$percent}%)
+    Скорость: {$speed} сообщ./сек
+    Осталось примерно: {$eta}
 admin-text-admin_menu-statistic-payment = {$number}) Пользователь: {$user_name}({$user_id}) - Платежная система: {$payment_system} - Сумма {$amount}₽ | Дата: {$date}
 admin-text-admin_menu-statistic-payment-caption = Список поступлений
 admin-text-admin_menu-statistic-payment-caption-user = Платежи пользователя
@@ -167,6 +182,14 @@ admin-button-user_control = 💻 Управление пользователям
 admin-button-payments = 🏦 Платежи
 admin-button-all_users = 📚 Все пользователи
 admin-button-active_users = 📗 Активные пользователи
+admin-button-export-period-all = За всё время
+admin-button-export-period-day = За сегодня
+admin-button-export-period-week = За 7 дней
+admin-button-export-period-month = За месяц
+admin-button-export-system-all = Все платежные системы
+admin-button-export-compress = 🗜 Сжать в .gz
+admin-button-export-uncompress = 📄 Без сжатия
+admin-button-export-download = 📥 Скачать
 admin-button-milling-all = 📒 Всем
 admin-button-milling-sub = 📗 Только с подпиской
 admin-button-milling-not_sub = 📕 Только без подписки
@@ -190,6 +213,8 @@ user-text-moderation-waiting = 🌟 Добро пожаловать в 🔥То
 
     💫 Спасибо за терпение!
 user-text-moderation-approved = Модерация прошла успешно! Теперь вы можете пользоваться ботом.
+user-text-moderation-welcome = Добро пожаловать! Теперь вы можете использовать все функции бота.
+    Отправьте /start чтобы начать
 user-text-moderation-rejected = К сожалению, Вы не прошли модерацию. 
     (Один из администраторов против Вашего прибывания) 
 
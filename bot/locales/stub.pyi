@@ -370,6 +370,12 @@ class AdminTextAdmin_menu:
     @staticmethod
     def group_milling() -> Literal["""Кому отправить сообщение?"""]: ...
 
+    @staticmethod
+    def export(*, name, period, payment_system, file_format) -> Literal["""📤 Выгрузка: { $name }
+📆 Период: { $period }
+🏦 Платежная система: { $payment_system }
+📄 Формат: { $file_format }"""]: ...
+
 
 class AdminTextAdmin_menuMilling:
     @staticmethod
@@ -384,6 +390,12 @@ class AdminTextAdmin_menuMilling:
 Получено: { $suc_count }
 Недошло: { $not_suc_count }"""]: ...
 
+    @staticmethod
+    def progress(*, done, total, percent, speed, eta) -> Literal["""Рассылка выполняется ⏳
+Отправлено: { $done } из { $total } ({ $percent }%)
+Скорость: { $speed } сообщ./сек
+Осталось примерно: { $eta }"""]: ...
+
 
 class AdminTextAdmin_menuStatistic:
     payment: AdminTextAdmin_menuStatisticPayment
@@ -391,7 +403,21 @@ class AdminTextAdmin_menuStatistic:
     active: AdminTextAdmin_menuStatisticActive
 
     @staticmethod
-    def __call__() -> Literal["""Статистика бота 🤖"""]: ...
+    def __call__(*, total_users, new_today, active_subs, earned_today, earned_month, earned_total, systems) -> Literal["""📊 Статистика бота:
+
+📈 Всего пользователей: { $total_users }
+🆕 Новых за сегодня: { $new_today }
+🟢 Активных подписок: { $active_subs }
+
+💰 Заработано за сегодня: { $earned_today }
+💰 Заработано за месяц: { $earned_month }
+💰 Заработано за всё время: { $earned_total }
+
+🏦 По платежным системам за месяц:
+{ $systems }"""]: ...
+
+    @staticmethod
+    def system(*, payment_system, amount, count) -> Literal["""{ $payment_system }: { $amount } ({ $count })"""]: ...
 
 
 class AdminTextAdmin_menuStatisticPayment:
@@ -514,6 +540,7 @@ class AdminButton:
     reply: AdminButtonReply
     milling: AdminButtonMilling
     user_control: AdminButtonUser_control
+    export: AdminButtonExport
 
     @staticmethod
     def menu() -> Literal["""Админ панель 🚀"""]: ...
@@ -531,6 +558,39 @@ class AdminButton:
     def active_users() -> Literal["""📗 Активные пользователи"""]: ...
 
 
+class AdminButtonExport:
+    period: AdminButtonExportPeriod
+    system: AdminButtonExportSystem
+
+    @staticmethod
+    def compress() -> Literal["""🗜 Сжать в .gz"""]: ...
+
+    @staticmethod
+    def uncompress() -> Literal["""📄 Без сжатия"""]: ...
+
+    @staticmethod
+    def download() -> Literal["""📥 Скачать"""]: ...
+
+
+class AdminButtonExportPeriod:
+    @staticmethod
+    def all() -> Literal["""За всё время"""]: ...
+
+    @staticmethod
+    def day() -> Literal["""За сегодня"""]: ...
+
+    @staticmethod
+    def week() -> Literal["""За 7 дней"""]: ...
+
+    @staticmethod
+    def month() -> Literal["""За месяц"""]: ...
+
+
+class AdminButtonExportSystem:
+    @staticmethod
+    def all() -> Literal["""Все платежные системы"""]: ...
+
+
 class AdminButtonReply:
     @staticmethod
     def message() -> Literal["""💬 Ответить клиенту"""]: ...
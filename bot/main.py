@@ -1,23 +1,35 @@
+import asyncio
 import logging
-import sys
-from logging.handlers import RotatingFileHandler
+import multiprocessing
+import os
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.filters import ExceptionTypeFilter
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, \
+    setup_application
+from aiohttp import web
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.strategy import FSMStrategy
 from aiogram_dialog import setup_dialogs
 from aiogram_dialog.api.exceptions import UnknownIntent, UnknownState
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import pytz
 from fluentogram import TranslatorHub
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from bot.database.models.main import create_all_table
+from bot.database.main import engine, read_engine, session_maker, \
+    storage_engine
+from bot.database.migrations import check_schema
+from bot.database.sqlite_engine import write_queue
+from bot.database.storage import DbStorage, json_dumps
 from bot.handlers.errors.main import on_unknown_intent, on_unknown_state
+from bot.middlewares.concurrency import ConcurrencyLimitMiddleware
 from bot.middlewares.i18n import TranslatorRunnerMiddleware
+from bot.middlewares.metrics import UpdateMetricsMiddleware, \
+    HandlerMetricsMiddleware, TelegramMetricsMiddleware
 from bot.middlewares.session import DbSessionMiddleware
 from bot.middlewares.track_all_users import TrackAllUsersMiddleware
 from bot.middlewares.bot_block_check import BotBlockCheckMiddleware
@@ -26,33 +38,103 @@ from bot.handlers.user import user_router
 from bot.handlers.admin import admin_router
 from bot.misc.commands import set_commands
 from bot.misc.i18n import create_translator_hub
-from bot.service.loop import loop
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(levelname)s %(filename)s:%(lineno)d "
-           "[%(asctime)s] - %(name)s - %(message)s",
-    handlers=[
-        RotatingFileHandler(
-            filename='logs/all.log',
-            maxBytes=1024 * 1024 * 25,
-            encoding='UTF-8',
-        ),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from bot.misc.logs import setup_logging
+from bot.service.broadcast import broadcast_engine
+from bot.service.loop import expiry_scheduler
+from bot.service.media import media_registry
+from bot.service.metrics import metrics, start_metrics_server
+from bot.service.moderation_notify import moderation_notifier
+from bot.service.outbox import outbox
+from bot.service.Payments.clients import provider_clients
+from bot.service.payment_watcher import payment_watcher
+from bot.service.payment_webhooks import start_payment_webhooks
+from bot.service.renewal import renewal_engine
+
+# Процессы webhook настраивают свой файл в webhook_worker
+if multiprocessing.current_process().name == 'MainProcess':
+    setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_RATE)
 
 log = logging.getLogger(__name__)
 
 
-async def start_bot():
-    bot = Bot(
+def create_bot() -> Bot:
+    session = None
+    if Config.TELEGRAM_API_SERVER:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(Config.TELEGRAM_API_SERVER)
+        )
+    return Bot(
         token=Config.TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    await set_commands(bot)
+
+
+def create_storage(sessionmaker: async_sessionmaker) -> BaseStorage:
+    """
+    Хранилище FSM и диалогов. Для нескольких процессов нужно db или redis
+    """
+    key_builder = DefaultKeyBuilder(with_destiny=True)
+    if Config.FSM_STORAGE == 'redis':
+        from aiogram.fsm.storage.redis import RedisStorage
+        from redis.asyncio import Redis
+        return RedisStorage(
+            Redis.from_url(Config.REDIS_URL),
+            key_builder=key_builder,
+            state_ttl=Config.FSM_STATE_TTL,
+            data_ttl=Config.FSM_STATE_TTL,
+            json_dumps=json_dumps
+        )
+    if Config.FSM_STORAGE == 'db':
+        return DbStorage(
+            sessionmaker,
+            async_sessionmaker(storage_engine(), expire_on_commit=False),
+            Config.FSM_STATE_TTL,
+            key_builder
+        )
+    return MemoryStorage()
+
+
+async def setup_metrics(dp: Dispatcher, bot: Bot, worker: int):
+    """
+    Подключить сбор метрик и поднять сервер /metrics.
+    Каждый процесс webhook слушает свой порт: METRICS_PORT + номер процесса
+    """
+    from bot.service.Payments import all_payments
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_middleware = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(handler_middleware)
+    bot.session.middleware(TelegramMetricsMiddleware())
+    metrics.instrument_engine(engine())
+    if Config.DB_ENGINE != 'postgres':
+        metrics.instrument_engine(read_engine())
+    if Config.FSM_STORAGE == 'db':
+        metrics.instrument_engine(storage_engine())
+    metrics.instrument_payments(all_payments)
+    await start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT + worker)
+
+
+async def setup_dispatcher(
+        bot: Bot,
+        worker: int = 0
+) -> tuple[Dispatcher, TranslatorHub]:
+    """
+    :param worker: Номер процесса. Фоновые сервисы запускает только
+        первый процесс (0), в режиме polling он единственный
+    """
+    primary = worker == 0
+    shared = Config.BOT_MODE == 'webhook' and Config.WEBHOOK_WORKERS > 1
+    if primary:
+        await set_commands(bot)
+    await check_schema(engine())
+    sessionmaker = session_maker()
+    write_queue.setup(sessionmaker)
+    write_queue.start()
+    storage = create_storage(sessionmaker)
     dp = Dispatcher(
-        storage=MemoryStorage(),
+        storage=storage,
         fsm_strategy=FSMStrategy.USER_IN_CHAT
     )
 
@@ -60,8 +142,6 @@ async def start_bot():
         user_router,
         admin_router
     )
-    async_engine =  await create_all_table()
-    sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False)
     dp.errors.register(
         on_unknown_intent,
         ExceptionTypeFilter(UnknownIntent),
@@ -70,6 +150,14 @@ async def start_bot():
         on_unknown_state,
         ExceptionTypeFilter(UnknownState),
     )
+    # Сессии API платежных систем закрываются при остановке бота
+    dp.shutdown.register(provider_clients.close)
+    # Метрики первыми, чтобы учесть время остальных middleware
+    if Config.METRICS_PORT != 0:
+        await setup_metrics(dp, bot, worker)
+    dp.update.outer_middleware(
+        ConcurrencyLimitMiddleware(Config.UPDATE_CONCURRENCY)
+    )
     dp.update.outer_middleware(DbSessionMiddleware(sessionmaker))
     dp.message.outer_middleware(TrackAllUsersMiddleware())
     dp.update.middleware(BotBlockCheckMiddleware())
@@ -77,14 +165,92 @@ async def start_bot():
     dp.update.middleware(TranslatorRunnerMiddleware())
     dp.errors.middleware(TranslatorRunnerMiddleware())
 
-    setup_dialogs(dp)
-    scheduler = AsyncIOScheduler(timezone=pytz.UTC)
-    scheduler.add_job(
-        loop, "interval", seconds=15, args=(
-            bot, translator_hub, sessionmaker
+    await media_registry.setup(sessionmaker)
+    setup_dialogs(dp, media_id_storage=media_registry)
+    payment_watcher.setup(bot, translator_hub, sessionmaker, shared)
+    expiry_scheduler.setup(bot, translator_hub, sessionmaker, shared)
+    broadcast_engine.setup(bot, translator_hub, sessionmaker)
+    outbox.setup(bot, sessionmaker, shared)
+    moderation_notifier.setup(sessionmaker, Config.MODERATION_DIGEST)
+    renewal_engine.setup(bot, translator_hub, sessionmaker)
+    if primary:
+        if isinstance(storage, DbStorage):
+            storage.start()
+        payment_watcher.start()
+        if Config.PAYMENT_WEBHOOK_PORT != 0:
+            await start_payment_webhooks()
+        expiry_scheduler.start()
+        outbox.start()
+        moderation_notifier.start()
+        if Config.AUTO_RENEWAL:
+            renewal_engine.start()
+        await broadcast_engine.resume()
+    return dp, translator_hub
+
+
+async def run_webhook(worker: int = 0):
+    primary = worker == 0
+    bot = create_bot()
+    dp, translator_hub = await setup_dispatcher(bot, worker)
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=Config.WEBHOOK_SECRET,
+        _translator_hub=translator_hub
+    ).register(app, path=Config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # Несколько процессов слушают один порт, соединения делит ядро
+    site = web.TCPSite(
+        runner,
+        Config.WEBHOOK_HOST,
+        Config.WEBHOOK_PORT,
+        reuse_port=Config.WEBHOOK_WORKERS > 1
+    )
+    await site.start()
+    if primary:
+        await bot.set_webhook(
+            url=Config.WEBHOOK_URL + Config.WEBHOOK_PATH,
+            secret_token=Config.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
         )
+    log.info(
+        f'Webhook worker {os.getpid()} listen on '
+        f'{Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}{Config.WEBHOOK_PATH}'
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def webhook_worker(worker: int):
+    # Ротировать один файл из нескольких процессов нельзя
+    setup_logging(
+        Config.LOG_LEVEL,
+        Config.LOG_FORMAT,
+        Config.LOG_RATE,
+        filename=f'logs/all.worker-{worker}.log'
     )
-    logging.getLogger('apscheduler.executors.default').setLevel(
-        logging.WARNING)
-    scheduler.start()
+    asyncio.run(run_webhook(worker))
+
+
+async def start_bot():
+    if Config.BOT_MODE == 'webhook':
+        context = multiprocessing.get_context('spawn')
+        for number in range(1, Config.WEBHOOK_WORKERS):
+            context.Process(
+                target=webhook_worker,
+                args=(number,),
+                name=f'webhook-worker-{number}',
+                daemon=True
+            ).start()
+        await run_webhook()
+        return
+    bot = create_bot()
+    dp, translator_hub = await setup_dispatcher(bot)
+    # Если раньше бот работал в режиме webhook
+    await bot.delete_webhook()
     await dp.start_polling(bot, _translator_hub=translator_hub)
@@ -2,10 +2,9 @@ from typing import Callable, Awaitable, Dict, Any, cast
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, User
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.database.models.main import User as UserModel
+from bot.database.cache import get_user_state
 
 
 class BotBlockCheckMiddleware(BaseMiddleware):
@@ -37,10 +36,8 @@ class BotBlockCheckMiddleware(BaseMiddleware):
         # Проверяем, заблокирован ли пользователь в боте
         session: AsyncSession = data.get("session")
         if session:
-            # Запрос к базе данных для проверки статуса блокировки
-            statement = select(UserModel).filter(UserModel.telegram_id == user_id)
-            result = await session.execute(statement)
-            user_db = result.scalar_one_or_none()
+            # Статус блокировки из кэша, при промахе один запрос к базе
+            user_db = await get_user_state(session, user_id)
             
             # Если пользователь найден и заблокирован, отклоняем сообщение
             if user_db and user_db.blocked:
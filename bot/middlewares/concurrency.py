@@ -0,0 +1,26 @@
+import asyncio
+from typing import Callable, Awaitable, Dict, Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """
+    Не больше limit обновлений обрабатываются одновременно, остальные ждут
+    своей очереди. Polling и webhook сами число обработчиков не ограничивают,
+    а каждое обновление держит соединение с базой из пула
+    """
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        async with self.semaphore:
+            return await handler(event, data)
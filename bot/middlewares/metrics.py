@@ -0,0 +1,102 @@
+import time
+from typing import Callable, Awaitable, Dict, Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, \
+    NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, TelegramObject, Update
+from aiogram_dialog.utils import remove_indent_id
+
+from bot.service.metrics import metrics, update_stats, UpdateStats
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработки обновления и запросы к базе за него.
+    Регистрируется первым, чтобы учесть остальные middleware
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = update_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.update_seconds.observe(
+                time.perf_counter() - start, event.event_type
+            )
+            metrics.update_queries.observe(stats.queries)
+            metrics.update_db_seconds.observe(stats.db_seconds)
+            update_stats.reset(token)
+
+
+def dialog_handler_name(event: TelegramObject, state: str) -> str:
+    """
+    Имя обработчика диалога. У всех диалогов один callback aiogram_dialog,
+    поэтому они различаются состоянием и нажатым виджетом
+    """
+    if isinstance(event, CallbackQuery) and event.data:
+        _, callback_data = remove_indent_id(event.data)
+        return f'{state}:{callback_data.split(":", 1)[0]}'
+    return state
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработчика и состояния диалога, в котором он вызван
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        callback = data['handler'].callback
+        context = data.get('aiogd_context')
+        if context is not None:
+            state = context.state.state
+        else:
+            state = data.get('raw_state') or 'none'
+        if callback.__module__.startswith('aiogram_dialog'):
+            name = dialog_handler_name(event, state)
+        else:
+            name = f'{callback.__module__}.{callback.__qualname__}'
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.handler_seconds.observe(elapsed, name)
+            metrics.state_seconds.observe(elapsed, state)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Время запросов к Bot API по методам
+    """
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            metrics.telegram_errors.inc(method.__api_method__)
+            raise
+        finally:
+            metrics.telegram_seconds.observe(
+                time.perf_counter() - start, method.__api_method__
+            )
@@ -1,9 +1,14 @@
+import logging
 from typing import Callable, Awaitable, Dict, Any
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
+log = logging.getLogger(__name__)
+
+
 class DbSessionMiddleware(BaseMiddleware):
     def __init__(self, session_pool: async_sessionmaker):
         super().__init__()
@@ -17,4 +22,14 @@ class DbSessionMiddleware(BaseMiddleware):
     ) -> Any:
         async with self.session_pool() as session:
             data["session"] = session
-            return await handler(event, data)
\ No newline at end of file
+            try:
+                return await handler(event, data)
+            except PoolTimeoutError:
+                # Обработчик открыл вторую сессию или пул меньше
+                # UPDATE_CONCURRENCY: ошибка сразу, а не зависание
+                log.error(
+                    'Database connection pool exhausted, check that handlers '
+                    'do not open a second session and that DB_POOL_SIZE is '
+                    'not less than UPDATE_CONCURRENCY'
+                )
+                raise
@@ -3,9 +3,9 @@ from typing import Callable, Awaitable, Dict, Any, cast
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message
 from cachetools import TTLCache
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database.requests import upsert_user
+from bot.database.sqlite_engine import write_queue
 
 class TrackAllUsersMiddleware(BaseMiddleware):
     def __init__(self):
@@ -25,13 +25,14 @@ class TrackAllUsersMiddleware(BaseMiddleware):
         user_id = event.from_user.id
 
         if user_id not in self.cache:
-            session: AsyncSession = data["session"]
-            await upsert_user(
-                session=session,
+            # Регистрации новых пользователей коммитятся пачками
+            await write_queue.submit(
+                upsert_user,
                 telegram_id=event.from_user.id,
                 username=event.from_user.username,
                 fullname=event.from_user.full_name,
-                lang_tg=event.from_user.language_code
+                lang_tg=event.from_user.language_code,
+                commit=False
             )
             self.cache[user_id] = None
         return await handler(event, data)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from datetime import timezone, timedelta
 from os import environ
@@ -33,6 +34,38 @@ class ConfigBot:
     POSTGRES_PASSWORD: str
     TINKOFF_TERMINAL: str
     TINKOFF_SECRET: str
+    DB_ENGINE: str = 'sqlite'
+    SQLITE_PATH: str
+    POSTGRES_HOST: str = 'localhost'
+    POSTGRES_PORT: int = 5432
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 5
+    UPDATE_CONCURRENCY: int = 10
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    PAYMENT_WEBHOOK_HOST: str = '0.0.0.0'
+    PAYMENT_WEBHOOK_PORT: int = 0
+    PAYMENT_WEBHOOK_URL: str
+    LAVA_WEBHOOK_KEY: str
+    YOOMONEY_NOTIFICATION_SECRET: str
+    BOT_MODE: str = 'polling'
+    WEBHOOK_URL: str
+    WEBHOOK_PATH: str = '/telegram'
+    WEBHOOK_HOST: str = '0.0.0.0'
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_SECRET: str
+    WEBHOOK_WORKERS: int = 1
+    TELEGRAM_API_SERVER: str
+    REDIS_URL: str
+    FSM_STORAGE: str = 'db'
+    FSM_STATE_TTL: int = 7 * 24 * 60 * 60
+    MODERATION_DIGEST: int = 0
+    AUTO_RENEWAL: bool = False
+    LOG_LEVEL: str = 'INFO'
+    LOG_FORMAT: str = 'text'
+    LOG_RATE: float = 0
+    METRICS_HOST: str = '127.0.0.1'
+    METRICS_PORT: int = 0
     TYPE_PAYMENT: dict = {
         0: 'new_sub',
         1: 'extend_sub',
@@ -118,6 +151,86 @@ class ConfigBot:
         self.CRYPTOMUS_KEY = os.getenv('CRYPTOMUS_KEY', '')
         self.CRYPTOMUS_UUID = os.getenv('CRYPTOMUS_UUID', '')
         self.CRYPTO_BOT_API = os.getenv('CRYPTO_BOT_API', '')
+        # Прием уведомлений об оплате, 0 - выключено
+        self.PAYMENT_WEBHOOK_HOST = os.getenv('PAYMENT_WEBHOOK_HOST', '0.0.0.0')
+        try:
+            self.PAYMENT_WEBHOOK_PORT = int(os.getenv('PAYMENT_WEBHOOK_PORT', 0))
+        except ValueError:
+            raise ValueError('PAYMENT_WEBHOOK_PORT must be a number')
+        self.PAYMENT_WEBHOOK_URL = os.getenv('PAYMENT_WEBHOOK_URL', '')
+        self.LAVA_WEBHOOK_KEY = os.getenv('LAVA_WEBHOOK_KEY', '')
+        self.YOOMONEY_NOTIFICATION_SECRET = os.getenv(
+            'YOOMONEY_NOTIFICATION_SECRET', ''
+        )
+        # polling или webhook
+        self.BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+        if self.BOT_MODE not in ('polling', 'webhook'):
+            raise ValueError('BOT_MODE must be polling or webhook')
+        self.WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+        if self.BOT_MODE == 'webhook' and self.WEBHOOK_URL == '':
+            raise ValueError('Write your external bot address to WEBHOOK_URL')
+        self.WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+        self.WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+        try:
+            self.WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+            self.WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 1))
+        except ValueError:
+            raise ValueError('WEBHOOK_PORT and WEBHOOK_WORKERS must be numbers')
+        # Без секрета он получается из токена, одинаковый во всех процессах
+        self.WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+        if self.WEBHOOK_SECRET == '':
+            self.WEBHOOK_SECRET = hashlib.sha256(
+                self.TOKEN.encode()
+            ).hexdigest()
+        # Свой сервер Bot API, например локальный для тестов
+        self.TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER', '')
+        self.REDIS_URL = os.getenv('REDIS_URL', '')
+        # Хранилище FSM и диалогов: db, redis или memory
+        self.FSM_STORAGE = os.getenv(
+            'FSM_STORAGE', 'redis' if self.REDIS_URL else 'db'
+        ).lower()
+        if self.FSM_STORAGE not in ('db', 'redis', 'memory'):
+            raise ValueError('FSM_STORAGE must be db, redis or memory')
+        if self.FSM_STORAGE == 'redis' and self.REDIS_URL == '':
+            raise ValueError('Write your Redis address to REDIS_URL')
+        if self.WEBHOOK_WORKERS > 1 and self.FSM_STORAGE == 'memory':
+            raise ValueError(
+                'WEBHOOK_WORKERS > 1 needs shared storage, '
+                'set FSM_STORAGE to db or redis'
+            )
+        try:
+            self.FSM_STATE_TTL = int(
+                os.getenv('FSM_STATE_TTL', 7 * 24 * 60 * 60)
+            )
+        except ValueError:
+            raise ValueError('FSM_STATE_TTL must be a number')
+        # Сводка заявок на модерацию раз в N секунд, 0 - каждая заявка сразу
+        try:
+            self.MODERATION_DIGEST = int(os.getenv('MODERATION_DIGEST', 0))
+        except ValueError:
+            raise ValueError('MODERATION_DIGEST must be a number')
+        # Сохранять способ оплаты ЮKassa и продлевать подписку автоматически
+        self.AUTO_RENEWAL = os.getenv('AUTO_RENEWAL', '').lower() in (
+            'true', '1', 'yes'
+        )
+        self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+        if self.LOG_LEVEL not in ('DEBUG', 'INFO', 'WARNING', 'ERROR'):
+            raise ValueError('LOG_LEVEL must be DEBUG, INFO, WARNING or ERROR')
+        # text или json - одна запись JSON на строку
+        self.LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+        if self.LOG_FORMAT not in ('text', 'json'):
+            raise ValueError('LOG_FORMAT must be text or json')
+        # Записей INFO в секунду от одного логгера, 0 - без ограничения
+        try:
+            self.LOG_RATE = float(os.getenv('LOG_RATE', 0))
+        except ValueError:
+            raise ValueError('LOG_RATE must be a number')
+        # Метрики Prometheus на /metrics, 0 - выключено
+        self.METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+        try:
+            self.METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+        except ValueError:
+            raise ValueError('METRICS_PORT must be a number')
         self.DEBUG = os.getenv('DEBUG') == 'True'
         self.POSTGRES_DB = os.getenv('POSTGRES_DB', '')
         if self.POSTGRES_DB == '':
@@ -128,6 +241,33 @@ class ConfigBot:
         self.POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', '')
         if self.POSTGRES_PASSWORD == '':
             raise ValueError('Write your password DB to POSTGRES_PASSWORD')
+        # sqlite или postgres
+        self.DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+        if self.DB_ENGINE not in ('sqlite', 'postgres'):
+            raise ValueError('DB_ENGINE must be sqlite or postgres')
+        # Файл базы SQLite, по умолчанию bot/database/sqlite/PrivateClubDB.db
+        self.SQLITE_PATH = os.getenv('SQLITE_PATH', '')
+        self.POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
+        try:
+            self.POSTGRES_PORT = int(os.getenv('POSTGRES_PORT', 5432))
+            self.DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+            self.DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+            # Сколько секунд обновление ждёт свободное соединение
+            self.DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 5))
+            # Сколько обновлений обрабатывается одновременно в процессе
+            self.UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', 10))
+            # 0 при работе через pgbouncer в режиме transaction
+            self.DB_STATEMENT_CACHE_SIZE = int(
+                os.getenv('DB_STATEMENT_CACHE_SIZE', 100)
+            )
+        except ValueError:
+            raise ValueError(
+                'POSTGRES_PORT, DB_POOL_SIZE, DB_MAX_OVERFLOW, '
+                'DB_POOL_TIMEOUT, UPDATE_CONCURRENCY and '
+                'DB_STATEMENT_CACHE_SIZE must be numbers'
+            )
+        if self.UPDATE_CONCURRENCY < 1:
+            raise ValueError('UPDATE_CONCURRENCY must be at least 1')
         pg_email = os.getenv('PGADMIN_DEFAULT_EMAIL', '')
         if pg_email == '':
             raise ValueError('Write your email to PGADMIN_DEFAULT_EMAIL')
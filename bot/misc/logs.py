@@ -0,0 +1,149 @@
+"""
+Логирование через очередь: обработчики пишут в файл и stdout из фонового
+потока, цикл событий только подставляет аргументы в сообщение и кладёт
+запись в очередь. Время, traceback и JSON форматируются в фоновом потоке.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler
+
+TEXT_FORMAT = ("%(levelname)s %(filename)s:%(lineno)d "
+               "[%(asctime)s] - %(name)s - %(message)s")
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = dict(
+            time=datetime.fromtimestamp(record.created).isoformat(
+                timespec='milliseconds'
+            ),
+            level=record.levelname,
+            logger=record.name,
+            source=f'{record.filename}:{record.lineno}',
+            process=record.process,
+            message=record.getMessage()
+        )
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Не больше rate записей в секунду от одного логгера, с запасом burst.
+    Предупреждения и ошибки проходят всегда. О пропущенных записях
+    логгер сообщает со следующей прошедшей записью.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        # логгер -> [токены, время пополнения, пропущено записей]
+        self._buckets: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [self.burst, now, 0]
+            tokens = min(
+                bucket[0] + (now - bucket[1]) * self.rate, self.burst
+            )
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return False
+            bucket[0] = tokens - 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f'[{dropped} records dropped] {record.msg}'
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare форматирует всю запись в вызывающем потоке.
+    Здесь в вызывающем потоке подставляются только аргументы: объекты
+    в args могут измениться, пока запись ждёт в очереди. Остальное
+    форматируется обработчиками в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: QueueListener | None = None
+
+
+def stop_logging():
+    """Дописать записи из очереди и остановить поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logging(
+        level: str = 'INFO',
+        log_format: str = 'text',
+        rate: float = 0,
+        filename: str = 'logs/all.log'
+):
+    """
+    Повторный вызов заменяет обработчики и поток записи
+    :param log_format: text или json
+    :param rate: Записей в секунду от одного логгера, 0 - без ограничения
+    """
+    global _listener
+    if _listener is None:
+        atexit.register(stop_logging)
+    else:
+        stop_logging()
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    handlers = [
+        RotatingFileHandler(
+            filename=filename,
+            maxBytes=1024 * 1024 * 25,
+            encoding='UTF-8',
+        ),
+        logging.StreamHandler(sys.stdout)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    if rate:
+        handler.addFilter(RateLimitFilter(rate))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    _listener = QueueListener(records, *handlers)
+    _listener.start()
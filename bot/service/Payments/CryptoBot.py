@@ -1,43 +1,66 @@
-import asyncio
+import hashlib
+import hmac
+import json
 import logging
 
-from aiocryptopay import AioCryptoPay, Networks
+from aiocryptopay import AioCryptoPay
 
-from . import PaymentSystem
+from bot.misc import Config
+from . import PaymentSystem, WebhookError, WebhookPayment
+from .clients import provider_clients
 
 log = logging.getLogger(__name__)
 
 
 class CryptoBot(PaymentSystem):
+    NAME = 'CryptoBot'
+    WEBHOOK_KEY_SETTING = 'CRYPTO_BOT_API'
     CRYPTO: type(AioCryptoPay)
+    # getInvoices принимает не больше 100 счетов за запрос
+    MAX_INVOICES = 100
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.CRYPTO = AioCryptoPay(
-            token=self.CRYPTO_BOT_API,
-            network=Networks.MAIN_NET
-        )
+        self.CRYPTO = provider_clients.crypto_pay(self.CRYPTO_BOT_API)
+
+    async def check_invoice(self) -> bool:
+        return bool(await self.check_invoices([self]))
 
-    async def check_pay_wallet(self, order):
-        tic = 0
-        while tic < self.CHECK_PERIOD:
-            order_preview = await self.CRYPTO.get_invoices(
-                invoice_ids=order.invoice_id
+    @classmethod
+    async def check_invoices(cls, payments):
+        paid = set()
+        crypto = payments[0].CRYPTO
+        for i in range(0, len(payments), cls.MAX_INVOICES):
+            invoices = await crypto.get_invoices(
+                invoice_ids=[
+                    int(p.INVOICE_ID)
+                    for p in payments[i:i + cls.MAX_INVOICES]
+                ]
             )
-            if order_preview.status == "paid":
-                await self.successful_payment(
-                    self.price,
-                    'CryptoBot'
-                )
-                return
-            tic += self.STEP
-            await asyncio.sleep(self.STEP)
-            if self.CHECK_PERIOD - tic <= self.TIME_DELETE:
-                await self.delete_pay_button('CryptoBot')
+            for invoice in invoices or []:
+                if invoice.status == 'paid':
+                    paid.add(str(invoice.invoice_id))
+        return [p for p in payments if p.INVOICE_ID in paid]
+
+    @classmethod
+    async def parse_webhook(cls, request):
+        # Адрес задаётся в настройках приложения @CryptoBot
+        body = await request.read()
+        secret = hashlib.sha256(Config.CRYPTO_BOT_API.encode()).digest()
+        sign = hmac.new(secret, body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(
+                sign, request.headers.get('crypto-pay-api-signature', '')
+        ):
+            raise WebhookError('CryptoBot signature mismatch')
+        data = json.loads(body)
+        if data['update_type'] != 'invoice_paid':
+            return None
+        return WebhookPayment(str(data['payload']['invoice_id']))
+
+    async def cancel_invoice(self):
         await self.CRYPTO.delete_invoice(
-            invoice_id=order.invoice_id
+            invoice_id=int(self.INVOICE_ID)
         )
-        return
 
     async def to_pay(self):
         order = await self.CRYPTO.create_invoice(
@@ -53,13 +76,7 @@ class CryptoBot(PaymentSystem):
             f'Create payment link CryptoBot '
             f'User: ID: {self.user_id}'
         )
-        try:
-            await self.check_pay_wallet(order)
-        except BaseException as e:
-            log.error(e, 'The payment period has expired')
-        finally:
-            await self.delete_pay_button('CryptoBot')
-            log.info('exit check payment CryptoBot')
+        await self.watch(order.invoice_id)
 
     def __str__(self):
         return 'Платежная система CryptoBot'
@@ -1,23 +1,26 @@
-import asyncio
+import base64
+import hashlib
+import hmac
+import json
 import logging
 import uuid
 
-from cryptomus import Client
-from cryptomus.payments import Payment
-from cryptomus.payouts import Payout
-
-from . import PaymentSystem
+from bot.misc import Config
+from . import PaymentSystem, WebhookError, WebhookPayment
+from .clients import CryptomusClient, provider_clients
 
 log = logging.getLogger(__name__)
 
 
 class Cryptomus(PaymentSystem):
-    PAYMENT: Payment
+    NAME = 'Cryptomus'
+    WEBHOOK_KEY_SETTING = 'CRYPTOMUS_KEY'
+    PAYMENT: CryptomusClient
     ID: str
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.PAYMENT = Client.payment(
+        self.PAYMENT = provider_clients.cryptomus(
             self.CRYPTOMUS_KEY_PAYMENT,
             self.CRYPTOMUS_KEY_UUID
         )
@@ -26,47 +29,49 @@ class Cryptomus(PaymentSystem):
         self.ID = str(uuid.uuid4())
 
     async def new_payment(self):
-        return {
+        data = {
             'amount': str(self.price),
             'currency': 'RUB',
             'order_id': self.ID,
             'lifetime': self.CHECK_PERIOD - 30,
         }
+        if self.webhook_url() is not None:
+            data['url_callback'] = self.webhook_url()
+        return data
+
+    async def check_invoice(self) -> bool:
+        order_info = await self.PAYMENT.payment_info(
+            {'uuid': self.INVOICE_ID}
+        )
+        return order_info['status'] == 'paid'
 
-    async def check_pay_wallet(self, uuid_order):
-        tic = 0
-        while tic < self.CHECK_PERIOD:
-            order_info = self.PAYMENT.info(
-                {'uuid': uuid_order}
-            )
-            if order_info['status'] == "paid":
-                await self.successful_payment(
-                    self.price,
-                    'Cryptomus'
-                )
-                return
-            tic += self.STEP
-            await asyncio.sleep(self.STEP)
-            if self.CHECK_PERIOD - tic <= self.TIME_DELETE:
-                await self.delete_pay_button('Cryptomus')
-        return
+    @classmethod
+    async def parse_webhook(cls, request):
+        data = await request.json()
+        sign = data.pop('sign', '')
+        # Подпись считается от JSON в формате PHP json_encode
+        payload = json.dumps(
+            data, ensure_ascii=False, separators=(',', ':')
+        ).replace('/', '\\/')
+        expected = hashlib.md5(
+            base64.b64encode(payload.encode()) + Config.CRYPTOMUS_KEY.encode()
+        ).hexdigest()
+        if not hmac.compare_digest(expected, sign):
+            raise WebhookError('Cryptomus signature mismatch')
+        if data['status'] not in ('paid', 'paid_over'):
+            return None
+        return WebhookPayment(data['uuid'])
 
     async def to_pay(self):
         await self.create_id()
         data = await self.new_payment()
-        result = self.PAYMENT.create(data)
+        result = await self.PAYMENT.create_payment(data)
         await self.pay_button(result['url'])
         log.info(
             f'Create payment link Cryptomus '
             f'User: ID: {self.user_id}'
         )
-        try:
-            await self.check_pay_wallet(result['uuid'])
-        except BaseException as e:
-            log.error(e, 'The payment period has expired')
-        finally:
-            await self.delete_pay_button('Cryptomus')
-            log.info('exit check payment Cryptomus')
+        await self.watch(result['uuid'])
 
     def __str__(self):
         return 'Платежная система Cryptomus'
@@ -1,24 +1,32 @@
-import asyncio
 import logging
 import uuid
 
-from yookassa import Configuration, Payment
-
-from . import PaymentSystem
+from bot.database.crud.create import add_auto_renewal
+from . import PaymentSystem, WebhookPayment
+from .clients import YooKassaClient, provider_clients
 
 log = logging.getLogger(__name__)
 
 
 class KassaSmart(PaymentSystem):
+    NAME = 'YooKassaSmart'
+    RECORD_NAME = 'YooKassaSmart (включая комиссию 3.5%)'
     CHECK_ID: str = None
     ID: str = None
     EMAIL: str
+    # Сохранённый при оплате способ оплаты для автопродления
+    PAYMENT_METHOD_ID: str = None
+    # Уведомления ЮKassa не подписаны, статус перепроверяется через API
+    WEBHOOK_VERIFY = True
 
     def __init__(self,**kwargs):
         super().__init__(**kwargs)
         self.ACCOUNT_ID = int(self.YOOKASSA_SHOP_ID)
         self.SECRET_KEY = self.YOOKASSA_SECRET_KEY
-        self.EMAIL = kwargs['email']
+        self.EMAIL = kwargs.get('email')
+        self.KASSA = provider_clients.yookassa(
+            self.ACCOUNT_ID, self.SECRET_KEY
+        )
 
     async def create(self):
         self.ID = str(uuid.uuid4())
@@ -29,28 +37,26 @@ class KassaSmart(PaymentSystem):
         self.price = round(self.price + commission_amount)  # Округляем до целого числа
         log.info(f"YooKassaSmart: added commission 3.5%, new price: {self.price}")
 
-    async def check_payment(self):
-        Configuration.account_id = self.ACCOUNT_ID
-        Configuration.secret_key = self.SECRET_KEY
-        tic = 0
-        while tic < self.CHECK_PERIOD:
-            res = await Payment.find_one(self.ID)
-            if res.status == 'succeeded':
-                await self.successful_payment(
-                    self.price,
-                    'YooKassaSmart (включая комиссию 3.5%)',
-                    id_payment=self.ID
-                )
-                return
-            tic += self.STEP
-            await asyncio.sleep(self.STEP)
-            if self.CHECK_PERIOD - tic <= self.TIME_DELETE:
-                await self.delete_pay_button('YooKassaSmart')
-        return
+    async def check_invoice(self) -> bool:
+        res = await self.KASSA.find_payment(self.INVOICE_ID)
+        if res.payment_method is not None and res.payment_method.saved:
+            self.PAYMENT_METHOD_ID = res.payment_method.id
+        return res.status == 'succeeded'
+
+    async def confirm(self):
+        await super().confirm()
+        if self.PAYMENT_METHOD_ID is not None:
+            await add_auto_renewal(
+                self.SESSION,
+                self.user_id,
+                self.PAYMENT_METHOD_ID,
+                self.price,
+                self.period
+            )
 
     async def invoice(self):
         bot = await self.message.bot.me()
-        payment = await Payment.create({
+        payment = await self.KASSA.create_payment({
             "amount": {
               "value": self.price,
               "currency": "RUB"
@@ -82,22 +88,43 @@ class KassaSmart(PaymentSystem):
             "capture": True,
             "description":
                 self.i18n.user.text.subscription.description.payment(),
-            "save_payment_method": False
+            "save_payment_method": self.CONFIG.AUTO_RENEWAL
         }, self.ID)
         self.ID = payment.id
         return payment.confirmation.confirmation_url
 
+    @classmethod
+    async def parse_webhook(cls, request):
+        # Адрес задаётся в личном кабинете ЮKassa
+        data = await request.json()
+        if data['event'] != 'payment.succeeded':
+            return None
+        return WebhookPayment(data['object']['id'])
+
+    @staticmethod
+    def client(config) -> YooKassaClient:
+        """Клиент ЮKassa для ключей магазина из config"""
+        return provider_clients.yookassa(
+            int(config.YOOKASSA_SHOP_ID), config.YOOKASSA_SECRET_KEY
+        )
+
     @staticmethod
     async def auto_payment(
             config,
             i18n,
             payment_id,
             price,
+            idempotency_key=None
     ):
+        """
+        Списание с сохранённого способа оплаты. Результат не ожидается,
+        статус списания проверяет RenewalEngine
+        :param payment_id: ID сохранённого способа оплаты
+        :param idempotency_key: Повтор с тем же ключом не спишет дважды
+        :return: Платёж ЮKassa или None, если списание не создано
+        """
         try:
-            Configuration.account_id = config.yookassa_shop_id
-            Configuration.secret_key = config.yookassa_secret_key
-            payment = await Payment.create({
+            return await KassaSmart.client(config).create_payment({
                 "amount": {
                     "value": price,
                     "currency": "RUB"
@@ -105,38 +132,29 @@ class KassaSmart(PaymentSystem):
                 "capture": True,
                 "description": i18n.user.text.subscription.description.payment(),
                 "payment_method_id": payment_id
-            })
-            tic = 0
-            while tic < 60:
-                res = await Payment.find_one(payment.id)
-                if res.status == 'succeeded':
-                    return res
-                tic += 2
-                await asyncio.sleep(2)
-            return None
+            }, idempotency_key)
         except Exception as e:
             log.error(
                 f'Error Auto Pay KassaSmart, ID payment {payment_id}\n{e}'
             )
             return None
 
+    @staticmethod
+    async def find_payment(config, payment_id):
+        """
+        :return: Платёж ЮKassa по ID
+        """
+        return await KassaSmart.client(config).find_payment(payment_id)
+
     async def to_pay(self):
         await self.create()
-        Configuration.account_id = self.ACCOUNT_ID
-        Configuration.secret_key = self.SECRET_KEY
         link_invoice = await self.invoice()
         await self.pay_button(link_invoice, delete=False)
         log.info(
             f'Create payment link YooKassaSmart '
             f'User: (ID: {self.user_id}) - {self.price} RUB'
         )
-        try:
-            await self.check_payment()
-        except BaseException as e:
-            log.error(e, 'The payment period has expired')
-        finally:
-            await self.delete_pay_button('YooKassaSmart')
-            log.info('exit check payment YooKassaSmart')
+        await self.watch(self.ID)
 
     def __str__(self):
         return 'YooKassaSmart payment system'
@@ -1,23 +1,26 @@
-import asyncio
+import hashlib
+import hmac
 import logging
 import uuid
 
-from aiolava import LavaBusinessClient
-
-from . import PaymentSystem
+from bot.misc import Config
+from . import PaymentSystem, WebhookError, WebhookPayment
+from .clients import provider_clients
 
 
 log = logging.getLogger(__name__)
 
 
 class Lava(PaymentSystem):
+    NAME = 'Lava'
     ID: str = None
+    WEBHOOK_KEY_SETTING = 'LAVA_WEBHOOK_KEY'
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.CLIENT = LavaBusinessClient(
-            private_key=self.LAVA_TOKEN_SECRET,
-            shop_id=self.LAVA_PROJECT_ID
+        self.CLIENT = provider_clients.lava(
+            self.LAVA_TOKEN_SECRET,
+            self.LAVA_PROJECT_ID
         )
 
     async def create_id(self):
@@ -26,22 +29,31 @@ class Lava(PaymentSystem):
     async def create_invoice(self):
         invoice = await self.CLIENT.create_invoice(
             sum_=self.price,
-            order_id=self.ID
+            order_id=self.ID,
+            hook_url=self.webhook_url()
         )
         return invoice
 
-    async def check_payment(self):
-        tic = 0
-        while tic < self.CHECK_PERIOD:
-            status = await self.CLIENT.check_invoice_status(order_id=self.ID)
-            if status.data.status == 'success':
-                await self.successful_payment(self.price, 'Lava')
-                return
-            tic += self.STEP
-            await asyncio.sleep(self.STEP)
-            if self.CHECK_PERIOD - tic <= self.TIME_DELETE:
-                await self.delete_pay_button('Lava')
-        return
+    async def check_invoice(self) -> bool:
+        status = await self.CLIENT.check_invoice_status(
+            order_id=self.INVOICE_ID
+        )
+        return status.data.status == 'success'
+
+    @classmethod
+    async def parse_webhook(cls, request):
+        body = await request.read()
+        sign = hmac.new(
+            Config.LAVA_WEBHOOK_KEY.encode(), body, hashlib.sha256
+        ).hexdigest()
+        if not hmac.compare_digest(
+                sign, request.headers.get('Authorization', '')
+        ):
+            raise WebhookError('Lava signature mismatch')
+        data = await request.json()
+        if data['status'] != 'success':
+            return None
+        return WebhookPayment(data['order_id'], float(data['amount']))
 
     async def to_pay(self):
         await self.create_id()
@@ -51,13 +63,7 @@ class Lava(PaymentSystem):
             f'Create payment link Lava '
             f'User: ID: {self.user_id}'
         )
-        try:
-            await self.check_payment()
-        except BaseException as e:
-            log.error(e, 'The payment period has expired')
-        finally:
-            await self.delete_pay_button('Lava')
-            log.info('exit check payment Lava')
+        await self.watch(self.ID)
 
     def __str__(self):
         return 'Lava payment system'
@@ -17,6 +17,7 @@ log = logging.getLogger(__name__)
 
 
 class Stars(PaymentSystem):
+    NAME = 'Telegram Stars'
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -78,7 +79,8 @@ async def on_successful_payment(
     try:
         await payment_system.successful_payment(
             price,
-            'Telegram Stars'
+            Stars.NAME,
+            id_payment=message.successful_payment.telegram_payment_charge_id
         )
     except BaseException as e:
         log.error(e, 'The payment period has expired')
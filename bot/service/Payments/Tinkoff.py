@@ -1,20 +1,25 @@
-import asyncio
+import hashlib
+import hmac
 import logging
 import uuid
 
-from tinkoff_acquiring import TinkoffAcquiringAPIClient, TinkoffAPIException
+from tinkoff_acquiring import TinkoffAcquiringAPIClient
 
-from . import PaymentSystem
+from bot.misc import Config
+from . import PaymentSystem, WebhookError, WebhookPayment
+from .clients import provider_clients
 
 log = logging.getLogger(__name__)
 
 
 class TinkoffPay(PaymentSystem):
+    NAME = 'TinkoffPay'
+    WEBHOOK_KEY_SETTING = 'TINKOFF_SECRET'
     CLIENT: TinkoffAcquiringAPIClient
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.CLIENT = TinkoffAcquiringAPIClient(
+        self.CLIENT = provider_clients.tinkoff(
             self.TINKOFF_TERMINAL,
             self.TINKOFF_SECRET
         )
@@ -26,21 +31,31 @@ class TinkoffPay(PaymentSystem):
             description=self.i18n.user.text.subscription.description.payment()
         )
 
-    async def check_pay_wallet(self, payment_id):
-        tic = 0
-        while tic < self.CHECK_PERIOD:
-            order_preview = await self.CLIENT.get_payment_state(payment_id)
-            if order_preview['Status'] == "CONFIRMED":
-                await self.successful_payment(
-                    self.price,
-                    'TinkoffPay'
-                )
-                return
-            tic += self.STEP
-            await asyncio.sleep(self.STEP)
-            if self.CHECK_PERIOD - tic <= self.TIME_DELETE:
-                await self.delete_pay_button('TinkoffPay')
-        return
+    async def check_invoice(self) -> bool:
+        order_preview = await self.CLIENT.get_payment_state(self.INVOICE_ID)
+        return order_preview['Status'] == 'CONFIRMED'
+
+    @classmethod
+    async def parse_webhook(cls, request):
+        # Адрес задаётся в настройках терминала
+        data = await request.json()
+        token = data.pop('Token', '')
+        values = {
+            key: str(value).lower() if isinstance(value, bool) else str(value)
+            for key, value in data.items()
+            if not isinstance(value, (dict, list))
+        }
+        values['Password'] = Config.TINKOFF_SECRET
+        expected = hashlib.sha256(
+            ''.join(values[key] for key in sorted(values)).encode()
+        ).hexdigest()
+        if (not hmac.compare_digest(expected, token)
+                or data.get('TerminalKey') != Config.TINKOFF_TERMINAL):
+            raise WebhookError('TinkoffPay signature mismatch')
+        if data['Status'] != 'CONFIRMED':
+            return None
+        # Сумма в копейках
+        return WebhookPayment(str(data['PaymentId']), data['Amount'] / 100)
 
     async def to_pay(self):
         response = await self.new_order()
@@ -51,13 +66,7 @@ class TinkoffPay(PaymentSystem):
             f'Create payment link TinkoffPay '
             f'User: ID: {self.user_id}'
         )
-        try:
-            await self.check_pay_wallet(payment_id)
-        except BaseException as e:
-            log.error(e, 'The payment period has expired')
-        finally:
-            await self.delete_pay_button('TinkoffPay')
-            log.info('exit check payment TinkoffPay')
+        await self.watch(payment_id)
 
     def __str__(self):
         return 'Платежная система TinkoffPay'
@@ -1,19 +1,26 @@
-import asyncio
+import hashlib
+import hmac
 import logging
-import random
 import uuid
+from urllib.parse import quote, urlencode
 
-from aiohttp import client_exceptions
-from yoomoney_async import Quickpay, Client
+from yoomoney_async.exceptions import YooMoneyError
 
-from . import PaymentSystem
+from bot.misc import Config
+from . import PaymentSystem, WebhookError, WebhookPayment
+from .clients import provider_clients
 
 log = logging.getLogger(__name__)
 
 
 class YooMoney(PaymentSystem):
+    NAME = 'YooMoney'
+    RECORD_NAME = 'YooMoney (включая комиссию 3.5%)'
     CHECK_ID: str = None
     ID: str = None
+    API_URL = 'https://yoomoney.ru/api/operation-history'
+    QUICKPAY_URL = 'https://yoomoney.ru/quickpay/confirm.xml'
+    WEBHOOK_KEY_SETTING = 'YOOMONEY_NOTIFICATION_SECRET'
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -29,36 +36,56 @@ class YooMoney(PaymentSystem):
         self.price = round(self.price + commission_amount)  # Округляем до целого числа
         log.info(f"YooMoney: added commission 3.5%, new price: {self.price}")
 
-    async def check_payment(self):
-        client = Client(self.TOKEN)
-        tic = 0
-        while tic < self.CHECK_PERIOD:
-            try:
-                history = await client.operation_history(label=self.ID)
-                for operation in history.operations:
-                    # Учитываем, что цена уже включает комиссию 3.5%
-                    await self.successful_payment(self.price, 'YooMoney (включая комиссию 3.5%)')
-                    return
-            except client_exceptions.ClientOSError as e:
-                await asyncio.sleep(self.STEP + random.randint(0, 3))
-                log.info('Error 104  YooMoney -- OK')
-                continue
-            tic += self.STEP
-            await asyncio.sleep(self.STEP)
-            if self.CHECK_PERIOD - tic <= self.TIME_DELETE:
-                await self.delete_pay_button('YooMoney')
-        return
+    async def check_invoice(self) -> bool:
+        async with provider_clients.session.post(
+                self.API_URL,
+                headers={'Authorization': f'Bearer {self.TOKEN}'},
+                data={'label': self.INVOICE_ID}
+        ) as response:
+            history = await response.json(content_type=None)
+        if 'error' in history:
+            raise YooMoneyError(history['error'])
+        # Любая операция с меткой счёта означает оплату
+        return len(history.get('operations', [])) > 0
+
+    @classmethod
+    async def parse_webhook(cls, request):
+        # Адрес задаётся в настройках HTTP-уведомлений кошелька
+        data = await request.post()
+        check = '&'.join((
+            data['notification_type'],
+            data['operation_id'],
+            data['amount'],
+            data['currency'],
+            data['datetime'],
+            data['sender'],
+            data['codepro'],
+            Config.YOOMONEY_NOTIFICATION_SECRET,
+            data['label'],
+        ))
+        sign = hashlib.sha1(check.encode()).hexdigest()
+        if not hmac.compare_digest(sign, data.get('sha1_hash', '')):
+            raise WebhookError('YooMoney signature mismatch')
+        if data['label'] == '' or data.get('unaccepted') == 'true':
+            return None
+        # Сумму в ссылке на оплату плательщик может изменить. amount -
+        # зачисленная сумма за вычетом комиссии ЮMoney, withdraw_amount -
+        # списанная с плательщика, она сравнивается с ценой счёта
+        return WebhookPayment(
+            data['label'],
+            float(data.get('withdraw_amount') or data['amount'])
+        )
 
     async def invoice(self):
-        quick_pay = await Quickpay(
-            receiver=self.TOKEN_WALLET,
-            quickpay_form="shop",
-            targets='Deposit balance',
-            paymentType="SB",
-            sum=self.price,
-            label=self.ID
-        ).start()
-        return quick_pay.base_url
+        # Ссылка на форму оплаты собирается без запроса к ЮMoney
+        return f'{self.QUICKPAY_URL}?' + urlencode({
+            'receiver': self.TOKEN_WALLET,
+            'quickpay-form': 'shop',
+            'targets': 'Deposit balance',
+            'paymentType': 'SB',
+            'sum': self.price,
+            'label': self.ID
+        }, quote_via=quote)
 
     async def to_pay(self):
         await self.create()
@@ -68,13 +95,7 @@ class YooMoney(PaymentSystem):
             f'Create payment link YooMoney '
             f'User: {self.user_id} - {self.price} RUB'
         )
-        try:
-            await self.check_payment()
-        except BaseException as e:
-            log.error(e, 'The payment period has expired')
-        finally:
-            await self.delete_pay_button('YooMoney')
-            log.info('exit check payment YooMoney')
+        await self.watch(self.ID)
 
     def __str__(self):
         return 'Платежная система YooMoney'
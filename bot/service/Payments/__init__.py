@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 from fluentogram import TranslatorRunner
-from .payment_systems import PaymentSystem
+from .payment_systems import PaymentSystem, WebhookError, WebhookPayment
 
 from ...misc import Config
 from .KassaSmart import KassaSmart
@@ -0,0 +1,269 @@
+import base64
+import hashlib
+import json
+import logging
+import uuid
+
+from aiocryptopay import AioCryptoPay, Networks
+from aiohttp import BasicAuth, ClientSession, ClientTimeout, TCPConnector
+from aiolava import LavaBusinessClient
+from aiolava.misc import HTTPMethod
+from cryptomus.request_exceptions import RequestExceptionsBuilder
+from tinkoff_acquiring import TinkoffAcquiringAPIClient, TinkoffAPIException
+from yookassa import Configuration
+from yookassa.domain.exceptions import ApiError, BadRequestError, \
+    ForbiddenError, NotFoundError, ResponseProcessingError, \
+    TooManyRequestsError, UnauthorizedError
+from yookassa.domain.request import PaymentRequest
+from yookassa.domain.response import PaymentResponse
+
+log = logging.getLogger(__name__)
+
+
+class PooledLavaClient(LavaBusinessClient):
+    """LavaBusinessClient без новой сессии aiohttp на каждый запрос"""
+
+    def __init__(self, session: ClientSession, private_key: str, shop_id: str):
+        super().__init__(private_key=private_key, shop_id=shop_id)
+        self.session = session
+
+    async def _execute_request(self, request):
+        payload = request.dict(exclude_none=True)
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        }
+        payload, headers = self._prepare_request(payload, headers)
+        if request.__http_method__ is HTTPMethod.GET:
+            arguments = {'params': payload}
+        else:
+            arguments = {'json': payload}
+        async with self.session.request(
+                request.__http_method__.value,
+                self._BASE_URL + request.__endpoint__,
+                headers=headers,
+                **arguments
+        ) as response:
+            data = await response.json()
+        return request.__returns__.parse_obj(data)
+
+
+class PooledTinkoffClient(TinkoffAcquiringAPIClient):
+    """TinkoffAcquiringAPIClient на общей сессии вместо httpx на каждый запрос"""
+
+    def __init__(self, session: ClientSession, terminal_key: str, secret: str):
+        super().__init__(terminal_key, secret)
+        self.session = session
+
+    async def send_request(self, endpoint, params):
+        params['TerminalKey'] = self.terminal_key
+        params['Token'] = self.generate_token(params)
+        async with self.session.post(
+                self.API_ENDPOINT + endpoint, json=params
+        ) as response:
+            data = await response.json(content_type=None)
+            if response.status != 200 or not data.get('Success'):
+                raise TinkoffAPIException(data.get('Message', 'Unknown error'))
+        return data
+
+
+class CryptomusClient:
+    """
+    Асинхронный клиент API Cryptomus. SDK cryptomus синхронный
+    и блокировал цикл событий на время каждого запроса
+    """
+    API_URL = 'https://api.cryptomus.com/v1/'
+
+    def __init__(self, session: ClientSession, api_key: str, merchant: str):
+        self.session = session
+        self.api_key = api_key
+        self.merchant = merchant
+
+    def sign(self, body: str) -> str:
+        return hashlib.md5(
+            base64.b64encode(body.encode()) + self.api_key.encode()
+        ).hexdigest()
+
+    async def request(self, uri: str, data: dict) -> dict:
+        body = json.dumps(data, separators=(',', ':'))
+        async with self.session.post(
+                self.API_URL + uri,
+                data=body,
+                headers={
+                    'Accept': 'application/json',
+                    'Content-Type': 'application/json;charset=UTF-8',
+                    'merchant': self.merchant,
+                    'sign': self.sign(body)
+                }
+        ) as response:
+            status = response.status
+            result = await response.json(content_type=None)
+        if status != 200 or result.get('state') != 0:
+            raise RequestExceptionsBuilder(
+                result.get('message', 'Validation error'),
+                status,
+                uri,
+                errors=result.get('errors')
+            )
+        return result['result']
+
+    async def create_payment(self, data: dict) -> dict:
+        return await self.request('payment', data)
+
+    async def payment_info(self, data: dict) -> dict:
+        return await self.request('payment/info', data)
+
+
+class YooKassaClient:
+    """
+    Асинхронный клиент API ЮKassa с ключами своего магазина.
+    SDK yookassa берёт ключи из глобальной Configuration
+    и выполняет запросы синхронно в цикле событий
+    """
+    API_URL = Configuration.api_url + '/'
+    ERRORS = {
+        error.HTTP_CODE: error for error in (
+            BadRequestError,
+            ForbiddenError,
+            NotFoundError,
+            ResponseProcessingError,
+            TooManyRequestsError,
+            UnauthorizedError
+        )
+    }
+
+    def __init__(self, session: ClientSession, shop_id: str, secret_key: str):
+        self.session = session
+        self.auth = BasicAuth(str(shop_id), secret_key)
+
+    async def request(
+            self,
+            method: str,
+            uri: str,
+            data: dict | None = None,
+            idempotency_key=None
+    ) -> dict:
+        headers = {}
+        if idempotency_key is not None:
+            headers['Idempotence-Key'] = str(idempotency_key)
+        async with self.session.request(
+                method,
+                self.API_URL + uri,
+                json=data,
+                auth=self.auth,
+                headers=headers
+        ) as response:
+            status = response.status
+            if status == 200:
+                return await response.json(content_type=None)
+            error = self.ERRORS.get(status)
+            if error is None:
+                raise ApiError(await response.text())
+            raise error(await response.json(content_type=None))
+
+    async def create_payment(
+            self,
+            params: dict,
+            idempotency_key=None
+    ) -> PaymentResponse:
+        """
+        :param idempotency_key: Повтор с тем же ключом вернёт тот же платёж
+        """
+        request = PaymentRequest(params)
+        request.validate()
+        return PaymentResponse(await self.request(
+            'POST',
+            'payments',
+            dict(request),
+            idempotency_key or uuid.uuid4()
+        ))
+
+    async def find_payment(self, payment_id: str) -> PaymentResponse:
+        if not isinstance(payment_id, str) or not payment_id:
+            raise ValueError('Invalid payment_id value')
+        return PaymentResponse(
+            await self.request('GET', f'payments/{payment_id}')
+        )
+
+
+class ProviderClients:
+    """
+    Клиенты API платежных систем, общие для всех платежей процесса.
+    Запросы идут через одну сессию aiohttp с ограниченным пулом
+    keep-alive соединений, поэтому новый счёт не открывает новое
+    TCP/TLS соединение. Сессия создаётся при первом запросе
+    и закрывается при остановке бота.
+    """
+    POOL_SIZE = 50
+    # Соединений к одной платежной системе
+    POOL_PER_HOST = 10
+    KEEPALIVE = 60
+    TIMEOUT = 30
+
+    def __init__(self):
+        self._session: ClientSession | None = None
+        self._clients: dict[tuple, object] = {}
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=self.POOL_SIZE,
+                    limit_per_host=self.POOL_PER_HOST,
+                    keepalive_timeout=self.KEEPALIVE
+                ),
+                timeout=ClientTimeout(total=self.TIMEOUT)
+            )
+            # Клиенты держат ссылку на закрытую сессию
+            self._clients.clear()
+        return self._session
+
+    def _client(self, key: tuple, factory):
+        session = self.session
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = factory(session)
+        return client
+
+    def crypto_pay(self, token: str) -> AioCryptoPay:
+        def create(session: ClientSession) -> AioCryptoPay:
+            client = AioCryptoPay(token=token, network=Networks.MAIN_NET)
+            # Своя сессия клиента не создаётся, пока задана эта
+            client._session = session
+            return client
+        return self._client(('cryptobot', token), create)
+
+    def lava(self, private_key: str, shop_id: str) -> PooledLavaClient:
+        return self._client(
+            ('lava', private_key, shop_id),
+            lambda session: PooledLavaClient(session, private_key, shop_id)
+        )
+
+    def tinkoff(self, terminal_key: str, secret: str) -> PooledTinkoffClient:
+        return self._client(
+            ('tinkoff', terminal_key, secret),
+            lambda session: PooledTinkoffClient(session, terminal_key, secret)
+        )
+
+    def cryptomus(self, api_key: str, merchant: str) -> CryptomusClient:
+        return self._client(
+            ('cryptomus', api_key, merchant),
+            lambda session: CryptomusClient(session, api_key, merchant)
+        )
+
+    def yookassa(self, shop_id: str, secret_key: str) -> YooKassaClient:
+        return self._client(
+            ('yookassa', shop_id, secret_key),
+            lambda session: YooKassaClient(session, shop_id, secret_key)
+        )
+
+    async def close(self):
+        self._clients.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            log.info('Payment provider sessions closed')
+        self._session = None
+
+
+provider_clients = ProviderClients()
@@ -1,8 +1,10 @@
+import asyncio
 import logging
-from typing import TYPE_CHECKING
+from typing import NamedTuple, TYPE_CHECKING
 
+from aiogram import Bot
+from aiohttp import web
 from aiogram.types import (
-    FSInputFile,
     Message,
     InlineKeyboardMarkup,
     WebAppInfo
@@ -11,10 +13,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy.ext.asyncio import AsyncSession
 from fluentogram import TranslatorRunner
 
-from bot.database.crud.create import add_payment
-from bot.database.crud.update import user_subscribe
+from bot.database.crud.create import add_pending_payment
+from bot.database.crud.update import finalize_payment
 from bot.keyboards.user_inline import link_chanel
 from bot.misc import Config
+from bot.service.loop import expiry_scheduler
+from bot.service.media import media_registry
+from bot.service.payment_watcher import payment_watcher
 
 if TYPE_CHECKING:
     from bot.locales.stub import TranslatorRunner
@@ -24,14 +29,29 @@ from bot.misc.config import ConfigBot
 log = logging.getLogger(__name__)
 
 
+class WebhookError(Exception):
+    """Уведомление не прошло проверку подписи"""
+
+
+class WebhookPayment(NamedTuple):
+    """Оплата из уведомления платежной системы"""
+    invoice_id: str
+    # Сумма оплаты в рублях, None - система её не передаёт
+    amount: float | None = None
+
+
 class PaymentSystem:
+    NAME: str = None
+    RECORD_NAME: str = None
     TOKEN: str
     CHECK_PERIOD = 50 * 60
     STEP = 5
     TIME_DELETE: int = 5 * 60
+    CHECK_CONCURRENCY = 10
     TYPE_PAYMENT: str
     KEY_ID: int
-    MESSAGE_ID_PAYMENT: Message = None
+    INVOICE_ID: str = None
+    MESSAGE_ID_PAYMENT: int = None
     CONFIG: ConfigBot
     i18n: TranslatorRunner
     TYPE_PAYMENT_BUTTON = ['default', 'webapp', 'default_tg']
@@ -49,9 +69,16 @@ class PaymentSystem:
     TINKOFF_SECRET: str = None
     YOOMONEY_TOKEN: str = None
     YOOMONEY_WALLET: str = None
+    # Перепроверять оплату через API после уведомления
+    WEBHOOK_VERIFY = False
+    # Настройка Config с ключом подписи уведомлений. Пока она пустая,
+    # подпись может подделать кто угодно, и уведомления не принимаются
+    WEBHOOK_KEY_SETTING: str | None = None
+    WEBHOOK_RESPONSE = 'OK'
 
     def __init__(self, **kwargs):
-        self.message: Message = kwargs['message']
+        self.message: Message | None = kwargs.get('message')
+        self.bot: Bot = kwargs.get('bot') or self.message.bot
         self.user_id = kwargs['user_id']
         self.price = kwargs['price']
         self.period = kwargs['period']
@@ -59,6 +86,8 @@ class PaymentSystem:
         self.CONFIG = kwargs['config']
         self.i18n = kwargs['i18n']
         self.SESSION = kwargs['session']
+        self.INVOICE_ID = kwargs.get('invoice_id')
+        self.MESSAGE_ID_PAYMENT = kwargs.get('message_id')
 
         self.CRYPTO_BOT_API = self.CONFIG.CRYPTO_BOT_API
         self.CRYPTOMUS_KEY_PAYMENT = self.CONFIG.CRYPTOMUS_KEY
@@ -76,6 +105,97 @@ class PaymentSystem:
     async def to_pay(self):
         raise NotImplementedError()
 
+    async def check_invoice(self) -> bool:
+        """
+        Проверить оплату счёта INVOICE_ID
+        :return: True если счёт оплачен
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    async def check_invoices(
+            cls,
+            payments: list['PaymentSystem']
+    ) -> list['PaymentSystem']:
+        """
+        Проверить пачку счетов одной платежной системы
+        :return: Список оплаченных счетов
+        """
+        semaphore = asyncio.Semaphore(cls.CHECK_CONCURRENCY)
+
+        async def check(payment: PaymentSystem) -> bool:
+            async with semaphore:
+                try:
+                    return await payment.check_invoice()
+                except Exception:
+                    log.exception(
+                        'error check invoice %s payment %s',
+                        payment.INVOICE_ID, cls.NAME
+                    )
+                    return False
+
+        results = await asyncio.gather(*(check(p) for p in payments))
+        return [p for p, paid in zip(payments, results) if paid]
+
+    @classmethod
+    def webhook_enabled(cls) -> bool:
+        """Принимает ли платежная система уведомления об оплате"""
+        if (cls.WEBHOOK_KEY_SETTING is not None
+                and not getattr(Config, cls.WEBHOOK_KEY_SETTING)):
+            return False
+        return (Config.PAYMENT_WEBHOOK_PORT != 0
+                and cls.parse_webhook.__func__
+                is not PaymentSystem.parse_webhook.__func__)
+
+    @classmethod
+    def webhook_url(cls) -> str | None:
+        """Адрес для уведомлений, передаётся при создании счёта"""
+        if not cls.webhook_enabled() or Config.PAYMENT_WEBHOOK_URL == '':
+            return None
+        return (f'{Config.PAYMENT_WEBHOOK_URL.rstrip("/")}'
+                f'/payments/{cls.__name__.lower()}')
+
+    @classmethod
+    async def parse_webhook(
+            cls,
+            request: web.Request
+    ) -> WebhookPayment | None:
+        """
+        Разобрать уведомление платежной системы
+        :param request: Входящий запрос
+        :return: Оплаченный счёт или None, если это не оплата
+        :raise WebhookError: Неверная подпись
+        """
+        raise NotImplementedError()
+
+    async def cancel_invoice(self):
+        """Вызывается, когда время ожидания оплаты истекло"""
+        return
+
+    async def watch(self, invoice_id):
+        """
+        Передать счёт в PaymentWatcher. Обработчик не ждёт оплаты
+        """
+        self.INVOICE_ID = str(invoice_id)
+        await add_pending_payment(
+            self.SESSION,
+            telegram_id=self.user_id,
+            payment_system=type(self).__name__,
+            invoice_id=self.INVOICE_ID,
+            price=self.price,
+            period=self.period,
+            type_payment=self.TYPE_PAYMENT,
+            message_id=self.MESSAGE_ID_PAYMENT
+        )
+        payment_watcher.wake()
+
+    async def confirm(self):
+        await self.successful_payment(
+            self.price,
+            self.RECORD_NAME or self.NAME,
+            id_payment=self.INVOICE_ID
+        )
+
     async def pay_button(
             self,
             link_pay='',
@@ -87,13 +207,16 @@ class PaymentSystem:
                 await self.message.delete()
             except Exception:
                 log.info('error delete message')
-        self.MESSAGE_ID_PAYMENT = await self.message.answer_photo(
-            FSInputFile('bot/img/payment.png'),
-            self.i18n.user.text.subscription.description.amount(
+        message = await media_registry.send_photo(
+            self.bot,
+            'bot/img/payment.png',
+            chat_id=self.message.chat.id,
+            caption=self.i18n.user.text.subscription.description.amount(
                 amount=self.price
             ),
             reply_markup=await self.pay_and_check(link_pay, type_payment)
         )
+        self.MESSAGE_ID_PAYMENT = message.message_id
 
     async def pay_and_check(
             self,
@@ -121,21 +244,21 @@ class PaymentSystem:
         return kb.as_markup()
 
 
-    async def delete_pay_button(self, name_payment):
+    async def delete_pay_button(self):
         if self.MESSAGE_ID_PAYMENT is not None:
             try:
-                await self.message.bot.delete_message(
+                await self.bot.delete_message(
                     self.user_id,
-                    self.MESSAGE_ID_PAYMENT.message_id
+                    self.MESSAGE_ID_PAYMENT
                 )
                 log.info(
                     f'user ID: {self.user_id}'
                     f' delete payment {self.price} RUB '
-                    f'Payment - {name_payment}'
+                    f'Payment - {self.NAME}'
                 )
             except Exception as e:
                 log.error(
-                    f'error delete pay button {e} payment {name_payment}'
+                    f'error delete pay button {e} payment {self.NAME}'
                 )
             finally:
                 self.MESSAGE_ID_PAYMENT = None
@@ -147,17 +270,22 @@ class PaymentSystem:
             f'user ID: {self.user_id}'
             f' success payment {total_amount} RUB Payment - {name_payment}'
         )
-        await add_payment(
-            session=self.SESSION,
+        finalized = await finalize_payment(
+            self.SESSION,
             telegram_id=self.user_id,
             deposit=total_amount,
             payment_system=name_payment,
             id_payment=id_payment,
             period=self.period
         )
-        await user_subscribe(self.SESSION, self.user_id, self.period)
-        await self.message.answer_photo(
-            photo=FSInputFile('bot/img/sub.png'),
+        if finalized.subscription is None:
+            # Повторное подтверждение или пользователя нет в базе
+            return
+        expiry_scheduler.reschedule()
+        await media_registry.send_photo(
+            self.bot,
+            'bot/img/sub.png',
+            chat_id=self.user_id,
             caption=self.i18n.user.text.subscription.link(
                 link=Config.LINK_CHANNEL
             ),
@@ -0,0 +1,200 @@
+import asyncio
+import datetime as dt
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.types import Message
+from fluentogram import TranslatorHub
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from bot.database.crud.create import add_broadcast
+from bot.database.crud.get import (
+    count_broadcast_recipients,
+    get_active_broadcasts,
+    get_broadcast_recipients
+)
+from bot.database.crud.update import update_broadcast_progress
+from bot.database.models.main import Broadcast
+from bot.misc import Config
+from bot.service.sender import sender
+
+log = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """
+    Рассылки администратора в фоне. Получатели читаются из базы пачками,
+    после каждой пачки прогресс сохраняется в Broadcast, поэтому после
+    перезапуска бота рассылка продолжается с места остановки
+    (повторно может уйти не больше одной пачки). Сообщения идут через
+    общий sender фоновыми запросами и не вытесняют уведомления.
+    """
+    CHUNK = 200
+    PROGRESS_INTERVAL = 5
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.translator_hub: TranslatorHub | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def setup(
+            self,
+            bot: Bot,
+            translator_hub: TranslatorHub,
+            session_pool: async_sessionmaker
+    ):
+        self.bot = bot
+        self.translator_hub = translator_hub
+        self.session_pool = session_pool
+
+    async def resume(self):
+        """Продолжить незавершенные рассылки после перезапуска"""
+        async with self.session_pool() as session:
+            for broadcast in await get_active_broadcasts(session):
+                log.info(
+                    'Resume broadcast %s from user id %s',
+                    broadcast.id, broadcast.last_user_id
+                )
+                self.launch(broadcast)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def create(
+            self,
+            session: AsyncSession,
+            message: Message,
+            target: str,
+            progress_message: Message
+    ) -> Broadcast:
+        """
+        Создать рассылку и запустить её, не дожидаясь окончания
+        :param message: Сообщение администратора, которое будет скопировано
+        :param target: Группа получателей
+        :param progress_message: Сообщение для вывода прогресса
+        """
+        broadcast = await add_broadcast(
+            session,
+            admin_id=message.from_user.id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            target=target,
+            total=await count_broadcast_recipients(session, target),
+            progress_message_id=progress_message.message_id
+        )
+        self.launch(broadcast)
+        return broadcast
+
+    def launch(self, broadcast: Broadcast):
+        task = asyncio.create_task(self.run(broadcast))
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast.id, None))
+
+    async def send(self, broadcast: Broadcast, telegram_id: int) -> bool:
+        try:
+            await sender.call(
+                lambda: self.bot.copy_message(
+                    chat_id=telegram_id,
+                    from_chat_id=broadcast.from_chat_id,
+                    message_id=broadcast.message_id
+                ),
+                telegram_id,
+                background=True
+            )
+            return True
+        except Exception:
+            log.info('user %s blocked bot', telegram_id)
+            return False
+
+    async def edit_progress(self, broadcast: Broadcast, text: str):
+        if broadcast.progress_message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=broadcast.admin_id,
+                message_id=broadcast.progress_message_id
+            )
+        except Exception as e:
+            log.info('error edit broadcast progress %s: %s', broadcast.id, e)
+
+    async def run(self, broadcast: Broadcast):
+        i18n = self.translator_hub.get_translator_by_locale(
+            locale=Config.DEFAULT_LANGUAGE
+        )
+        sent, failed = broadcast.sent, broadcast.failed
+        done_before = sent + failed
+        started = time.monotonic()
+
+        async def report():
+            while True:
+                await asyncio.sleep(self.PROGRESS_INTERVAL)
+                done = sent + failed
+                total = max(broadcast.total, done, 1)
+                speed = (done - done_before) / (time.monotonic() - started)
+                if speed > 0:
+                    eta = dt.timedelta(seconds=int((total - done) / speed))
+                else:
+                    eta = '—'
+                await self.edit_progress(
+                    broadcast,
+                    i18n.admin.text.admin_menu.milling.progress(
+                        done=done,
+                        total=total,
+                        percent=int(done / total * 100),
+                        speed=round(speed, 1),
+                        eta=str(eta)
+                    )
+                )
+
+        async def send(row) -> bool:
+            nonlocal sent, failed
+            if await self.send(broadcast, row.telegram_id):
+                sent += 1
+                return True
+            failed += 1
+            return False
+
+        reporter = asyncio.create_task(report())
+        try:
+            async with self.session_pool() as session:
+                last_user_id = broadcast.last_user_id
+                while True:
+                    rows = await get_broadcast_recipients(
+                        session, broadcast.target, last_user_id, self.CHUNK
+                    )
+                    if not rows:
+                        break
+                    await sender.map(send, rows)
+                    last_user_id = rows[-1].id
+                    await update_broadcast_progress(
+                        session, broadcast.id, last_user_id, sent, failed
+                    )
+                await update_broadcast_progress(
+                    session, broadcast.id, last_user_id, sent, failed,
+                    status='done'
+                )
+        except Exception:
+            log.exception('Broadcast %s error', broadcast.id)
+            return
+        finally:
+            reporter.cancel()
+        log.info(
+            'Broadcast %s finished: sent %s, failed %s',
+            broadcast.id, sent, failed
+        )
+        await self.edit_progress(
+            broadcast,
+            i18n.admin.text.admin_menu.milling.result(
+                all_count=sent + failed,
+                suc_count=sent,
+                not_suc_count=failed
+            )
+        )
+
+
+broadcast_engine = BroadcastEngine()
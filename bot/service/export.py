@@ -0,0 +1,188 @@
+import csv
+import gzip
+import io
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, Callable
+
+from aiogram import Bot
+from aiogram.types import Message, InputFile
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+
+from bot.database.crud.get import stream_payments, stream_users
+from bot.database.models.main import current_time
+
+log = logging.getLogger(__name__)
+
+DATE_FORMAT = '%d.%m.%Y %H:%M'
+
+# Периоды выгрузки, начало считается от текущего момента
+PERIODS = ('all', 'day', 'week', 'month')
+
+PAYMENTS_HEADER = (
+    'telegram_id', 'username', 'payment_system', 'amount', 'period',
+    'id_payment', 'date'
+)
+USERS_HEADER = (
+    'telegram_id', 'fullname', 'username', 'lang', 'date_registered',
+    'status_subscription', 'subscription'
+)
+
+
+def period_start(period: str) -> datetime | None:
+    today = current_time().replace(hour=0, minute=0, second=0, microsecond=0)
+    match period:
+        case 'day':
+            return today
+        case 'week':
+            return today - timedelta(days=6)
+        case 'month':
+            return today.replace(day=1)
+    return None
+
+
+def format_date(value: datetime | None) -> str:
+    if value is None:
+        return ''
+    return value.strftime(DATE_FORMAT)
+
+
+class CsvExport:
+    """
+    CSV во временном файле: первый мегабайт в памяти, дальше на диске.
+    Память не растет с размером выгрузки
+    """
+    MAX_MEMORY = 1024 * 1024
+
+    def __init__(self, header, compress: bool = False):
+        self.compress = compress
+        self.rows = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=self.MAX_MEMORY)
+        self._gzip = None
+        raw = self.file
+        if compress:
+            self._gzip = gzip.GzipFile(fileobj=self.file, mode='wb')
+            raw = self._gzip
+        # utf-8-sig, чтобы Excel правильно открывал кириллицу
+        self._text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(header)
+
+    @property
+    def extension(self) -> str:
+        return 'csv.gz' if self.compress else 'csv'
+
+    async def write(self, result: AsyncResult, row: Callable):
+        """
+        Записать строки результата, читая их пачками
+        :param row: Преобразует строку результата в строку CSV
+        """
+        async for rows in result.partitions():
+            self._writer.writerows(map(row, rows))
+            self.rows += len(rows)
+
+    def finish(self):
+        self._text.flush()
+        self._text.detach()
+        if self._gzip is not None:
+            self._gzip.close()
+        self.file.seek(0)
+
+    def close(self):
+        self.file.close()
+
+
+class ExportInputFile(InputFile):
+    """
+    Отправка выгрузки в Telegram без чтения файла целиком
+    """
+
+    def __init__(self, export: CsvExport, filename: str):
+        super().__init__(filename=filename)
+        self.export = export
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.export.file.seek(0)
+        while chunk := self.export.file.read(self.chunk_size):
+            yield chunk
+
+
+async def export_payments(
+        session: AsyncSession,
+        period: str = 'all',
+        payment_system: str = None,
+        telegram_id: int = None,
+        compress: bool = False
+) -> CsvExport:
+    export = CsvExport(PAYMENTS_HEADER, compress)
+    try:
+        result = await stream_payments(
+            session,
+            start=period_start(period),
+            payment_system=payment_system,
+            telegram_id=telegram_id
+        )
+        await export.write(result, lambda payment: (
+            payment.user,
+            payment.username,
+            payment.payment_system,
+            payment.amount,
+            payment.period,
+            payment.id_payment,
+            format_date(payment.date_registered)
+        ))
+        export.finish()
+    except Exception:
+        export.close()
+        raise
+    return export
+
+
+async def export_users(
+        session: AsyncSession,
+        period: str = 'all',
+        status_subscription: bool = None,
+        compress: bool = False
+) -> CsvExport:
+    export = CsvExport(USERS_HEADER, compress)
+    try:
+        result = await stream_users(
+            session,
+            start=period_start(period),
+            status_subscription=status_subscription
+        )
+        await export.write(result, lambda user: (
+            user.telegram_id,
+            user.fullname,
+            user.username,
+            user.lang_tg or '',
+            format_date(user.date_registered),
+            int(bool(user.status_subscription)),
+            format_date(user.subscription) if user.status_subscription else ''
+        ))
+        export.finish()
+    except Exception:
+        export.close()
+        raise
+    return export
+
+
+async def send_export(
+        message: Message,
+        export: CsvExport,
+        name_document: str,
+        caption: str
+) -> bool:
+    filename = f'{name_document}.{export.extension}'
+    try:
+        await message.answer_document(
+            ExportInputFile(export, filename),
+            caption=caption
+        )
+        return True
+    except Exception:
+        log.exception('error send file %s', filename)
+        return False
+    finally:
+        export.close()
@@ -1,17 +1,28 @@
+import asyncio
+import heapq
 import logging
 import datetime as dt
 from datetime import datetime
 from typing import TYPE_CHECKING
 
 from aiogram import Bot
-from aiogram.types import FSInputFile
 from fluentogram import TranslatorHub, TranslatorRunner
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
-from bot.database.crud.get import get_users_status
-from bot.database.crud.update import user_swith_one_day, user_swith_sub
+from bot.database.crud.get import (
+    get_users_expiring,
+    get_next_expiry,
+    get_subscribers_by_ids
+)
+from bot.database.crud.update import (
+    user_swith_sub,
+    users_swith_one_day,
+    users_swith_sub
+)
 from bot.database.models.main import User
 from bot.keyboards.user_inline import pay_subscribe
+from bot.service.media import media_registry
+from bot.service.sender import sender
 from bot.misc import Config
 from bot.misc.config import timezone_offset
 
@@ -20,84 +31,274 @@ if TYPE_CHECKING:
 
 log = logging.getLogger(__name__)
 
-COUNT_SECOND_DAY = 86400
 
+class ExpiryScheduler:
+    """
+    Проверка окончания подписок без полного перебора пользователей.
+    Из базы по индексу (status_subscription, subscription) загружаются
+    события ближайшего окна в min-heap, сервис спит до первого из них.
+    """
+    WINDOW = 10 * 60
+    MAX_SLEEP = 60 * 60
+    RETRY = 15
+    # Пользователей на один запрос: SQLite ограничивает число
+    # параметров в IN
+    CHUNK = 500
+    # Подписки меняют и другие процессы, reschedule() до этого процесса
+    # не доходит: окно перечитывается при каждой проверке
+    SHARED_POLL = 30
 
-async def loop(
-        bot: Bot,
-        translator_hub: TranslatorHub,
-        session_pool: async_sessionmaker
-):
-    try:
-        async with session_pool() as session:
-            for user in await get_users_status(session):
-                await check_user(user, translator_hub, session, bot)
-    except Exception as e:
-        log.error(e)
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.translator_hub: TranslatorHub | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self._heap: list[tuple[datetime, int]] = []
+        self._loaded_until: datetime | None = None
+        self.shared = False
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
 
-async def check_user(
-        user: User,
-        translator_hub: TranslatorHub,
-        session: AsyncSession,
-        bot: Bot
-):
+    def setup(
+            self,
+            bot: Bot,
+            translator_hub: TranslatorHub,
+            session_pool: async_sessionmaker,
+            shared: bool = False
+    ):
+        """
+        :param shared: Бот запущен в нескольких процессах
+        """
+        self.bot = bot
+        self.translator_hub = translator_hub
+        self.session_pool = session_pool
+        self.shared = shared
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reschedule(self):
+        """Вызывается после изменения даты подписки пользователя"""
+        self._loaded_until = None
+        self._wakeup.set()
+
+    @staticmethod
+    def now() -> datetime:
+        # Даты подписки хранятся без часового пояса в UTC_TIME
+        return datetime.now(timezone_offset).replace(tzinfo=None)
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = await self.tick()
+            except Exception:
+                log.exception('Expiry scheduler error')
+                self._loaded_until = None
+                timeout = self.RETRY
+            if self.shared:
+                self._loaded_until = None
+                timeout = min(timeout, self.SHARED_POLL)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def load(self, session: AsyncSession, now: datetime):
+        alert = dt.timedelta(days=Config.DAY_SHOW_ALERT)
+        until = now + dt.timedelta(seconds=self.WINDOW)
+        self._heap = []
+        for telegram_id, subscription, notion_oneday in (
+                await get_users_expiring(session, until, alert)
+        ):
+            if notion_oneday:
+                self._heap.append((subscription - alert, telegram_id))
+            if subscription <= until:
+                self._heap.append((subscription, telegram_id))
+        heapq.heapify(self._heap)
+        self._loaded_until = until
+
+    async def tick(self) -> float:
+        """
+        Обрабатывает наступившие события.
+        :return: Через сколько секунд проснуться
+        """
+        now = self.now()
+        async with self.session_pool() as session:
+            if self._loaded_until is None or now >= self._loaded_until:
+                await self.load(session, now)
+            due = set()
+            while self._heap and self._heap[0][0] <= now:
+                due.add(heapq.heappop(self._heap)[1])
+            if due:
+                due = list(due)
+                done = True
+                for start in range(0, len(due), self.CHUNK):
+                    done &= await check_users(
+                        await get_subscribers_by_ids(
+                            session, due[start:start + self.CHUNK]
+                        ),
+                        self.translator_hub,
+                        session,
+                        self.bot
+                    )
+                # Предупреждение и окончание подписки обрабатываются
+                # по очереди, поэтому окно загружается заново
+                await self.load(session, self.now())
+                if not done:
+                    return self.RETRY
+            if self._heap:
+                wakeup = self._heap[0][0]
+            else:
+                wakeup = await get_next_expiry(
+                    session,
+                    self._loaded_until,
+                    dt.timedelta(days=Config.DAY_SHOW_ALERT)
+                )
+        if wakeup is None:
+            return self.MAX_SLEEP
+        seconds = (wakeup - self.now()).total_seconds()
+        return min(max(seconds, 0), self.MAX_SLEEP)
+
+
+def get_i18n(user: User, translator_hub: TranslatorHub) -> TranslatorRunner:
     if user.lang_tg is not None:
         language_code = user.lang_tg
     else:
         language_code = Config.DEFAULT_LANGUAGE
-    i18n: TranslatorRunner = translator_hub.get_translator_by_locale(
-        locale=language_code
-    )
-    user_time = user.subscription.replace(tzinfo=timezone_offset)
-    if user.notion_oneday:
-        if user_time < datetime.now(timezone_offset) + dt.timedelta(
+    return translator_hub.get_translator_by_locale(locale=language_code)
+
+
+async def check_users(
+        users: list[User],
+        translator_hub: TranslatorHub,
+        session: AsyncSession,
+        bot: Bot
+) -> bool:
+    """
+    Рассылает предупреждения и завершает подписки пачкой.
+    Сначала отправляется предупреждение, окончание подписки
+    обрабатывается при следующей проверке.
+    :return: False если часть подписок завершить не удалось
+    """
+    now = datetime.now(timezone_offset)
+    alert = []
+    ended = []
+    for user in users:
+        user_time = user.subscription.replace(tzinfo=timezone_offset)
+        if user.notion_oneday and user_time < now + dt.timedelta(
                 days=Config.DAY_SHOW_ALERT
         ):
-            if not user.blocked:
-                try:
-                    await bot.send_photo(
-                        photo=FSInputFile('bot/img/warning.png'),
-                        chat_id=user.telegram_id,
-                        caption=i18n.user.text.subscription.one_day(
-                            day=Config.DAY_SHOW_ALERT
-                        ),
-                        reply_markup=await pay_subscribe(i18n)
-                    )
-                except Exception:
-                    log.info(f'User {user.telegram_id} banned bot')
-            await user_swith_one_day(session, user.telegram_id, False)
+            alert.append(user)
+        elif user_time <= now:
+            ended.append(user)
+
+    async def send_alert(user: User):
+        if user.blocked:
             return
-    if user_time > datetime.now(timezone_offset):
-        return
-    await end_subscription(user, i18n, session, bot)
-    logging.info(f'user {user.telegram_id} banned channel')
+        i18n = get_i18n(user, translator_hub)
+        markup = await pay_subscribe(i18n)
+        try:
+            await sender.call(
+                lambda: media_registry.send_photo(
+                    bot,
+                    'bot/img/warning.png',
+                    chat_id=user.telegram_id,
+                    caption=i18n.user.text.subscription.one_day(
+                        day=Config.DAY_SHOW_ALERT
+                    ),
+                    reply_markup=markup
+                ),
+                user.telegram_id
+            )
+        except Exception:
+            log.info('User %s banned bot', user.telegram_id)
 
+    async def kick(user: User):
+        await notify_end_subscription(
+            user, get_i18n(user, translator_hub), bot
+        )
 
-async def end_subscription(
+    await sender.map(send_alert, alert)
+    results = await sender.map(kick, ended)
+    kicked = []
+    for user, result in zip(ended, results):
+        if isinstance(result, Exception):
+            log.error(
+                'Error end subscription %s', user.telegram_id,
+                exc_info=result
+            )
+        else:
+            kicked.append(user.telegram_id)
+            log.info('user %s banned channel', user.telegram_id)
+    if alert:
+        await users_swith_one_day(
+            session, [user.telegram_id for user in alert], False
+        )
+    if kicked:
+        await users_swith_sub(session, kicked, False)
+    return len(kicked) == len(ended)
+
+
+async def notify_end_subscription(
     user: User,
     i18n: TranslatorRunner,
-    session: AsyncSession,
     bot: Bot
 ):
     if not user.blocked:
+        markup = await pay_subscribe(i18n)
         try:
-            await bot.send_photo(
-                photo=FSInputFile('bot/img/end_sub.png'),
-                chat_id=user.telegram_id,
-                caption=i18n.user.text.subscription.end(),
-                reply_markup=await pay_subscribe(i18n)
+            await sender.call(
+                lambda: media_registry.send_photo(
+                    bot,
+                    'bot/img/end_sub.png',
+                    chat_id=user.telegram_id,
+                    caption=i18n.user.text.subscription.end(),
+                    reply_markup=markup
+                ),
+                user.telegram_id
             )
         except Exception:
-            log.info(f'User {user.telegram_id} banned bot')
+            log.info('User %s banned bot', user.telegram_id)
     try:
-        await bot.ban_chat_member(
-            chat_id=Config.ID_CHANNEL,
-            user_id=user.telegram_id,
+        await sender.call(
+            lambda: bot.ban_chat_member(
+                chat_id=Config.ID_CHANNEL,
+                user_id=user.telegram_id,
+            )
         )
     except Exception as e:
         log.critical(e)
-    await bot.unban_chat_member(
-        chat_id=Config.ID_CHANNEL,
-        user_id=user.telegram_id,
-    )
+    # Ошибка разбана не повторяет окончание подписки: иначе пользователь
+    # получал бы сообщение об окончании при каждой попытке
+    try:
+        await sender.call(
+            lambda: bot.unban_chat_member(
+                chat_id=Config.ID_CHANNEL,
+                user_id=user.telegram_id,
+            )
+        )
+    except Exception:
+        log.exception('Error unban user %s in channel', user.telegram_id)
+
+
+async def end_subscription(
+    user: User,
+    i18n: TranslatorRunner,
+    session: AsyncSession,
+    bot: Bot
+):
+    await notify_end_subscription(user, i18n, bot)
     await user_swith_sub(session, user.telegram_id, False)
+
+
+expiry_scheduler = ExpiryScheduler()
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import defaultdict
+
+from aiogram import Bot
+from aiogram.enums import ContentType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from aiogram_dialog.api.entities import MediaId
+from aiogram_dialog.api.protocols import MediaIdStorageProtocol
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.database.crud.get import get_all_media
+from bot.database.crud.update import update_media
+from bot.database.sqlite_engine import write_queue
+
+log = logging.getLogger(__name__)
+
+
+class MediaRegistry(MediaIdStorageProtocol):
+    """
+    Кэш file_id для картинок из bot/img. Файл загружается в Telegram один
+    раз, file_id хранится в таблице Media и используется, пока не изменится
+    содержимое файла. Также служит хранилищем media id для aiogram_dialog.
+    """
+
+    def __init__(self):
+        self.session_pool: async_sessionmaker | None = None
+        # (path, type) -> (hash, MediaId)
+        self._media: dict[tuple[str, str], tuple[str, MediaId]] = {}
+        # path -> ((mtime, size), hash)
+        self._hashes: dict[str, tuple[tuple[int, int], str]] = {}
+        self._locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def setup(self, session_pool: async_sessionmaker):
+        self.session_pool = session_pool
+        async with session_pool() as session:
+            for media in await get_all_media(session):
+                self._media[(media.path, media.media_type)] = (
+                    media.file_hash,
+                    MediaId(media.file_id, media.file_unique_id)
+                )
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        self._hashes[path] = (key, digest)
+        return digest
+
+    def get(self, path: str, media_type: str) -> MediaId | None:
+        cached = self._media.get((path, media_type))
+        if cached is None:
+            return None
+        try:
+            if cached[0] != self.file_hash(path):
+                return None
+        except OSError:
+            return None
+        return cached[1]
+
+    async def save(self, path: str, media_type: str, media_id: MediaId):
+        file_hash = self.file_hash(path)
+        self._media[(path, media_type)] = (file_hash, media_id)
+        if self.session_pool is None:
+            return
+        # Запись через писателя: обработчик уже держит соединение из пула
+        try:
+            await write_queue.submit(
+                update_media,
+                path,
+                media_type,
+                file_hash,
+                media_id.file_id,
+                media_id.file_unique_id
+            )
+        except Exception:
+            log.exception('error save media %s', path)
+
+    def forget(self, path: str, media_type: str):
+        self._media.pop((path, media_type), None)
+
+    async def get_media_id(
+            self,
+            path: str | None,
+            url: str | None,
+            type: ContentType
+    ) -> MediaId | None:
+        if not path:
+            return None
+        return self.get(path, type)
+
+    async def save_media_id(
+            self,
+            path: str | None,
+            url: str | None,
+            type: ContentType,
+            media_id: MediaId
+    ) -> None:
+        if not path:
+            return
+        await self.save(path, type, media_id)
+
+    async def send_photo(self, bot: Bot, path: str, **kwargs) -> Message:
+        """
+        bot.send_photo с картинкой из файла path
+        """
+        media_id = self.get(path, ContentType.PHOTO)
+        if media_id is not None:
+            try:
+                return await bot.send_photo(photo=media_id.file_id, **kwargs)
+            except TelegramBadRequest as e:
+                if 'file' not in e.message.lower():
+                    raise
+                log.info('file_id for %s is invalid, upload again', path)
+                self.forget(path, ContentType.PHOTO)
+        # Пока файл загружается, остальные отправки ждут его file_id
+        async with self._locks[path]:
+            media_id = self.get(path, ContentType.PHOTO)
+            if media_id is not None:
+                return await bot.send_photo(photo=media_id.file_id, **kwargs)
+            message = await bot.send_photo(photo=FSInputFile(path), **kwargs)
+            photo = message.photo[-1]
+            await self.save(
+                path,
+                ContentType.PHOTO,
+                MediaId(photo.file_id, photo.file_unique_id)
+            )
+            return message
+
+
+media_registry = MediaRegistry()
@@ -0,0 +1,263 @@
+"""
+Метрики бота в текстовом формате Prometheus.
+Пока METRICS_PORT равен 0, ничего не подключается: ни middleware,
+ни события SQLAlchemy, ни обёртки платежных систем.
+"""
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+log = logging.getLogger(__name__)
+
+# Секунды
+BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+# Число запросов к базе за одно обновление
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+# Методы платежных систем, которые ходят в API провайдера
+PROVIDER_CALLS = (
+    'to_pay', 'check_invoice', 'check_invoices', 'cancel_invoice',
+    'parse_webhook', 'auto_payment', 'find_payment'
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value: str) -> str:
+    return (str(value).replace('\\', '\\\\')
+            .replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def format_number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in self.values.items():
+            yield (f'{self.name}{format_labels(self.labels, labels)} '
+                   f'{format_number(value)}')
+
+
+class Histogram:
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple = (),
+            buckets: tuple = BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам..., сумма, количество]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * len(self.buckets) + [0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in self.values.items():
+            total = 0
+            for bucket, count in zip(self.buckets, series):
+                total += count
+                le = format_labels(
+                    self.labels, labels, f'le="{format_number(bucket)}"'
+                )
+                yield f'{self.name}_bucket{le} {total}'
+            le = format_labels(self.labels, labels, 'le="+Inf"')
+            yield f'{self.name}_bucket{le} {series[-1]}'
+            names = format_labels(self.labels, labels)
+            yield f'{self.name}_sum{names} {format_number(series[-2])}'
+            yield f'{self.name}_count{names} {series[-1]}'
+
+
+@dataclass
+class UpdateStats:
+    """Запросы к базе в рамках одного обновления"""
+    queries: int = 0
+    db_seconds: float = 0.0
+
+
+update_stats: ContextVar[UpdateStats | None] = ContextVar(
+    'update_stats', default=None
+)
+
+
+class Metrics:
+    def __init__(self):
+        self.update_seconds = Histogram(
+            'bot_update_seconds',
+            'Update processing time',
+            ('event',)
+        )
+        self.handler_seconds = Histogram(
+            'bot_handler_seconds',
+            'Handler time',
+            ('handler',)
+        )
+        self.state_seconds = Histogram(
+            'bot_state_seconds',
+            'Handler time by FSM or dialog state',
+            ('state',)
+        )
+        self.update_queries = Histogram(
+            'bot_update_db_queries',
+            'Database queries per update',
+            buckets=COUNT_BUCKETS
+        )
+        self.update_db_seconds = Histogram(
+            'bot_update_db_seconds',
+            'Database time per update'
+        )
+        self.db_query_seconds = Histogram(
+            'bot_db_query_seconds',
+            'Database query time, including background services'
+        )
+        self.telegram_seconds = Histogram(
+            'bot_telegram_request_seconds',
+            'Telegram Bot API request time',
+            ('method',)
+        )
+        self.telegram_errors = Counter(
+            'bot_telegram_errors_total',
+            'Failed Telegram Bot API requests',
+            ('method',)
+        )
+        self.provider_seconds = Histogram(
+            'bot_payment_provider_seconds',
+            'Payment provider call time',
+            ('provider', 'call')
+        )
+        self.provider_errors = Counter(
+            'bot_payment_provider_errors_total',
+            'Failed payment provider calls',
+            ('provider', 'call')
+        )
+
+    def render(self) -> str:
+        lines = []
+        for metric in vars(self).values():
+            if isinstance(metric, (Counter, Histogram)):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def instrument_engine(self, engine: AsyncEngine):
+        """
+        Время и число запросов через события SQLAlchemy. Запросы
+        считаются в обновление, если выполняются в его контексте
+        """
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, 'before_cursor_execute')
+        def before_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+            conn.info.setdefault('query_start', []).append(
+                time.perf_counter()
+            )
+
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def after_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+            elapsed = time.perf_counter() - conn.info['query_start'].pop()
+            self.db_query_seconds.observe(elapsed)
+            stats = update_stats.get()
+            if stats is not None:
+                stats.queries += 1
+                stats.db_seconds += elapsed
+
+        @event.listens_for(sync_engine, 'handle_error')
+        def on_error(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get('query_start'):
+                conn.info['query_start'].pop()
+
+    def instrument_payments(self, payments: dict):
+        """
+        Обернуть вызовы API платежных систем
+        :param payments: Имя класса -> класс платежной системы
+        """
+        for name, cls in payments.items():
+            for call in PROVIDER_CALLS:
+                method = cls.__dict__.get(call)
+                if isinstance(method, (classmethod, staticmethod)):
+                    # Оборачивается функция, дескриптор остаётся прежним
+                    setattr(cls, call, type(method)(
+                        self.timed(method.__func__, name, call)
+                    ))
+                elif method is not None:
+                    setattr(cls, call, self.timed(method, name, call))
+
+    def timed(self, method, provider: str, call: str):
+        @wraps(method)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                self.provider_errors.inc(provider, call)
+                raise
+            finally:
+                self.provider_seconds.observe(
+                    time.perf_counter() - start, provider, call
+                )
+        return wrapper
+
+
+metrics = Metrics()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=metrics.render().encode(),
+        headers={'Content-Type': CONTENT_TYPE}
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    log.info('Metrics listen on %s:%s/metrics', host, port)
+    return runner
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from aiogram import html
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.crud.create import add_outbox_message
+from bot.database.crud.get import get_users_moderation_requested
+from bot.database.crud.update import user_request_moderation, \
+    users_clear_moderation_requested
+from bot.database.models.main import current_time
+from bot.misc import Config
+from bot.service.outbox import outbox
+
+log = logging.getLogger(__name__)
+
+
+def plain_username(username: str | None) -> str | None:
+    """
+    Username без @: в базе он хранится с @, из Telegram приходит без него
+    :return: None, если username нет
+    """
+    if not username:
+        return None
+    username = username.removeprefix('@')
+    # upsert_user сохраняет отсутствующий username как @None
+    if username == 'None':
+        return None
+    return username or None
+
+
+def user_card(
+        telegram_id: int,
+        fullname: str | None,
+        username: str | None,
+        lang_tg: str | None,
+        date: datetime
+) -> str:
+    """
+    Текст заявки одного пользователя для администратора
+    """
+    user_info = [
+        f"🔔 <b>Новый пользователь ожидает модерации!</b>",
+        f"🔑 <b>ID:</b> <code>{telegram_id}</code>"
+    ]
+    if fullname:
+        user_info.append(f"👤 <b>Имя:</b> {html.quote(fullname)}")
+    username = plain_username(username)
+    if username:
+        username = html.quote(username)
+        user_info.append(f"📲 <b>Username:</b> @{username}")
+        user_info.append(
+            f"🔗 <b>Ссылка:</b> "
+            f"<a href='https://t.me/{username}'>@{username}</a>"
+        )
+    if lang_tg:
+        user_info.append(f"🌐 <b>Язык:</b> {lang_tg}")
+    user_info.append(
+        f"📅 <b>Время регистрации:</b> {date.strftime('%Y-%m-%d %H:%M:%S')}"
+    )
+    return "\n".join(user_info)
+
+
+def vote_keyboard(telegram_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text="✅ Одобрить пользователя",
+                callback_data=f"moderationvote_{telegram_id}_true"
+            ),
+        ],
+        [
+            InlineKeyboardButton(
+                text="❌ Отклонить пользователя",
+                callback_data=f"moderationvote_{telegram_id}_false"
+            )
+        ]
+    ])
+
+
+def digest_text(users) -> str:
+    lines = [f"🔔 <b>Новых заявок на модерацию: {len(users)}</b>", ""]
+    for number, user in enumerate(users, 1):
+        name = html.quote(user.fullname or '')
+        username = plain_username(user.username)
+        if username:
+            name += f" @{html.quote(username)}"
+        lines.append(f"{number}. <code>{user.telegram_id}</code> {name}")
+    return "\n".join(lines)
+
+
+def digest_keyboard(users) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=f"✅ {number}",
+                callback_data=f"moderationvote_{user.telegram_id}_true"
+            ),
+            InlineKeyboardButton(
+                text=f"❌ {number}",
+                callback_data=f"moderationvote_{user.telegram_id}_false"
+            )
+        ]
+        for number, user in enumerate(users, 1)
+    ])
+
+
+def without_user_buttons(
+        markup: InlineKeyboardMarkup | None,
+        telegram_id: int
+) -> InlineKeyboardMarkup | None:
+    """
+    Клавиатура без кнопок голосования за пользователя
+    :return: None, если других заявок в сообщении нет
+    """
+    if markup is None:
+        return None
+    prefix = f"moderationvote_{telegram_id}_"
+    rows = [
+        row for row in markup.inline_keyboard
+        if not any(
+            (button.callback_data or '').startswith(prefix) for button in row
+        )
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
+
+
+class ModerationNotifier:
+    """
+    Уведомления администраторов о заявках на модерацию.
+    Сообщения ставятся в outbox, он рассылает их всем администраторам
+    параллельно и не задерживает ответ пользователю. Со сводкой заявки
+    копятся в базе и раз в interval уходят одним сообщением
+    на администратора.
+    """
+    # Две кнопки на заявку, в сообщении не больше 100 кнопок
+    DIGEST_SIZE = 30
+    # Заявок за один проход сводки
+    BATCH_SIZE = 300
+
+    def __init__(self):
+        self.session_pool: async_sessionmaker | None = None
+        self.interval = 0
+        self._task: asyncio.Task | None = None
+
+    def setup(self, session_pool: async_sessionmaker, interval: int = 0):
+        """
+        :param interval: Период сводки в секундах, 0 - без сводки
+        """
+        self.session_pool = session_pool
+        self.interval = interval
+
+    def start(self):
+        if not self.interval:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def request(
+            self,
+            session: AsyncSession,
+            telegram_id: int,
+            username: str = None,
+            fullname: str = None,
+            lang_tg: str = None
+    ):
+        """
+        Сообщить администраторам о заявке пользователя.
+        Вызывать после ответа пользователю
+        """
+        if self.interval:
+            await user_request_moderation(session, telegram_id)
+            return
+        text = user_card(
+            telegram_id, fullname, username, lang_tg, current_time()
+        )
+        for admin_id in Config.ADMINS_ID:
+            await add_outbox_message(
+                session,
+                admin_id,
+                text,
+                kind='moderation_request',
+                parse_mode='HTML',
+                reply_markup=vote_keyboard(telegram_id)
+            )
+        await session.commit()
+        outbox.wake()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                while await self.send_digest() == self.BATCH_SIZE:
+                    pass
+            except Exception:
+                log.exception('Moderation digest error')
+
+    async def send_digest(self) -> int:
+        """
+        Отправить накопленные заявки. Одна заявка уходит обычным
+        сообщением, несколько - сводкой
+        :return: Сколько заявок обработано
+        """
+        async with self.session_pool() as session:
+            requested = await get_users_moderation_requested(
+                session, self.BATCH_SIZE
+            )
+            # Пока заявка ждала сводки, пользователя могли уже одобрить
+            users = [
+                user for user in requested
+                if user.moderation_status is not True
+            ]
+            if len(users) == 1:
+                user = users[0]
+                messages = [(
+                    user_card(
+                        user.telegram_id,
+                        user.fullname,
+                        user.username,
+                        user.lang_tg,
+                        user.moderation_requested
+                    ),
+                    vote_keyboard(user.telegram_id)
+                )]
+            else:
+                chunks = [
+                    users[start:start + self.DIGEST_SIZE]
+                    for start in range(0, len(users), self.DIGEST_SIZE)
+                ]
+                messages = [
+                    (digest_text(chunk), digest_keyboard(chunk))
+                    for chunk in chunks
+                ]
+            for admin_id in Config.ADMINS_ID:
+                for text, keyboard in messages:
+                    await add_outbox_message(
+                        session,
+                        admin_id,
+                        text,
+                        kind='moderation_digest',
+                        parse_mode='HTML',
+                        reply_markup=keyboard
+                    )
+            if requested:
+                await users_clear_moderation_requested(
+                    session, [user.telegram_id for user in requested]
+                )
+            await session.commit()
+        if messages:
+            outbox.wake()
+            log.info('Sent moderation digest with %s requests', len(users))
+        return len(requested)
+
+
+moderation_notifier = ModerationNotifier()
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.database.crud.create import add_outbox_message
+from bot.database.crud.delete import delete_outbox_sent
+from bot.database.crud.get import get_outbox_due, get_next_outbox_attempt
+from bot.database.models.main import OutboxMessage
+from bot.misc import Config
+from bot.service.sender import sender
+
+log = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Доставка сообщений из таблицы OutboxMessage. Сообщения разных чатов
+    отправляются параллельно через общий sender, сообщения одного чата -
+    строго по очереди. При ошибке попытка повторяется с экспоненциальной
+    задержкой со случайным разбросом, после MAX_ATTEMPTS или при
+    блокировке бота сообщение помечается dead.
+    """
+    BATCH_SIZE = 100
+    IDLE_TIMEOUT = 60
+    BASE_DELAY = 2
+    MAX_DELAY = 60 * 60
+    MAX_ATTEMPTS = 8
+    # Сообщения ставят в очередь и другие процессы
+    SHARED_POLL = 5
+    KEEP_SENT = timedelta(days=7)
+    CLEANUP_INTERVAL = timedelta(hours=1)
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self.shared = False
+        self._cleanup_at: datetime | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def setup(
+            self,
+            bot: Bot,
+            session_pool: async_sessionmaker,
+            shared: bool = False
+    ):
+        """
+        :param shared: Бот запущен в нескольких процессах
+        """
+        self.bot = bot
+        self.session_pool = session_pool
+        self.shared = shared
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Разбудить сервис после коммита новых сообщений"""
+        self._wakeup.set()
+
+    @classmethod
+    def next_delay(cls, attempts: int) -> float:
+        delay = min(cls.BASE_DELAY * 2 ** (attempts - 1), cls.MAX_DELAY)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def is_permanent(error: Exception) -> bool:
+        if isinstance(error, TelegramForbiddenError):
+            return True
+        return (isinstance(error, TelegramBadRequest)
+                and 'chat not found' in error.message.lower())
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = await self.poll()
+            except Exception:
+                log.exception('Outbox error')
+                timeout = self.BASE_DELAY
+            if self.shared:
+                timeout = min(timeout, self.SHARED_POLL)
+            if timeout <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def deliver(self, message: OutboxMessage):
+        kwargs = {}
+        if message.parse_mode is not None:
+            kwargs['parse_mode'] = message.parse_mode
+        if message.reply_markup is not None:
+            kwargs['reply_markup'] = InlineKeyboardMarkup.model_validate_json(
+                message.reply_markup
+            )
+        await sender.call(
+            lambda: self.bot.send_message(
+                chat_id=message.chat_id,
+                text=message.text,
+                **kwargs
+            ),
+            chat_id=message.chat_id
+        )
+
+    async def poll(self) -> float:
+        """
+        Отправляет сообщения, у которых подошло время.
+        :return: Через сколько секунд проверить снова, 0 - сразу
+        """
+        now = datetime.now()
+        async with self.session_pool() as session:
+            if self._cleanup_at is None or now >= self._cleanup_at:
+                await delete_outbox_sent(session, now - self.KEEP_SENT)
+                self._cleanup_at = now + self.CLEANUP_INTERVAL
+            messages = await get_outbox_due(session, now, self.BATCH_SIZE)
+            results = await sender.map(self.deliver, messages)
+            dead = []
+            for message, error in zip(messages, results):
+                message.attempts += 1
+                if not isinstance(error, Exception):
+                    message.status = 'sent'
+                    message.date_sent = datetime.now()
+                    continue
+                message.last_error = str(error)[:500]
+                if (self.is_permanent(error)
+                        or message.attempts >= self.MAX_ATTEMPTS):
+                    message.status = 'dead'
+                    dead.append(message)
+                    log.error(
+                        'Outbox message %s to %s is dead after %s attempts: %s',
+                        message.id, message.chat_id, message.attempts, error
+                    )
+                    continue
+                message.next_attempt = datetime.now() + timedelta(
+                    seconds=self.next_delay(message.attempts)
+                )
+                log.warning(
+                    'Outbox message %s to %s attempt %s failed: %s',
+                    message.id, message.chat_id, message.attempts, error
+                )
+            for message in dead:
+                # Сообщать о недоставленных уведомлениях об ошибках не нужно
+                if message.kind == 'dead_letter' or not Config.ADMINS_ID:
+                    continue
+                await add_outbox_message(
+                    session,
+                    Config.ADMINS_ID[0],
+                    f'Не удалось доставить уведомление ({message.kind}) '
+                    f'пользователю {message.chat_id}: {message.last_error}',
+                    kind='dead_letter'
+                )
+            await session.commit()
+            if messages:
+                # В чатах могут быть следующие сообщения
+                return 0
+            next_attempt = await get_next_outbox_attempt(session)
+        if next_attempt is None:
+            return self.IDLE_TIMEOUT
+        return min(
+            max((next_attempt - datetime.now()).total_seconds(), 0),
+            self.IDLE_TIMEOUT
+        )
+
+
+outbox = Outbox()
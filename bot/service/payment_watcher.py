@@ -0,0 +1,264 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from fluentogram import TranslatorHub
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from bot.database.crud.delete import delete_pending_payment
+from bot.database.crud.get import (
+    get_pending_payments_due,
+    get_pending_payment,
+    get_next_pending_check
+)
+from bot.database.models.main import PendingPayment
+from bot.misc import Config
+
+log = logging.getLogger(__name__)
+
+
+class PaymentWatcher:
+    """
+    Единый сервис проверки счетов вместо отдельной корутины на каждый платёж.
+    Счета хранятся в таблице PendingPayment, проверяются пачками по платежным
+    системам: часто сразу после создания счёта, затем всё реже.
+    """
+    BATCH_SIZE = 100
+    IDLE_TIMEOUT = 60
+    # (возраст счёта в секундах, интервал проверки в секундах)
+    SCHEDULE = (
+        (2 * 60, 5),
+        (10 * 60, 15),
+        (30 * 60, 30),
+    )
+    SLOW_STEP = 60
+    # Страховочная проверка для систем с уведомлениями об оплате
+    WEBHOOK_STEP = 5 * 60
+    # Счета создают и другие процессы, wake() до этого процесса не доходит
+    SHARED_POLL = 5
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.translator_hub: TranslatorHub | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self.shared = False
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def setup(
+            self,
+            bot: Bot,
+            translator_hub: TranslatorHub,
+            session_pool: async_sessionmaker,
+            shared: bool = False
+    ):
+        """
+        :param shared: Бот запущен в нескольких процессах
+        """
+        self.bot = bot
+        self.translator_hub = translator_hub
+        self.session_pool = session_pool
+        self.shared = shared
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Разбудить сервис после регистрации нового счёта"""
+        self._wakeup.set()
+
+    @classmethod
+    def next_delay(cls, age: float) -> int:
+        for limit, step in cls.SCHEDULE:
+            if age < limit:
+                return step
+        return cls.SLOW_STEP
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = await self.poll()
+            except Exception:
+                log.exception('Payment watcher error')
+                timeout = self.SCHEDULE[0][1]
+            if self.shared:
+                timeout = min(timeout, self.SHARED_POLL)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def build_payment(
+            self,
+            pending: PendingPayment,
+            lang_tg: str | None,
+            session: AsyncSession
+    ):
+        from bot.service.Payments import all_payments
+        payment_cls = all_payments.get(pending.payment_system)
+        if payment_cls is None:
+            return None
+        i18n = self.translator_hub.get_translator_by_locale(
+            locale=lang_tg or Config.DEFAULT_LANGUAGE
+        )
+        return payment_cls(
+            bot=self.bot,
+            user_id=pending.user,
+            price=pending.price,
+            period=pending.period,
+            type_payment=pending.type_payment,
+            config=Config,
+            i18n=i18n,
+            session=session,
+            invoice_id=pending.invoice_id,
+            message_id=pending.message_id
+        )
+
+    async def poll(self) -> float:
+        """
+        Проверяет счета, у которых подошло время.
+        :return: Через сколько секунд нужно проверить снова
+        """
+        now = datetime.now()
+        async with self.session_pool() as session:
+            groups = {}
+            for pending, lang_tg in await get_pending_payments_due(
+                    session, now, self.BATCH_SIZE
+            ):
+                payment = self.build_payment(pending, lang_tg, session)
+                if payment is None:
+                    log.error(
+                        'Unknown payment system %s invoice %s',
+                        pending.payment_system, pending.invoice_id
+                    )
+                    await session.delete(pending)
+                    continue
+                groups.setdefault(type(payment), []).append((pending, payment))
+            results = await asyncio.gather(*(
+                payment_cls.check_invoices([payment for _, payment in items])
+                for payment_cls, items in groups.items()
+            ))
+            for items, paid in zip(groups.values(), results):
+                for pending, payment in items:
+                    await self.process(
+                        session, pending, payment, payment in paid, now
+                    )
+            await session.commit()
+            next_check = await get_next_pending_check(session)
+        if next_check is None:
+            return self.IDLE_TIMEOUT
+        return max((next_check - datetime.now()).total_seconds(), 0)
+
+    async def confirm_invoice(
+            self,
+            payment_system: str,
+            invoice_id: str,
+            amount: float | None = None
+    ) -> bool:
+        """
+        Зачислить оплату по уведомлению платежной системы
+        :param amount: Оплаченная сумма из уведомления
+        :return: False если счёт не найден, уже обработан
+        или оплачен не полностью
+        """
+        async with self.session_pool() as session:
+            row = await get_pending_payment(session, payment_system, invoice_id)
+            if row is None:
+                return False
+            pending, lang_tg = row
+            # Копейка на округление суммы платежной системой
+            if amount is not None and amount + 0.01 < pending.price:
+                log.warning(
+                    'Webhook %s invoice %s paid %s of %s, not credited',
+                    payment_system, invoice_id, amount, pending.price
+                )
+                return False
+            payment = self.build_payment(pending, lang_tg, session)
+            if payment is None:
+                return False
+            if payment.WEBHOOK_VERIFY and not await payment.check_invoice():
+                return False
+            confirmed = await self.process(
+                session, pending, payment, True, datetime.now()
+            )
+            await session.commit()
+        return confirmed
+
+    async def process(
+            self,
+            session: AsyncSession,
+            pending: PendingPayment,
+            payment,
+            is_paid: bool,
+            now: datetime
+    ) -> bool:
+        age = (now - pending.date_registered).total_seconds()
+        if is_paid:
+            try:
+                await payment.confirm()
+            except Exception:
+                log.exception(
+                    'Error confirm payment %s invoice %s',
+                    payment.NAME, pending.invoice_id
+                )
+                # Счёт остаётся и проверяется позже, повторное
+                # подтверждение того же платежа ничего не зачислит
+                pending.attempts += 1
+                pending.next_check = now + timedelta(seconds=self.SLOW_STEP)
+                return False
+            # Платёж записан, уже был засчитан или пользователя нет:
+            # счёт больше не проверяется. Уведомление и опрос не зачислят
+            # его дважды, платежи уникальны по id
+            if not await delete_pending_payment(session, pending.id):
+                return False
+            # Не держим транзакцию открытой на время запросов к API
+            await session.commit()
+            await payment.delete_pay_button()
+            return True
+        if age >= payment.CHECK_PERIOD:
+            if not await delete_pending_payment(session, pending.id):
+                return False
+            # Не держим транзакцию открытой на время запросов к API
+            await session.commit()
+            await payment.delete_pay_button()
+            try:
+                await payment.cancel_invoice()
+            except Exception:
+                log.exception(
+                    'Error cancel invoice %s invoice %s',
+                    payment.NAME, pending.invoice_id
+                )
+            log.info(
+                'user ID: %s payment period has expired Payment - %s',
+                pending.user, payment.NAME
+            )
+            return False
+        if (age >= payment.CHECK_PERIOD - payment.TIME_DELETE
+                and pending.message_id is not None):
+            await payment.delete_pay_button()
+            pending.message_id = None
+        if payment.webhook_enabled():
+            delay = self.WEBHOOK_STEP
+        else:
+            delay = self.next_delay(age)
+        pending.attempts += 1
+        pending.next_check = min(
+            now + timedelta(seconds=delay),
+            pending.date_registered + timedelta(seconds=payment.CHECK_PERIOD)
+        )
+        return False
+
+
+payment_watcher = PaymentWatcher()
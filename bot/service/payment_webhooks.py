@@ -0,0 +1,73 @@
+import json
+import logging
+
+from aiohttp import web
+
+from bot.misc import Config
+from bot.service.Payments import all_payments, WebhookError
+from bot.service.payment_watcher import payment_watcher
+
+log = logging.getLogger(__name__)
+
+PAYMENTS_KEY = web.AppKey('payments', dict)
+
+
+async def payment_webhook(request: web.Request) -> web.Response:
+    """
+    Уведомление об оплате. Зачисление идёт тем же путём, что и при
+    проверке счёта PaymentWatcher, поэтому повторное уведомление
+    не зачислит оплату дважды
+    """
+    payment_cls = request.app[PAYMENTS_KEY].get(request.match_info['name'])
+    if payment_cls is None:
+        raise web.HTTPNotFound()
+    try:
+        paid = await payment_cls.parse_webhook(request)
+    except WebhookError as e:
+        log.warning('Rejected webhook %s: %s', payment_cls.NAME, e)
+        raise web.HTTPForbidden()
+    except (ValueError, KeyError, TypeError, json.JSONDecodeError) as e:
+        log.warning('Bad webhook %s: %s', payment_cls.NAME, e)
+        raise web.HTTPBadRequest()
+    if paid is not None:
+        confirmed = await payment_watcher.confirm_invoice(
+            payment_cls.__name__, paid.invoice_id, paid.amount
+        )
+        log.info(
+            'Webhook %s invoice %s confirmed: %s',
+            payment_cls.NAME, paid.invoice_id, confirmed
+        )
+    return web.Response(text=payment_cls.WEBHOOK_RESPONSE)
+
+
+def create_payment_webhook_app(payments: dict = None) -> web.Application:
+    """
+    :param payments: Платежные системы по имени в адресе, по умолчанию все
+    :return: Приложение aiohttp с маршрутами /payments/{name}
+    """
+    if payments is None:
+        payments = {
+            name.lower(): payment_cls
+            for name, payment_cls in all_payments.items()
+            if payment_cls.webhook_enabled()
+        }
+    app = web.Application()
+    app[PAYMENTS_KEY] = payments
+    app.router.add_post('/payments/{name}', payment_webhook)
+    return app
+
+
+async def start_payment_webhooks() -> web.AppRunner:
+    runner = web.AppRunner(create_payment_webhook_app())
+    await runner.setup()
+    site = web.TCPSite(
+        runner,
+        Config.PAYMENT_WEBHOOK_HOST,
+        Config.PAYMENT_WEBHOOK_PORT
+    )
+    await site.start()
+    log.info(
+        'Payment webhooks listen on %s:%s',
+        Config.PAYMENT_WEBHOOK_HOST, Config.PAYMENT_WEBHOOK_PORT
+    )
+    return runner
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import datetime as dt
+
+from aiogram import Bot
+from fluentogram import TranslatorHub
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from bot.database.crud.get import get_renewal_charges, get_renewals_due
+from bot.database.crud.update import finalize_payments
+from bot.database.models.main import AutoRenewal, User
+from bot.keyboards.user_inline import link_chanel
+from bot.misc import Config
+from bot.service.loop import expiry_scheduler, get_i18n
+from bot.service.media import media_registry
+from bot.service.Payments import KassaSmart
+from bot.service.sender import sender
+
+log = logging.getLogger(__name__)
+
+
+class RenewalEngine:
+    """
+    Автопродление подписок с сохранённым способом оплаты ЮKassa.
+    Подписки, которые скоро закончатся, списываются пачками с ограничением
+    одновременных запросов. Списания не ждут результата: статус всех
+    списаний в процессе проверяет один цикл, оплаченные подписки
+    продлеваются одним коммитом. Продление начинается раньше
+    предупреждения и окончания подписки в ExpiryScheduler.
+    """
+    BATCH_SIZE = 100
+    CONCURRENCY = 10
+    # Запас до предупреждения об окончании подписки
+    LEAD = dt.timedelta(hours=1)
+    MAX_ATTEMPTS = 3
+    RETRY = dt.timedelta(hours=4)
+    CHECK_INTERVAL = 15
+    IDLE_TIMEOUT = 5 * 60
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.translator_hub: TranslatorHub | None = None
+        self.session_pool: async_sessionmaker | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def setup(
+            self,
+            bot: Bot,
+            translator_hub: TranslatorHub,
+            session_pool: async_sessionmaker
+    ):
+        self.bot = bot
+        self.translator_hub = translator_hub
+        self.session_pool = session_pool
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    @classmethod
+    def renew_before(cls) -> dt.timedelta:
+        return dt.timedelta(days=Config.DAY_SHOW_ALERT) + cls.LEAD
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = await self.tick()
+            except Exception:
+                log.exception('Renewal engine error')
+                timeout = self.IDLE_TIMEOUT
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def tick(self) -> float:
+        """
+        Создаёт списания для подошедших подписок и собирает результаты.
+        :return: Через сколько секунд проснуться
+        """
+        now = expiry_scheduler.now()
+        async with self.session_pool() as session:
+            due = await get_renewals_due(
+                session,
+                now + self.renew_before(),
+                now,
+                self.MAX_ATTEMPTS,
+                self.BATCH_SIZE
+            )
+            if due:
+                await self.charge(session, due, now)
+            charges = await get_renewal_charges(session, self.BATCH_SIZE)
+            if charges:
+                await self.collect(session, charges)
+        if charges or len(due) == self.BATCH_SIZE:
+            return self.CHECK_INTERVAL
+        return self.IDLE_TIMEOUT
+
+    async def charge(
+            self,
+            session: AsyncSession,
+            due: list[tuple[AutoRenewal, User]],
+            now: dt.datetime
+    ):
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def create(renewal: AutoRenewal, user: User):
+            async with semaphore:
+                return await KassaSmart.auto_payment(
+                    Config,
+                    get_i18n(user, self.translator_hub),
+                    renewal.payment_method_id,
+                    renewal.price,
+                    # Одно списание на попытку продления этой подписки
+                    f'renewal-{user.telegram_id}-'
+                    f'{user.subscription:%Y%m%d%H%M%S}-{renewal.attempts}'
+                )
+
+        payments = await asyncio.gather(*(
+            create(renewal, user) for renewal, user in due
+        ))
+        for (renewal, user), payment in zip(due, payments):
+            renewal.next_attempt = now + self.RETRY
+            if payment is not None:
+                # Без ответа ЮKassa списание могло быть создано: следующая
+                # попытка идёт с тем же ключом и не спишет второй раз
+                renewal.attempts += 1
+                renewal.charge_id = payment.id
+                renewal.charged_at = now
+        await session.commit()
+        log.info(
+            'Renewal charges created: %s of %s',
+            sum(payment is not None for payment in payments), len(due)
+        )
+
+    async def collect(
+            self,
+            session: AsyncSession,
+            charges: list[tuple[AutoRenewal, User]]
+    ):
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def find(renewal: AutoRenewal):
+            async with semaphore:
+                try:
+                    return await KassaSmart.find_payment(
+                        Config, renewal.charge_id
+                    )
+                except Exception:
+                    log.exception('Error check renewal %s', renewal.charge_id)
+                    return None
+
+        payments = await asyncio.gather(*(
+            find(renewal) for renewal, _ in charges
+        ))
+        paid = []
+        for (renewal, user), payment in zip(charges, payments):
+            status = payment.status if payment is not None else None
+            if status == 'succeeded':
+                paid.append((renewal, user, payment.id))
+            elif status == 'canceled':
+                reason = getattr(payment.cancellation_details, 'reason', None)
+                log.info(
+                    'Renewal user:%s charge %s canceled: %s',
+                    user.telegram_id, renewal.charge_id, reason
+                )
+                renewal.charge_id = None
+                if reason == 'permission_revoked':
+                    # Пользователь отозвал разрешение на списания
+                    await session.delete(renewal)
+            # Списание в процессе проверяется до итогового статуса:
+            # новое списание до этого может списать деньги дважды
+        if not paid:
+            await session.commit()
+            return
+        for renewal, _, _ in paid:
+            renewal.attempts = 0
+            renewal.charge_id = None
+        # Сброс списаний фиксируется тем же коммитом, что и платежи
+        subscriptions = await finalize_payments(session, [
+            dict(
+                user=user.telegram_id,
+                amount=renewal.price,
+                payment_system=KassaSmart.RECORD_NAME,
+                id_payment=payment_id,
+                period=renewal.period
+            )
+            for renewal, user, payment_id in paid
+        ])
+        expiry_scheduler.reschedule()
+        await sender.map(self.notify, [
+            user for _, user, _ in paid if user.telegram_id in subscriptions
+        ])
+
+    async def notify(self, user: User):
+        if user.blocked:
+            return
+        i18n = get_i18n(user, self.translator_hub)
+        markup = await link_chanel(
+            i18n=i18n,
+            link_channel=Config.LINK_CHANNEL
+        )
+        try:
+            await sender.call(
+                lambda: media_registry.send_photo(
+                    self.bot,
+                    'bot/img/sub.png',
+                    chat_id=user.telegram_id,
+                    caption=i18n.user.text.subscription.link(
+                        link=Config.LINK_CHANNEL
+                    ),
+                    reply_markup=markup
+                ),
+                user.telegram_id
+            )
+        except Exception:
+            log.info('User %s banned bot', user.telegram_id)
+
+
+renewal_engine = RenewalEngine()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable
+
+from aiogram.exceptions import TelegramRetryAfter
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ограничение частоты: rate токенов в секунду, не больше capacity подряд
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimitedSender:
+    """
+    Отправка запросов в Telegram с общим лимитом на бота, лимитом на чат
+    и ограничением числа одновременных запросов. Фоновые запросы
+    (рассылки) занимают не больше background_share общего лимита,
+    остальное всегда остаётся уведомлениям. При RetryAfter
+    приостанавливаются все запросы отправителя и вдвое снижается
+    скорость, после успешных запросов она постепенно возвращается.
+    """
+    GLOBAL_RATE = 25
+    BACKGROUND_SHARE = 0.6
+    MIN_RATE = 1
+    # Прибавка к скорости после каждого успешного запроса
+    RATE_STEP = 0.1
+    CHAT_INTERVAL = 1.0
+    CONCURRENCY = 20
+    MAX_RETRIES = 3
+
+    def __init__(
+            self,
+            rate: float = GLOBAL_RATE,
+            chat_interval: float = CHAT_INTERVAL,
+            concurrency: int = CONCURRENCY,
+            background_share: float = BACKGROUND_SHARE
+    ):
+        self.bucket = TokenBucket(rate, max(int(rate), 1))
+        background_rate = rate * background_share
+        self.background_bucket = TokenBucket(
+            background_rate, max(int(background_rate), 1)
+        )
+        self.max_rate = rate
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self._chat_next: dict[int, float] = {}
+        self._paused_until = 0.0
+
+    async def _wait_chat(self, chat_id: int):
+        now = time.monotonic()
+        allowed = self._chat_next.get(chat_id, now)
+        self._chat_next[chat_id] = max(allowed, now) + self.chat_interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {
+                chat: moment for chat, moment in self._chat_next.items()
+                if moment > now
+            }
+        if allowed > now:
+            await asyncio.sleep(allowed - now)
+
+    async def call(
+            self,
+            request: Callable[[], Awaitable],
+            chat_id: int | None = None,
+            background: bool = False
+    ):
+        """
+        :param request: Функция, создающая запрос, вызывается при каждой попытке
+        :param chat_id: Чат с сообщением, None для действий без лимита на чат
+        :param background: Фоновый запрос, ограничен долей общего лимита
+        """
+        for attempt in range(self.MAX_RETRIES + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            if background:
+                await self.background_bucket.acquire()
+            await self.bucket.acquire()
+            if chat_id is not None:
+                await self._wait_chat(chat_id)
+            try:
+                result = await request()
+            except TelegramRetryAfter as e:
+                self.bucket.rate = max(self.MIN_RATE, self.bucket.rate / 2)
+                if attempt == self.MAX_RETRIES:
+                    raise
+                log.warning(
+                    'Flood control, retry after %ss, rate %.1f/s',
+                    e.retry_after, self.bucket.rate
+                )
+                self._paused_until = max(
+                    self._paused_until,
+                    time.monotonic() + e.retry_after
+                )
+            else:
+                self.bucket.rate = min(
+                    self.max_rate, self.bucket.rate + self.RATE_STEP
+                )
+                return result
+
+    async def map(
+            self,
+            func: Callable[..., Awaitable],
+            items: Iterable
+    ) -> list:
+        """
+        Выполнить func для каждого элемента, не больше concurrency
+        одновременно
+        :return: Результаты или исключения в порядке items
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(item):
+            async with semaphore:
+                return await func(item)
+
+        return await asyncio.gather(
+            *(run(item) for item in items),
+            return_exceptions=True
+        )
+
+
+sender = RateLimitedSender()
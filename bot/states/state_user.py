@@ -29,6 +29,7 @@ class StateAdmin(StatesGroup):
     milling_menu = State()
     milling_active = State()
     statistics_menu = State()
+    export_menu = State()
     user_control_input = State()
     user_control_menu = State()
     user_control_message = State()
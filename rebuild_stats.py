@@ -0,0 +1,16 @@
+import asyncio
+import logging
+
+from bot.database.main import engine
+from bot.database.stats import rebuild_stats
+
+
+async def main():
+    async with engine().begin() as conn:
+        await conn.run_sync(rebuild_stats)
+    logging.info('Statistics rebuilt')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
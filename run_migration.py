@@ -0,0 +1,16 @@
+import asyncio
+import logging
+
+from bot.database.main import engine
+from bot.database.migrations import run_migrations
+
+
+async def main():
+    applied = await run_migrations(engine())
+    if not applied:
+        logging.info('Database schema is up to date')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Настройки задаются до импорта бота и перекрывают .env, как в bench:
+каждый тест получает новую базу SQLite во временной папке
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+os.environ.update(
+    TG_TOKEN='123456:TEST',
+    ADMINS_ID='1,2',
+    PERIOD='mon.1,mon.3',
+    AMOUNT='100,250',
+    ID_CHANNEL='-1001',
+    LINK_CHANNEL='https://t.me/+test',
+    NAME_CHANNEL='Test',
+    UTC_TIME='0',
+    POSTGRES_DB='test',
+    POSTGRES_USER='test',
+    POSTGRES_PASSWORD='test',
+    PGADMIN_DEFAULT_EMAIL='test@example.com',
+    PGADMIN_DEFAULT_PASSWORD='test',
+    DB_ENGINE='sqlite',
+    SQLITE_PATH=os.path.join(tempfile.mkdtemp(prefix='tests-'), 'bot.db'),
+    BOT_MODE='polling',
+    FSM_STORAGE='db',
+    PAYMENT_WEBHOOK_PORT='0',
+    MODERATION_DIGEST='0',
+    METRICS_PORT='0',
+)
+# bot.main при импорте пишет лог в logs/all.log
+os.makedirs('logs', exist_ok=True)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Новая база SQLite с примененными миграциями.
+    Возвращает run(test): выполняет корутину test(session_maker)
+    в своём цикле событий и закрывает соединения
+    """
+    from bot.database import main as db
+    from bot.database.cache import invalidate_user
+    from bot.database.migrations import run_migrations
+
+    monkeypatch.setattr(
+        db, 'ENGINE', f'sqlite+aiosqlite:///{tmp_path / "bot.db"}'
+    )
+    for name in ('_engine', '_read_engine', '_storage_engine'):
+        monkeypatch.setattr(db, name, None)
+    invalidate_user(None)
+
+    def run(test):
+        async def main():
+            await run_migrations(db.engine())
+            try:
+                return await test(db.session_maker())
+            finally:
+                for engine in (db._engine, db._read_engine,
+                               db._storage_engine):
+                    if engine is not None:
+                        await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
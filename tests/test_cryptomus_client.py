@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from aiohttp import ClientSession
+
+from bench.fake_payment import FakeCryptomus
+from bot.service.Payments.clients import CryptomusClient
+
+LATENCY = 0.2
+REQUESTS = 10
+
+
+async def measure_lag(stop: asyncio.Event) -> float:
+    """Наибольшая задержка цикла событий, пока не выставлен stop"""
+    lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lag = max(lag, time.perf_counter() - start - 0.01)
+    return lag
+
+
+def test_requests_do_not_block_loop(monkeypatch):
+    async def test():
+        api = FakeCryptomus(LATENCY)
+        await api.start('127.0.0.1', 0)
+        port = api._runner.addresses[0][1]
+        monkeypatch.setattr(
+            CryptomusClient, 'API_URL', f'http://127.0.0.1:{port}/v1/'
+        )
+        stop = asyncio.Event()
+        lag = asyncio.create_task(measure_lag(stop))
+        try:
+            async with ClientSession() as session:
+                client = CryptomusClient(session, 'key', 'merchant')
+                start = time.perf_counter()
+                results = await asyncio.gather(*(
+                    client.payment_info({'uuid': str(number)})
+                    for number in range(REQUESTS)
+                ))
+                elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            await api.stop()
+        assert [result['uuid'] for result in results] == [
+            str(number) for number in range(REQUESTS)
+        ]
+        assert all(result['status'] == 'paid' for result in results)
+        # Запросы ждут ответа одновременно, а не по очереди
+        assert elapsed < LATENCY * 3
+        assert await lag < 0.1
+
+    asyncio.run(test())
@@ -0,0 +1,101 @@
+import heapq
+from datetime import timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+
+from bot.database.models.main import User
+from bot.database.requests import upsert_user
+from bot.service import loop
+from bot.service.loop import ExpiryScheduler
+from tests.test_payment_watcher import FakeBot, Text
+
+
+async def add_subscriber(session, telegram_id, subscription, notion_oneday):
+    await upsert_user(session, telegram_id, 'user', 'User')
+    await session.execute(
+        update(User)
+        .where(User.telegram_id == telegram_id)
+        .values(
+            status_subscription=True,
+            subscription=subscription,
+            notion_oneday=notion_oneday
+        )
+    )
+    await session.commit()
+
+
+def test_heap_pops_events_in_time_order(database):
+    async def test(session_pool):
+        scheduler = ExpiryScheduler()
+        now = scheduler.now()
+        day = timedelta(days=1)
+        async with session_pool() as session:
+            await add_subscriber(session, 1, now + timedelta(minutes=8), True)
+            await add_subscriber(session, 2, now + timedelta(minutes=2), False)
+            await add_subscriber(session, 3, now + day + timedelta(minutes=5), True)
+            # За окном и без предупреждения
+            await add_subscriber(session, 4, now + timedelta(hours=2), False)
+            await scheduler.load(session, now)
+        events = []
+        while scheduler._heap:
+            events.append(heapq.heappop(scheduler._heap))
+        assert events == sorted(events)
+        assert [telegram_id for _, telegram_id in events] == [1, 2, 3, 1]
+        assert events[0][0] == now + timedelta(minutes=8) - day
+
+    database(test)
+
+
+def test_due_users_are_fetched_in_chunks(database, monkeypatch):
+    checked = []
+
+    async def check_users(users, translator_hub, session, bot):
+        checked.append(sorted(user.telegram_id for user in users))
+        return True
+
+    monkeypatch.setattr(loop, 'check_users', check_users)
+    monkeypatch.setattr(ExpiryScheduler, 'CHUNK', 2)
+
+    async def test(session_pool):
+        scheduler = ExpiryScheduler()
+        scheduler.session_pool = session_pool
+        now = scheduler.now()
+        async with session_pool() as session:
+            for telegram_id in range(1, 6):
+                await add_subscriber(
+                    session, telegram_id, now - timedelta(minutes=1), False
+                )
+        await scheduler.tick()
+        assert [len(users) for users in checked] == [2, 2, 1]
+        assert sorted(sum(checked, [])) == [1, 2, 3, 4, 5]
+
+    database(test)
+
+
+def test_unban_error_ends_subscription_once(database):
+    class ChannelBot(FakeBot):
+        async def ban_chat_member(self, chat_id, user_id):
+            return True
+
+        async def unban_chat_member(self, chat_id, user_id):
+            raise RuntimeError('channel is unavailable')
+
+    async def test(session_pool):
+        scheduler = ExpiryScheduler()
+        scheduler.session_pool = session_pool
+        scheduler.bot = ChannelBot()
+        now = scheduler.now()
+        async with session_pool() as session:
+            await add_subscriber(session, 1, now - timedelta(minutes=1), False)
+        scheduler.translator_hub = SimpleNamespace(
+            get_translator_by_locale=lambda locale: Text()
+        )
+        await scheduler.tick()
+        await scheduler.tick()
+        assert len(scheduler.bot.photos) == 1
+        async with session_pool() as session:
+            user = await session.scalar(select(User))
+        assert user.status_subscription is False
+
+    database(test)
@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from bot.database.crud.delete import delete_pending_payment
+from bot.database.crud.update import extend_subscriptions, \
+    finalize_payment, finalize_payments
+from bot.database.models.main import Payment, PendingPayment, StatTotal, \
+    User
+from bot.database.requests import upsert_user
+
+USER = 100
+
+
+async def setup_user(session_pool):
+    async with session_pool() as session:
+        await upsert_user(session, USER, 'user', 'User')
+        for invoice in ('a', 'b'):
+            session.add(PendingPayment(
+                user=USER,
+                payment_system='Test',
+                invoice_id=invoice,
+                price=100,
+                period='mon.1'
+            ))
+        await session.commit()
+
+
+async def count(session, model) -> int:
+    return await session.scalar(select(func.count(model.id)))
+
+
+def test_second_confirm_is_skipped(database):
+    async def test(session_pool):
+        await setup_user(session_pool)
+        async with session_pool() as session:
+            first = await finalize_payment(
+                session, USER, 100, 'Test', 'inv-1', 'mon.1'
+            )
+            second = await finalize_payment(
+                session, USER, 100, 'Test', 'inv-1', 'mon.1'
+            )
+            assert first.subscription is not None and not first.duplicate
+            assert second.subscription is None and second.duplicate
+            assert await count(session, Payment) == 1
+            user = await session.scalar(
+                select(User).where(User.telegram_id == USER)
+            )
+            assert user.status_subscription
+            assert user.subscription == first.subscription
+            total = await session.scalar(select(StatTotal))
+            assert total.payments == 1
+
+    database(test)
+
+
+def test_missing_user_is_not_duplicate(database):
+    async def test(session_pool):
+        async with session_pool() as session:
+            result = await finalize_payment(
+                session, USER, 100, 'Test', 'inv-1', 'mon.1'
+            )
+            assert result.subscription is None and not result.duplicate
+            assert await count(session, Payment) == 0
+
+    database(test)
+
+
+def test_skip_keeps_caller_changes(database):
+    """Пропуск платежа не откатывает изменения вызывающего кода"""
+    async def test(session_pool):
+        await setup_user(session_pool)
+        async with session_pool() as session:
+            await finalize_payment(
+                session, USER, 100, 'Test', 'inv-1', 'mon.1'
+            )
+        async with session_pool() as session:
+            first, second = (await session.scalars(
+                select(PendingPayment).order_by(PendingPayment.id)
+            )).all()
+            assert await delete_pending_payment(session, first.id)
+            second.attempts = 5
+            result = await finalize_payment(
+                session, USER, 100, 'Test', 'inv-1', 'mon.1'
+            )
+            assert result.duplicate
+            # Объекты сессии не сброшены
+            assert second.attempts == 5
+            await session.commit()
+        async with session_pool() as session:
+            rows = (await session.scalars(select(PendingPayment))).all()
+            assert [(row.invoice_id, row.attempts) for row in rows] == [
+                ('b', 5)
+            ]
+
+    database(test)
+
+
+def test_error_rolls_back_only_payment(database, monkeypatch):
+    async def test(session_pool):
+        await setup_user(session_pool)
+
+        async def broken(*args, **kwargs):
+            raise RuntimeError('stats are broken')
+
+        monkeypatch.setattr(
+            'bot.database.crud.update.stat_payment', broken
+        )
+        async with session_pool() as session:
+            pending = await session.scalar(select(PendingPayment))
+            pending.attempts = 3
+            try:
+                await finalize_payment(
+                    session, USER, 100, 'Test', 'inv-1', 'mon.1'
+                )
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError('error was not raised')
+            assert pending.attempts == 3
+            await session.commit()
+        async with session_pool() as session:
+            assert await count(session, Payment) == 0
+            pending = await session.scalar(
+                select(PendingPayment).order_by(PendingPayment.id)
+            )
+            assert pending.attempts == 3
+
+    database(test)
+
+
+def test_batch_skips_credited(database):
+    async def test(session_pool):
+        await setup_user(session_pool)
+        payment = dict(
+            user=USER,
+            amount=100,
+            payment_system='Test',
+            id_payment='inv-1',
+            period='mon.1'
+        )
+        async with session_pool() as session:
+            first = await finalize_payments(session, [payment])
+            second = await finalize_payments(session, [payment])
+            assert list(first) == [USER]
+            assert second == {}
+            assert await count(session, Payment) == 1
+
+    database(test)
+
+
+def test_extend_keeps_microseconds(database):
+    async def test(session_pool):
+        active = datetime(2099, 1, 1, 12, 0, 0, 123456)
+        async with session_pool() as session:
+            await upsert_user(session, USER, 'user', 'User')
+            await upsert_user(session, USER + 1, 'user', 'User')
+            await session.execute(
+                update(User)
+                .where(User.telegram_id == USER)
+                .values(status_subscription=True, subscription=active)
+            )
+            subscriptions = await extend_subscriptions(
+                session, [USER, USER + 1], 'day.1'
+            )
+            await session.commit()
+            assert subscriptions[USER] == active + timedelta(days=1)
+            # Новой считается только подписка, начатая с текущего момента
+            total = await session.scalar(select(StatTotal))
+            assert total.active_subs == 1
+
+    database(test)
@@ -0,0 +1,37 @@
+import logging
+import queue
+
+from bot.misc import logs
+from bot.misc.logs import LazyQueueHandler, RateLimitFilter
+
+
+def make_record(msg='message', args=(), level=logging.INFO, name='test'):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_filter(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(logs.time, 'monotonic', lambda: now[0])
+    limit = RateLimitFilter(rate=1, burst=2)
+    assert limit.filter(make_record())
+    assert limit.filter(make_record())
+    assert not limit.filter(make_record())
+    # Другой логгер и предупреждения не ограничиваются
+    assert limit.filter(make_record(name='other'))
+    assert limit.filter(make_record(level=logging.WARNING))
+    now[0] += 1
+    record = make_record()
+    assert limit.filter(record)
+    assert record.getMessage() == '[1 records dropped] message'
+    assert not limit.filter(make_record())
+
+
+def test_queue_handler_formats_args_when_logged():
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    value = ['before']
+    handler.handle(make_record('value %s', (value,)))
+    value[0] = 'after'
+    record = records.get_nowait()
+    assert record.getMessage() == "value ['before']"
+    assert record.args is None
@@ -0,0 +1,44 @@
+import asyncio
+
+from aiogram.enums import ContentType
+from aiogram_dialog.api.entities import MediaId
+from sqlalchemy import func, select
+
+from bot.database.models.main import Media
+from bot.database.sqlite_engine import write_queue
+from bot.service.media import MediaRegistry
+
+
+def test_concurrent_saves_keep_one_row(database, tmp_path):
+    path = str(tmp_path / 'image.png')
+    with open(path, 'wb') as file:
+        file.write(b'image')
+
+    async def test(session_pool):
+        write_queue.setup(session_pool)
+        write_queue.start()
+        registry = MediaRegistry()
+        await registry.setup(session_pool)
+        try:
+            await asyncio.gather(*(
+                registry.save(
+                    path, ContentType.PHOTO, MediaId(f'file-{n}', f'u-{n}')
+                )
+                for n in range(5)
+            ))
+            await registry.save(
+                path, ContentType.PHOTO, MediaId('file-last', 'u-last')
+            )
+        finally:
+            await write_queue.stop()
+        async with session_pool() as session:
+            count = await session.scalar(select(func.count(Media.id)))
+            media = await session.scalar(select(Media))
+        assert count == 1
+        assert media.file_id == 'file-last'
+        # Новый процесс загружает сохранённый file_id
+        restarted = MediaRegistry()
+        await restarted.setup(session_pool)
+        assert restarted.get(path, ContentType.PHOTO).file_id == 'file-last'
+
+    database(test)
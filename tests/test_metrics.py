@@ -0,0 +1,64 @@
+import asyncio
+
+from aiogram.types import CallbackQuery, User
+from aiogram_dialog.utils import CB_SEP
+
+from bot.middlewares.metrics import dialog_handler_name
+from bot.service.metrics import Metrics
+
+
+class Provider:
+    async def check_invoice(self):
+        return True
+
+    @classmethod
+    async def check_invoices(cls, payments):
+        return {payment: cls for payment in payments}
+
+    @classmethod
+    async def parse_webhook(cls, request):
+        raise ValueError(request)
+
+    @staticmethod
+    async def find_payment(config, payment_id):
+        return payment_id
+
+
+def test_instrument_payments_wraps_descriptors():
+    metrics = Metrics()
+    metrics.instrument_payments({'Provider': Provider})
+
+    async def calls():
+        assert await Provider().check_invoice() is True
+        assert await Provider.check_invoices([1]) == {1: Provider}
+        assert await Provider.find_payment(None, 'id') == 'id'
+        try:
+            await Provider.parse_webhook('bad')
+        except ValueError:
+            pass
+
+    asyncio.run(calls())
+    observed = {
+        labels: series[-1]
+        for labels, series in metrics.provider_seconds.values.items()
+    }
+    assert observed == {
+        ('Provider', 'check_invoice'): 1,
+        ('Provider', 'check_invoices'): 1,
+        ('Provider', 'find_payment'): 1,
+        ('Provider', 'parse_webhook'): 1
+    }
+    assert metrics.provider_errors.values == {
+        ('Provider', 'parse_webhook'): 1
+    }
+
+
+def test_dialog_handler_name():
+    callback = CallbackQuery(
+        id='1',
+        from_user=User(id=1, is_bot=False, first_name='User'),
+        chat_instance='1',
+        data=f'intent{CB_SEP}select_period:mon.1'
+    )
+    assert dialog_handler_name(callback, 'Sub:main') == 'Sub:main:select_period'
+    assert dialog_handler_name(object(), 'Sub:main') == 'Sub:main'
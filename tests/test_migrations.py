@@ -0,0 +1,81 @@
+import asyncio
+import shutil
+from pathlib import Path
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot.database.migrations import LATEST_VERSION, check_schema, \
+    run_migrations
+from bot.database.models.main import Base, User
+
+BASELINE = (
+    Path(__file__).parent.parent / 'bot/database/sqlite/PrivateClubDB.db'
+)
+
+
+def model_differences(conn) -> list[str]:
+    """Колонки и индексы моделей, которых нет в базе"""
+    inspector = inspect(conn)
+    missing = []
+    for name, table in Base.metadata.tables.items():
+        columns = {column['name'] for column in inspector.get_columns(name)}
+        missing += [
+            f'{name}.{column.name}' for column in table.columns
+            if column.name not in columns
+        ]
+        indexes = {index['name'] for index in inspector.get_indexes(name)}
+        missing += [
+            f'{name}.{index.name}' for index in table.indexes
+            if index.name not in indexes
+        ]
+    return missing
+
+
+async def migrate(path: Path) -> tuple[list[int], list[int], list[str], int]:
+    """
+    :return: Примененные миграции, повторный запуск,
+    расхождения со схемой моделей и число пользователей
+    """
+    engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+    try:
+        applied = await run_migrations(engine)
+        again = await run_migrations(engine)
+        await check_schema(engine)
+        async with engine.connect() as conn:
+            missing = await conn.run_sync(model_differences)
+            users = await conn.scalar(select(func.count(User.id)))
+    finally:
+        await engine.dispose()
+    return applied, again, missing, users
+
+
+def test_fresh_database(tmp_path):
+    applied, again, missing, users = asyncio.run(migrate(tmp_path / 'new.db'))
+    assert applied == list(range(1, LATEST_VERSION + 1))
+    assert again == []
+    assert missing == []
+    assert users == 0
+
+
+def test_baseline_database(tmp_path):
+    # Миграции выполняются на копии, отслеживаемая база не меняется
+    path = tmp_path / 'baseline.db'
+    shutil.copyfile(BASELINE, path)
+    original = BASELINE.read_bytes()
+
+    async def count_users():
+        engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+        try:
+            async with engine.connect() as conn:
+                return await conn.scalar(select(func.count(User.id)))
+        finally:
+            await engine.dispose()
+
+    users_before = asyncio.run(count_users())
+    applied, again, missing, users = asyncio.run(migrate(path))
+    assert applied == list(range(1, LATEST_VERSION + 1))
+    assert again == []
+    assert missing == []
+    assert users == users_before > 0
+    assert BASELINE.read_bytes() == original
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from bot.database.models.main import current_time
+from bot.service.moderation_notify import digest_text, user_card
+
+
+def test_card_username_from_database_and_telegram():
+    # В базе username хранится с @, из /start приходит без него
+    for username in ('@name', 'name'):
+        text = user_card(1, 'User', username, 'ru', current_time())
+        assert "@name</a>" in text
+        assert "https://t.me/name'" in text
+        assert '@@' not in text
+
+
+def test_missing_username_is_hidden():
+    for username in (None, '', '@None'):
+        text = user_card(1, 'User', username, 'ru', current_time())
+        assert 'Username' not in text
+        assert 't.me' not in text
+
+
+def test_digest_username():
+    users = [
+        SimpleNamespace(telegram_id=1, fullname='One', username='@one'),
+        SimpleNamespace(telegram_id=2, fullname='Two', username='@None')
+    ]
+    text = digest_text(users)
+    assert 'One @one' in text
+    assert '@@' not in text
+    assert 'None' not in text
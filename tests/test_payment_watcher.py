@@ -0,0 +1,206 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+
+from bot.database.models.main import Payment, PendingPayment, current_time
+from bot.database.requests import upsert_user
+from bot.misc import Config
+from bot.service.Payments import KassaSmart, Lava, YooMoney
+from bot.service.Payments.payment_systems import PaymentSystem
+from bot.service.payment_watcher import PaymentWatcher
+
+USER = 100
+
+
+class Text:
+    """Переводы: любой ключ возвращает строку"""
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, **kwargs):
+        return 'text'
+
+
+class FakeBot:
+    def __init__(self):
+        self.photos = []
+        self.deleted = []
+
+    async def send_photo(self, **kwargs):
+        self.photos.append(kwargs)
+        return SimpleNamespace(
+            message_id=1,
+            photo=[SimpleNamespace(file_id='file', file_unique_id='unique')]
+        )
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append(message_id)
+
+
+class FakePay(PaymentSystem):
+    NAME = 'FakePay'
+    cancelled = 0
+
+    async def cancel_invoice(self):
+        FakePay.cancelled += 1
+
+
+async def add_pending(session_pool, registered=None) -> int:
+    async with session_pool() as session:
+        await upsert_user(session, USER, 'user', 'User')
+        pending = PendingPayment(
+            user=USER,
+            payment_system=FakePay.__name__,
+            invoice_id='inv-1',
+            price=100,
+            period='mon.1',
+            message_id=5,
+            date_registered=registered or current_time()
+        )
+        session.add(pending)
+        await session.commit()
+        return pending.id
+
+
+async def process(session_pool, bot, is_paid, confirm=None):
+    watcher = PaymentWatcher()
+    async with session_pool() as session:
+        pending = await session.scalar(select(PendingPayment))
+        payment = FakePay(
+            bot=bot,
+            user_id=pending.user,
+            price=pending.price,
+            period=pending.period,
+            type_payment='default',
+            config=Config,
+            i18n=Text(),
+            session=session,
+            invoice_id=pending.invoice_id,
+            message_id=pending.message_id
+        )
+        if confirm is not None:
+            payment.confirm = confirm
+        result = await watcher.process(
+            session, pending, payment, is_paid, current_time()
+        )
+        await session.commit()
+    async with session_pool() as session:
+        pending = await session.scalar(select(PendingPayment))
+        payments = await session.scalar(select(func.count(Payment.id)))
+    return result, pending, payments
+
+
+def test_paid_invoice_is_credited_once(database):
+    async def test(session_pool):
+        await add_pending(session_pool)
+        bot = FakeBot()
+        result, pending, payments = await process(session_pool, bot, True)
+        assert result is True
+        assert pending is None
+        assert payments == 1
+        assert len(bot.photos) == 1
+        assert bot.deleted == [5]
+
+    database(test)
+
+
+def test_duplicate_confirm_removes_invoice(database):
+    """Уже засчитанный платёж не оставляет счёт в опросе"""
+    async def test(session_pool):
+        await add_pending(session_pool)
+        await process(session_pool, FakeBot(), True)
+        # Тот же счёт снова пришёл, например после перезапуска
+        await add_pending(session_pool)
+        bot = FakeBot()
+        result, pending, payments = await process(session_pool, bot, True)
+        assert result is True
+        assert pending is None
+        assert payments == 1
+        assert bot.photos == []
+
+    database(test)
+
+
+def test_confirm_error_backs_off(database):
+    async def test(session_pool):
+        await add_pending(session_pool)
+
+        async def broken():
+            raise RuntimeError('provider is down')
+
+        before = current_time()
+        result, pending, payments = await process(
+            session_pool, FakeBot(), True, confirm=broken
+        )
+        assert result is False
+        assert payments == 0
+        assert pending.attempts == 1
+        assert pending.next_check >= before + timedelta(
+            seconds=PaymentWatcher.SLOW_STEP
+        )
+
+    database(test)
+
+
+def test_expired_invoice_is_cancelled(database):
+    async def test(session_pool):
+        await add_pending(
+            session_pool,
+            current_time() - timedelta(seconds=FakePay.CHECK_PERIOD + 1)
+        )
+        FakePay.cancelled = 0
+        bot = FakeBot()
+        result, pending, payments = await process(session_pool, bot, False)
+        assert result is False
+        assert pending is None
+        assert payments == 0
+        assert FakePay.cancelled == 1
+        assert bot.deleted == [5]
+
+    database(test)
+
+
+def test_unpaid_invoice_is_rescheduled(database):
+    async def test(session_pool):
+        await add_pending(session_pool)
+        before = current_time()
+        result, pending, payments = await process(
+            session_pool, FakeBot(), False
+        )
+        assert result is False
+        assert pending.attempts == 1
+        assert pending.next_check > before
+
+    database(test)
+
+
+def test_underpaid_webhook_is_not_credited(database):
+    async def test(session_pool):
+        await add_pending(session_pool)
+        watcher = PaymentWatcher()
+        watcher.session_pool = session_pool
+        confirmed = await watcher.confirm_invoice(
+            FakePay.__name__, 'inv-1', amount=1.0
+        )
+        assert confirmed is False
+        async with session_pool() as session:
+            pending = await session.scalar(select(PendingPayment))
+            payments = await session.scalar(select(func.count(Payment.id)))
+        assert pending is not None
+        assert payments == 0
+
+    database(test)
+
+
+def test_webhook_needs_signing_key(monkeypatch):
+    monkeypatch.setattr(Config, 'PAYMENT_WEBHOOK_PORT', 8000)
+    monkeypatch.setattr(Config, 'YOOMONEY_NOTIFICATION_SECRET', '')
+    monkeypatch.setattr(Config, 'LAVA_WEBHOOK_KEY', '')
+    assert not YooMoney.webhook_enabled()
+    assert not Lava.webhook_enabled()
+    monkeypatch.setattr(Config, 'YOOMONEY_NOTIFICATION_SECRET', 'secret')
+    assert YooMoney.webhook_enabled()
+    # ЮKassa перепроверяет оплату через API и ключа не требует
+    assert KassaSmart.webhook_enabled()
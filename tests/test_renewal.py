@@ -0,0 +1,97 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+
+from bot.database.crud.create import add_auto_renewal
+from bot.database.models.main import AutoRenewal, User, current_time
+from bot.database.requests import upsert_user
+from bot.service.Payments import KassaSmart
+from bot.service.renewal import RenewalEngine
+
+USER = 100
+
+
+class Hub:
+    def get_translator_by_locale(self, locale):
+        return None
+
+
+async def add_renewal(session_pool, **values):
+    async with session_pool() as session:
+        await upsert_user(session, USER, 'user', 'User')
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == USER)
+            .values(
+                status_subscription=True,
+                subscription=current_time() + timedelta(hours=1)
+            )
+        )
+        await add_auto_renewal(session, USER, 'method', 100, 'mon.1')
+        if values:
+            await session.execute(update(AutoRenewal).values(**values))
+            await session.commit()
+
+
+async def tick(session_pool) -> AutoRenewal:
+    engine = RenewalEngine()
+    engine.translator_hub = Hub()
+    engine.session_pool = session_pool
+    await engine.tick()
+    async with session_pool() as session:
+        return await session.scalar(select(AutoRenewal))
+
+
+def test_pending_charge_is_not_dropped(database, monkeypatch):
+    async def find_payment(config, payment_id):
+        return SimpleNamespace(id=payment_id, status='pending')
+
+    async def auto_payment(*args):
+        raise AssertionError('charged twice')
+
+    monkeypatch.setattr(KassaSmart, 'find_payment', find_payment)
+    monkeypatch.setattr(KassaSmart, 'auto_payment', auto_payment)
+
+    async def test(session_pool):
+        await add_renewal(
+            session_pool,
+            charge_id='charge-1',
+            charged_at=current_time() - timedelta(days=1),
+            attempts=1
+        )
+        renewal = await tick(session_pool)
+        assert renewal.charge_id == 'charge-1'
+        assert renewal.attempts == 1
+
+    database(test)
+
+
+def test_failed_create_reuses_key(database, monkeypatch):
+    keys = []
+    responses = [None, SimpleNamespace(id='charge-1')]
+
+    async def auto_payment(config, i18n, payment_id, price, key):
+        keys.append(key)
+        return responses.pop(0)
+
+    async def find_payment(config, payment_id):
+        return SimpleNamespace(id=payment_id, status='pending')
+
+    monkeypatch.setattr(KassaSmart, 'auto_payment', auto_payment)
+    monkeypatch.setattr(KassaSmart, 'find_payment', find_payment)
+
+    async def test(session_pool):
+        await add_renewal(session_pool)
+        renewal = await tick(session_pool)
+        assert renewal.charge_id is None
+        assert renewal.attempts == 0
+        async with session_pool() as session:
+            await session.execute(update(AutoRenewal).values(next_attempt=None))
+            await session.commit()
+        renewal = await tick(session_pool)
+        assert renewal.charge_id == 'charge-1'
+        assert renewal.attempts == 1
+        assert keys[0] == keys[1]
+
+    database(test)
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from bot.service.sender import RateLimitedSender, TokenBucket
+
+
+async def send_many(sender: RateLimitedSender, count: int, background: bool):
+    async def request():
+        return True
+
+    start = time.monotonic()
+    await asyncio.gather(*(
+        sender.call(request, background=background) for _ in range(count)
+    ))
+    return time.monotonic() - start
+
+
+def test_token_bucket_burst_then_rate():
+    async def test():
+        bucket = TokenBucket(rate=10, capacity=5)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        assert time.monotonic() - start < 0.05
+        # Следующие 5 токенов пополняются со скоростью 10 в секунду
+        for _ in range(5):
+            await bucket.acquire()
+        assert 0.4 <= time.monotonic() - start < 0.8
+
+    asyncio.run(test())
+
+
+def test_token_bucket_does_not_exceed_capacity():
+    async def test():
+        bucket = TokenBucket(rate=100, capacity=3)
+        await asyncio.sleep(0.1)
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        # После простоя подряд проходят только capacity запросов
+        assert time.monotonic() - start >= 0.009
+        assert bucket.tokens < 1
+
+    asyncio.run(test())
+
+
+def test_background_share_of_rate():
+    async def test():
+        sender = RateLimitedSender(
+            rate=20, chat_interval=0, background_share=0.25
+        )
+        # Рассылке доступно 5 запросов в секунду из 20
+        elapsed = await send_many(sender, 10, background=True)
+        assert elapsed >= 0.8
+        # Остальной лимит свободен для уведомлений
+        elapsed = await send_many(sender, 10, background=False)
+        assert elapsed < 0.3
+
+    asyncio.run(test())
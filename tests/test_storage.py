@@ -0,0 +1,110 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.database.main import pool_size, storage_engine
+from bot.database.models.main import FsmData, current_time
+from bot.database.sqlite_engine import write_queue
+from bot.database.storage import DbStorage
+from bot.misc import Config
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def storage(session_pool) -> DbStorage:
+    write_queue.setup(session_pool)
+    return DbStorage(
+        session_pool,
+        async_sessionmaker(storage_engine(), expire_on_commit=False),
+        ttl=60
+    )
+
+
+def test_round_trip(database):
+    async def test(session_pool):
+        fsm = storage(session_pool)
+        assert await fsm.get_state(KEY) is None
+        assert await fsm.get_data(KEY) == {}
+        await fsm.set_state(KEY, 'Form:name')
+        await fsm.set_data(KEY, {'name': 'Иван', 'items': [1, 2]})
+        assert await fsm.get_state(KEY) == 'Form:name'
+        assert await fsm.get_data(KEY) == {'name': 'Иван', 'items': [1, 2]}
+        # Другой destiny - другая запись
+        other = StorageKey(bot_id=1, chat_id=10, user_id=10, destiny='aiogd')
+        assert await fsm.get_state(other) is None
+        await fsm.set_state(KEY, None)
+        await fsm.set_data(KEY, {})
+        assert await fsm.get_state(KEY) is None
+        assert await fsm.get_data(KEY) == {}
+
+    database(test)
+
+
+def test_reads_do_not_use_update_pool(database):
+    async def test(session_pool):
+        fsm = storage(session_pool)
+        await fsm.set_state(KEY, 'Form:name')
+        # Обновления заняли все соединения основного пула для чтения
+        sessions = [
+            session_pool()
+            for _ in range(pool_size() + Config.DB_MAX_OVERFLOW)
+        ]
+        try:
+            for session in sessions:
+                await session.connection()
+            assert await fsm.get_state(KEY) == 'Form:name'
+        finally:
+            for session in sessions:
+                await session.close()
+
+    database(test)
+
+
+def test_expired_row_does_not_revive_state(database):
+    async def test(session_pool):
+        fsm = storage(session_pool)
+        await fsm.set_state(KEY, 'Form:name')
+        await fsm.set_data(KEY, {'name': 'old'})
+        async with session_pool() as session:
+            await session.execute(
+                update(FsmData).values(
+                    date_updated=current_time() - timedelta(minutes=5)
+                )
+            )
+            await session.commit()
+        await fsm.set_data(KEY, {'name': 'new'})
+        assert await fsm.get_state(KEY) is None
+        assert await fsm.get_data(KEY) == {'name': 'new'}
+
+    database(test)
+
+
+def test_redis_round_trip(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    from redis.asyncio import Redis
+
+    from bot.main import create_storage
+
+    redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(Redis, 'from_url', lambda url: redis)
+    monkeypatch.setattr(Config, 'FSM_STORAGE', 'redis')
+
+    async def test():
+        fsm = create_storage(None)
+        await fsm.set_state(KEY, 'Form:name')
+        await fsm.set_data(KEY, {'name': 'Иван'})
+        assert await fsm.get_state(KEY) == 'Form:name'
+        assert await fsm.get_data(KEY) == {'name': 'Иван'}
+        for key in await redis.keys():
+            assert 0 < await redis.ttl(key) <= Config.FSM_STATE_TTL
+        await fsm.set_state(KEY, None)
+        await fsm.set_data(KEY, {})
+        assert await fsm.get_state(KEY) is None
+        assert await redis.keys() == []
+        await fsm.close()
+
+    asyncio.run(test())